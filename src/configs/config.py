@@ -1,41 +1,150 @@
 import yaml
+import copy
 import os
 import sys
+import threading
 from loguru import logger
 
-from src.configs.proxy_config import set_proxy
+from src.configs.logging_config import BackgroundFileSink, add_file_sink
 
-# append project path to sys.path
+
+# project root: <project>/src/configs/config.py
 script_path = os.path.abspath(__file__)
 project_path = os.path.dirname(os.path.dirname(os.path.dirname(script_path)))
 
-print("project_path is {}".format(project_path))
 
-# append project path to sys.path
-sys.path.append(project_path)
+class Settings:
+    """
+    Lazily initialised project settings.
+
+    Importing this module is side-effect free. Each setup step (sys.path, log file sink,
+    yaml configs, proxy) runs only on first access and its result is cached, so short-lived
+    workers and tests only pay for the steps they actually use.
+    """
+
+    def __init__(self, project_path=project_path, config_file="config_dev.yaml"):
+        self._project_path = project_path
+        self._config_file = config_file
+        self._lock = threading.RLock()
+        self._sys_path_done = False
+        self._log_handler_id = None
+        self._log_sink = None
+        self._raw_configs = None
+        self._yaml_configs = None
+        self._proxy_done = False
+
+    @property
+    def project_path(self):
+        return self._project_path
+
+    @property
+    def config_path(self):
+        return os.path.join(self._project_path, "src", "configs", self._config_file)
+
+    @property
+    def log_path(self):
+        return os.path.join(self._project_path, "logs", "app.log")
+
+    def ensure_sys_path(self):
+        """
+        Appends the project path to sys.path (once).
+        """
+        if self._sys_path_done:
+            return
+        with self._lock:
+            if not self._sys_path_done:
+                if self._project_path not in sys.path:
+                    sys.path.append(self._project_path)
+                self._sys_path_done = True
+                logger.info("project_path is {}".format(self._project_path))
+
+    def ensure_logging(self):
+        """
+        Registers the logs/app.log file sink (once), configured by the "logging" section of the yaml.
+        """
+        if self._log_handler_id is not None:
+            return
+        with self._lock:
+            if self._log_handler_id is None:
+                logging_configs = self._read_config_file().get("logging") or {}
+                self._log_handler_id, self._log_sink = add_file_sink(self.log_path, **logging_configs)
+                logger.info("basic setup done")
+
+    def flush_logging(self):
+        """
+        Waits until the background writer (async logging mode) has written every queued record.
+        """
+        if isinstance(self._log_sink, BackgroundFileSink):
+            self._log_sink.drain()
+
+    def _read_config_file(self):
+        if self._raw_configs is None:
+            with self._lock:
+                if self._raw_configs is None:
+                    with open(self.config_path) as f:
+                        self._raw_configs = yaml.load(f, Loader=yaml.FullLoader) or {}
+        return self._raw_configs
+
+    @property
+    def yaml_configs(self):
+        """
+        The parsed config yaml, loaded on first access.
+        """
+        if self._yaml_configs is None:
+            with self._lock:
+                if self._yaml_configs is None:
+                    self._yaml_configs = self._load_yaml_configs()
+        return self._yaml_configs
+
+    def _load_yaml_configs(self):
+        self.ensure_logging()
+        yaml_configs = copy.deepcopy(self._read_config_file())
 
+        if "gemini" in yaml_configs and "api_key" in yaml_configs["gemini"]:
+            api_key = os.environ.get(yaml_configs["gemini"]["api_key"])
+            if api_key:
+                yaml_configs["gemini"]["api_key"] = api_key
+                logger.info(f"Environment variable {yaml_configs['gemini']['api_key'][:5]}xxxxxxx.... found, using value from environment.")
+            else:
+                logger.warning(f"Environment variable {yaml_configs['gemini']['api_key']} not found, using value from config file.")
 
-# setup logs path
-logger.add(os.path.join(project_path, "logs", "app.log"))
+        logger.info("all configs loaded")
+        return yaml_configs
 
-logger.info("basic setup done")
+    def ensure_proxy(self):
+        """
+        Runs the proxy setup (once). Called by code paths that actually talk to the network.
+        """
+        if self._proxy_done:
+            return
+        with self._lock:
+            if not self._proxy_done:
+                # imported here so the socket probe module is not loaded at import time
+                from src.configs.proxy_config import set_proxy
 
+                proxy_configs = self.yaml_configs.get("proxy") or {}
+                set_proxy(**proxy_configs)
+                self._proxy_done = True
+                logger.info("proxy setup done")
 
-yaml_configs = None
-# load additon configs.yaml
-with open(os.path.join(project_path, "src", "configs", "config_dev.yaml")) as f:
-    yaml_configs = yaml.load(f, Loader=yaml.FullLoader)
+    def setup(self):
+        """
+        Runs every setup step eagerly, i.e. the old import-time behaviour of this module.
+        Scripts that create their clients directly, instead of through the factories that call
+        ensure_proxy, call this once at startup.
+        """
+        self.ensure_sys_path()
+        self.ensure_logging()
+        self.yaml_configs
+        self.ensure_proxy()
+        return self
 
-if "gemini" in yaml_configs and "api_key" in yaml_configs["gemini"]:
-    api_key = os.environ.get(yaml_configs["gemini"]["api_key"])
-    if api_key:
-        yaml_configs["gemini"]["api_key"] = api_key
-        logger.info(f"Environment variable {yaml_configs['gemini']['api_key'][:5]}xxxxxxx.... found, using value from environment.")
-    else:
-        logger.warning(f"Environment variable {yaml_configs['gemini']['api_key']} not found, using value from config file.")
 
-logger.info("all configs loaded")
+settings = Settings()
 
 
-set_proxy()
-logger.info("proxy setup done")
+def __getattr__(name):
+    # keep `from src.configs.config import yaml_configs` working, but load lazily
+    if name == "yaml_configs":
+        return settings.yaml_configs
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,281 @@
+from loguru import logger
+import atexit
+import glob
+import gzip
+import itertools
+import os
+import queue
+import re
+import shutil
+import sys
+import threading
+import time
+import zipfile
+
+# levels at or above this are never sampled away
+SAMPLING_MAX_LEVEL_NO = 30  # WARNING
+# seconds between two reports of a failing log writer on stderr
+WRITE_ERROR_REPORT_INTERVAL = 60.0
+
+_SIZE_UNITS = {"B": 1, "KB": 1024, "MB": 1024 ** 2, "GB": 1024 ** 3}
+_DURATION_UNITS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400, "week": 7 * 86400}
+
+
+class SamplingFilter:
+    """
+    A loguru filter that keeps only 1 of every N records per level, e.g. {"DEBUG": 100, "INFO": 10}.
+    WARNING and above are always kept.
+    """
+
+    def __init__(self, sampling=None):
+        self._rates = {level.upper(): int(every) for level, every in (sampling or {}).items() if int(every) > 1}
+        self._counters = {level: itertools.count() for level in self._rates}
+
+    def __call__(self, record):
+        level = record["level"]
+        if level.no >= SAMPLING_MAX_LEVEL_NO:
+            return True
+        every = self._rates.get(level.name)
+        if every is None:
+            return True
+        # next() on itertools.count is atomic under the GIL, so no lock is needed
+        return next(self._counters[level.name]) % every == 0
+
+
+def parse_size(value):
+    """
+    Parses "10 MB" into a number of bytes, returns None if value is not a size.
+    """
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMG]?B)\s*", str(value), re.IGNORECASE)
+    if not match:
+        return None
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()])
+
+
+def parse_duration(value):
+    """
+    Parses "7 days" or "1 hour" into a number of seconds, returns None if value is not a duration.
+    """
+    match = re.fullmatch(r"\s*([\d.]+)\s*(second|minute|hour|day|week)s?\s*", str(value), re.IGNORECASE)
+    if not match:
+        return None
+    return float(match.group(1)) * _DURATION_UNITS[match.group(2).lower()]
+
+
+class RotatingFileWriter:
+    """
+    A plain file writer with size or time based rotation, retention and compression of rotated files.
+    It is not thread-safe, BackgroundFileSink only calls it from its writer thread.
+
+    Args:
+        path (str): The path to the log file.
+        rotation (str): A size ("10 MB") or an interval ("1 day").
+        retention (str|int): Number of rotated files to keep, or their max age ("7 days").
+        compression (str): "gz" or "zip".
+    """
+
+    def __init__(self, path, rotation=None, retention=None, compression=None):
+        if compression not in (None, "gz", "zip"):
+            raise ValueError(f"Unsupported compression: {compression}")
+        self._path = path
+        self._root, self._ext = os.path.splitext(path)
+        self._compression = compression
+        self._max_size = None
+        self._interval = None
+        if rotation is not None:
+            self._max_size = parse_size(rotation)
+            if self._max_size is None:
+                self._interval = parse_duration(rotation)
+            if self._max_size is None and self._interval is None:
+                raise ValueError(f"Unsupported rotation: {rotation}")
+        self._retention_count = retention if isinstance(retention, int) else None
+        self._retention_age = parse_duration(retention) if isinstance(retention, str) else None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._open()
+
+    def _open(self):
+        self._file = open(self._path, "a", encoding="utf8")
+        self._size = self._file.tell()
+        self._next_rotation = time.time() + self._interval if self._interval else None
+
+    def write(self, text):
+        size = len(text.encode("utf8"))
+        if self._should_rotate(size):
+            self.rotate()
+        self._file.write(text)
+        self._size += size
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def _should_rotate(self, size):
+        if self._max_size is not None:
+            return self._size > 0 and self._size + size > self._max_size
+        if self._next_rotation is not None:
+            return time.time() >= self._next_rotation
+        return False
+
+    def rotate(self):
+        self._file.close()
+        rotated = "{}.{}{}".format(self._root, time.strftime("%Y-%m-%d_%H-%M-%S"), self._ext)
+        suffix = itertools.count(1)
+        while os.path.exists(rotated) or os.path.exists(f"{rotated}.{self._compression}"):
+            rotated = "{}.{}_{}{}".format(self._root, time.strftime("%Y-%m-%d_%H-%M-%S"), next(suffix), self._ext)
+        os.replace(self._path, rotated)
+        self._open()
+        self._compress(rotated)
+        self._apply_retention()
+
+    def _compress(self, rotated):
+        if self._compression == "gz":
+            with open(rotated, "rb") as src, gzip.open(f"{rotated}.gz", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+        elif self._compression == "zip":
+            with zipfile.ZipFile(f"{rotated}.zip", "w", zipfile.ZIP_DEFLATED) as dst:
+                dst.write(rotated, os.path.basename(rotated))
+        else:
+            return
+        os.remove(rotated)
+
+    def rotated_files(self):
+        """
+        The rotated files, oldest first.
+        """
+        files = [f for f in glob.glob(f"{glob.escape(self._root)}.*{self._ext}*") if f != self._path]
+        return sorted(files, key=os.path.getmtime)
+
+    def _apply_retention(self):
+        files = self.rotated_files()
+        expired = []
+        if self._retention_count is not None:
+            expired = files[:max(len(files) - self._retention_count, 0)]
+        elif self._retention_age is not None:
+            deadline = time.time() - self._retention_age
+            expired = [f for f in files if os.path.getmtime(f) < deadline]
+        for f in expired:
+            os.remove(f)
+
+
+class BackgroundFileSink:
+    """
+    A loguru sink that only puts the formatted message on an in-process queue, a daemon thread
+    drains it in batches into a RotatingFileWriter. The calling thread never touches the file,
+    rotation and compression happen on the writer thread.
+
+    loguru's own enqueue=True pickles every record through a multiprocessing pipe, which costs
+    more per call than writing the file synchronously; a thread queue does not.
+
+    A batch that cannot be written (e.g. disk full) is dropped and reported on stderr, at most
+    once per WRITE_ERROR_REPORT_INTERVAL with the number of messages dropped meanwhile.
+    """
+
+    def __init__(self, path, rotation=None, retention=None, compression=None, batch_size=10000, linger=0.05):
+        self._writer = RotatingFileWriter(path, rotation=rotation, retention=retention, compression=compression)
+        self._queue = queue.SimpleQueue()
+        self._batch_size = batch_size
+        self._linger = linger
+        self._stopped = False
+        self._dropped = 0
+        self._error_reported_at = None
+        self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def write(self, message):
+        self._queue.put(message)
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            # let a burst of messages pile up, waking up once per message costs the callers GIL time
+            if self._linger and not isinstance(item, threading.Event):
+                time.sleep(self._linger)
+            batch = []
+            events = []
+            while True:
+                if item is None:
+                    self._write_batch(batch, events)
+                    self._writer.close()
+                    return
+                if isinstance(item, threading.Event):
+                    events.append(item)
+                else:
+                    batch.append(item)
+                if len(batch) >= self._batch_size:
+                    break
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._write_batch(batch, events)
+
+    def _write_batch(self, batch, events):
+        try:
+            if batch:
+                self._writer.write("".join(batch))
+                self._writer.flush()
+        except Exception as e:
+            # never let a disk error kill the writer thread, nor flood stderr while it lasts
+            self._dropped += len(batch)
+            now = time.monotonic()
+            if self._error_reported_at is None or now - self._error_reported_at >= WRITE_ERROR_REPORT_INTERVAL:
+                sys.stderr.write(f"log writer failed, {self._dropped} messages dropped: {e!r}\n")
+                sys.stderr.flush()
+                self._error_reported_at = now
+                self._dropped = 0
+        for event in events:
+            event.set()
+
+    def drain(self, timeout=None):
+        """
+        Blocks until every message queued so far has been written.
+        """
+        if self._stopped:
+            return True
+        event = threading.Event()
+        self._queue.put(event)
+        return event.wait(timeout)
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        self._queue.put(None)
+        self._thread.join()
+
+
+def add_file_sink(log_path, mode="sync", rotation=None, retention=None, compression=None, serialize=False, sampling=None):
+    """
+    Registers the log file sink and returns (handler_id, sink).
+
+    Args:
+        log_path (str): The path to the log file.
+        mode (str): "sync" writes on the calling thread, "async" hands formatted records to a
+            BackgroundFileSink, so file writes, rotation and compression happen off the hot path.
+        rotation (str): When to start a new file, e.g. "10 MB" or "1 day".
+        retention (str|int): How many rotated files to keep, or for how long, e.g. "7 days".
+        compression (str): Compression format of rotated files, "zip" or "gz".
+        serialize (bool): Write every record as a JSON object instead of a formatted line.
+        sampling (dict): Per-level sampling rates, see SamplingFilter.
+    """
+    if mode == "sync":
+        sink = log_path
+        options = dict(rotation=rotation, retention=retention, compression=compression)
+    elif mode == "async":
+        sink = BackgroundFileSink(log_path, rotation=rotation, retention=retention, compression=compression)
+        options = {}
+    else:
+        raise ValueError(f"Unknown logging mode: {mode}")
+
+    handler_id = logger.add(
+        sink,
+        serialize=serialize,
+        filter=SamplingFilter(sampling) if sampling else None,
+        **options,
+    )
+    return handler_id, sink
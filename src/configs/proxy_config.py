@@ -1,21 +1,169 @@
 from loguru import logger
 import os
+import json
 import socket
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def check_proxy(proxy_host, proxy_port):
+DEFAULT_PROXY_CANDIDATES = ["10.0.1.223:7890"]
+DEFAULT_CACHE_FILE = os.path.join(tempfile.gettempdir(), "python-poc-proxy.json")
+
+
+def check_proxy(proxy_host, proxy_port, timeout=2):
     try:
-        with socket.create_connection((proxy_host, proxy_port), timeout=2):
+        with socket.create_connection((proxy_host, proxy_port), timeout=timeout):
             return True
-    except (socket.timeout, ConnectionRefusedError):
+    except OSError:
         return False
 
-def set_proxy():
+
+def parse_candidate(candidate):
+    """
+    Parses "host:port" (or a {"host": ..., "port": ...} dict) into a (host, port) tuple.
+    """
+    if isinstance(candidate, dict):
+        return candidate["host"], int(candidate["port"])
+    host, _, port = str(candidate).rpartition(":")
+    return host, int(port)
+
+
+class ProxyResolver:
+    """
+    Picks a proxy from a list of candidates.
+
+    All candidates are probed concurrently and the first one that accepts a TCP connection wins,
+    since they all start at the same time that is also the one with the lowest connect latency.
+    The verdict (including "no proxy reachable") is cached on disk for cache_ttl seconds so that
+    subsequent processes skip probing; once a cached verdict is older than refresh_after seconds
+    it is re-checked by a background thread.
+    """
+
+    def __init__(self, candidates=None, timeout=2, cache_file=DEFAULT_CACHE_FILE, cache_ttl=600, refresh_after=None):
+        self._candidates = [parse_candidate(c) for c in (candidates or DEFAULT_PROXY_CANDIDATES)]
+        self._timeout = timeout
+        self._cache_file = cache_file
+        self._cache_ttl = cache_ttl
+        self._refresh_after = cache_ttl / 2 if refresh_after is None else refresh_after
+        self._refresh_thread = None
+
+    def probe(self, host, port):
+        """
+        Returns the connect latency in seconds, or None if the proxy is not reachable.
+        """
+        start = time.perf_counter()
+        if check_proxy(host, port, timeout=self._timeout):
+            return time.perf_counter() - start
+        return None
+
+    def _submit_all(self, executor):
+        return {executor.submit(self.probe, host, port): (host, port) for host, port in self._candidates}
+
+    def race(self):
+        """
+        Probes all candidates concurrently and returns the first healthy (host, port), or None.
+        Does not wait for the slower probes to finish.
+        """
+        executor = ThreadPoolExecutor(max_workers=len(self._candidates), thread_name_prefix="proxy-probe")
+        try:
+            futures = self._submit_all(executor)
+            for future in as_completed(futures):
+                if future.result() is not None:
+                    return futures[future]
+            return None
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def rank(self):
+        """
+        Probes all candidates concurrently and returns [(latency, "host:port"), ...] for the healthy
+        ones, fastest first.
+        """
+        with ThreadPoolExecutor(max_workers=len(self._candidates), thread_name_prefix="proxy-probe") as executor:
+            futures = self._submit_all(executor)
+            ranking = []
+            for future in as_completed(futures):
+                latency = future.result()
+                if latency is not None:
+                    host, port = futures[future]
+                    ranking.append((latency, f"{host}:{port}"))
+        return sorted(ranking)
+
+    def _cache_key(self):
+        return [f"{host}:{port}" for host, port in self._candidates]
+
+    def _read_cache(self):
+        if not self._cache_file:
+            return None
+        try:
+            with open(self._cache_file) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if cache.get("candidates") != self._cache_key():
+            return None
+        if time.time() - cache.get("checked_at", 0) > self._cache_ttl:
+            return None
+        return cache
+
+    def _write_cache(self, proxy, ranking=None):
+        if not self._cache_file:
+            return
+        cache = {
+            "candidates": self._cache_key(),
+            "proxy": proxy,
+            "ranking": ranking or [],
+            "checked_at": time.time(),
+        }
+        # write to a temp file first so concurrent readers never see a partial file
+        tmp_file = f"{self._cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_file, "w") as f:
+                json.dump(cache, f)
+            os.replace(tmp_file, self._cache_file)
+        except OSError as e:
+            logger.warning(f"Failed to write proxy cache {self._cache_file}: {e}")
+
+    def refresh(self):
+        """
+        Re-probes all candidates and updates the cache, returns the fastest "host:port" or None.
+        """
+        ranking = self.rank()
+        proxy = ranking[0][1] if ranking else None
+        self._write_cache(proxy, ranking)
+        return proxy
+
+    def _refresh_in_background(self):
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return
+        self._refresh_thread = threading.Thread(target=self.refresh, name="proxy-refresh", daemon=True)
+        self._refresh_thread.start()
+
+    def resolve(self):
+        """
+        Returns the proxy to use as "host:port", or None if no candidate is reachable.
+        """
+        cache = self._read_cache()
+        if cache is not None:
+            if time.time() - cache["checked_at"] > self._refresh_after:
+                self._refresh_in_background()
+            return cache["proxy"]
+
+        winner = self.race()
+        proxy = f"{winner[0]}:{winner[1]}" if winner else None
+        self._write_cache(proxy)
+        return proxy
+
+
+def set_proxy(candidates=None, timeout=2, cache_file=DEFAULT_CACHE_FILE, cache_ttl=600):
     logger.info("Setting up proxy configuration.")
-    proxy_host = "10.0.1.223"
-    proxy_port = 7890
-    if check_proxy(proxy_host, proxy_port):
-        os.environ["http_proxy"] = f"http://{proxy_host}:{proxy_port}"
-        os.environ["https_proxy"] = f"http://{proxy_host}:{proxy_port}"
-        logger.info("Proxy is reachable. Proxy configured.")
+    resolver = ProxyResolver(candidates, timeout=timeout, cache_file=cache_file, cache_ttl=cache_ttl)
+    proxy = resolver.resolve()
+    if proxy:
+        os.environ["http_proxy"] = f"http://{proxy}"
+        os.environ["https_proxy"] = f"http://{proxy}"
+        logger.info(f"Proxy {proxy} is reachable. Proxy configured.")
     else:
         logger.warning("Proxy is not reachable. Skipping proxy configuration.")
+    return proxy
@@ -1,5 +1,6 @@
 
 import src.configs.config
+from src.configs.config import settings
 from loguru import logger
 import time
 import functools
@@ -7,6 +8,11 @@ import asyncio
 
 from inspect import iscoroutinefunction
 
+# positional placeholders are filled in by loguru, the keyword arguments end up as structured
+# fields in record["extra"] (i.e. in the JSON records when the sink is serialized)
+STARTED_MESSAGE = "Function '{}' started with args: {}, kwargs: {}"
+FINISHED_MESSAGE = "Function '{}' finished with args: {}, kwargs: {}. Elapsed time: {:.4f} seconds"
+
 
 def log_execution_time(func):
     """
@@ -15,22 +21,24 @@ def log_execution_time(func):
     """
     @functools.wraps(func)
     def sync_wrapper(*args, **kwargs):
-        start_time = time.time()
-        logger.info(f"Function '{func.__name__}' started with args: {args}, kwargs: {kwargs}")
+        settings.ensure_logging()
+        start_time = time.perf_counter()
+        logger.info(STARTED_MESSAGE, func.__name__, args, kwargs, function=func.__qualname__, event="started")
         result = func(*args, **kwargs)
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-        logger.info(f"Function '{func.__name__}' finished with args: {args}, kwargs: {kwargs}. Elapsed time: {elapsed_time:.4f} seconds")
+        elapsed_time = time.perf_counter() - start_time
+        logger.info(FINISHED_MESSAGE, func.__name__, args, kwargs, elapsed_time,
+                    function=func.__qualname__, event="finished", elapsed_time=elapsed_time)
         return result
 
     @functools.wraps(func)
     async def async_wrapper(*args, **kwargs):
-        start_time = time.time()
-        logger.info(f"Function '{func.__name__}' started with args: {args}, kwargs: {kwargs}")
+        settings.ensure_logging()
+        start_time = time.perf_counter()
+        logger.info(STARTED_MESSAGE, func.__name__, args, kwargs, function=func.__qualname__, event="started")
         result = await func(*args, **kwargs)
-        end_time = time.time()
-        elapsed_time = end_time - start_time
-        logger.info(f"Function '{func.__name__}' finished with args: {args}, kwargs: {kwargs}. Elapsed time: {elapsed_time:.4f} seconds")
+        elapsed_time = time.perf_counter() - start_time
+        logger.info(FINISHED_MESSAGE, func.__name__, args, kwargs, elapsed_time,
+                    function=func.__qualname__, event="finished", elapsed_time=elapsed_time)
         return result
 
     if iscoroutinefunction(func):
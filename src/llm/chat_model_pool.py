@@ -0,0 +1,132 @@
+from loguru import logger
+from collections import OrderedDict
+import asyncio
+import hashlib
+import inspect
+import threading
+import time
+
+
+def credentials_key(secret):
+    """
+    Hashes an api key (or other secret) so that it can be part of a pool key without being kept or logged in clear.
+    """
+    if secret is None:
+        return None
+    return hashlib.sha256(str(secret).encode("utf8")).hexdigest()[:16]
+
+
+def close_chat_model(model):
+    """
+    Best effort close of the transports (gRPC channels / HTTP sessions) held by a chat model,
+    sync and async. An async transport is closed on the running event loop if there is one,
+    otherwise on a new one; a channel bound to a loop that is gone is left to the garbage collector.
+    """
+    for attr in ("client", "prediction_client", "async_client", "async_client_running", "prediction_async_client"):
+        client = getattr(model, attr, None)
+        transport = getattr(client, "transport", None)
+        close = getattr(transport, "close", None)
+        if not callable(close):
+            continue
+        try:
+            result = close()
+            if inspect.isawaitable(result):
+                _close_async(result)
+        except Exception as e:
+            logger.warning(f"Failed to close {type(model).__name__}.{attr}: {e}")
+
+
+def _close_async(awaitable):
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        asyncio.run(_await(awaitable))
+    else:
+        loop.create_task(_await(awaitable))
+
+
+async def _await(awaitable):
+    return await awaitable
+
+
+class ChatModelPool:
+    """
+    A bounded pool of shared chat-model clients.
+
+    LangChain chat models are stateless between calls, so one instance (and its gRPC/HTTP
+    transport) can be shared by any number of chains, threads and coroutines. The pool hands out
+    one instance per key, e.g. (model, temperature, max_tokens, credentials), builds it on first
+    use and keeps at most max_size of them, least recently used first out.
+
+    Entries unused for idle_timeout seconds are evicted on the next checkout. Eviction (idle or
+    least recently used) only drops the pool's reference: chains built earlier may still hold
+    the model, its channels are closed by the garbage collector once the last of them is gone.
+    close() closes every pooled model, for the end of the process or of a test.
+    """
+
+    def __init__(self, max_size=8, idle_timeout=600, clock=time.monotonic):
+        self._max_size = max_size
+        self._idle_timeout = idle_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> [model, last_used]
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, builder):
+        """
+        Returns the pooled model for key, calling builder() to create it if needed.
+        The lock is never held across an await, so this is safe from threads and coroutines alike.
+        """
+        with self._lock:
+            now = self._clock()
+            self._evict_idle(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                entry[1] = now
+                self._entries.move_to_end(key)
+                model = entry[0]
+            else:
+                self.misses += 1
+                model = builder()
+                self._entries[key] = [model, now]
+                while len(self._entries) > self._max_size:
+                    evicted_key, _ = self._entries.popitem(last=False)
+                    logger.info(f"Chat model pool is full, evicted {evicted_key}")
+        return model
+
+    def _evict_idle(self, now):
+        if self._idle_timeout is None:
+            return
+        idle_keys = [key for key, (_, last_used) in self._entries.items() if now - last_used > self._idle_timeout]
+        for key in idle_keys:
+            del self._entries[key]
+            logger.info(f"Chat model {key} idle for more than {self._idle_timeout}s, evicted")
+
+    def evict_idle(self):
+        with self._lock:
+            self._evict_idle(self._clock())
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        """
+        Closes and removes every pooled model.
+        """
+        with self._lock:
+            models = [model for model, _ in self._entries.values()]
+            self._entries.clear()
+        for model in models:
+            close_chat_model(model)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+default_chat_model_pool = ChatModelPool()
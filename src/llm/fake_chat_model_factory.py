@@ -0,0 +1,142 @@
+from src.llm.llm_chat_model import LLMChatModelFactory
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import PrivateAttr
+from typing import Any, Optional
+import asyncio
+import random
+import sys
+import time
+
+if sys.version_info >= (3, 12):
+    from typing import override
+else:
+    from typing_extensions import override
+
+
+class SimulatedError(Exception):
+    """
+    An injected, non-retryable failure.
+    """
+
+
+class SimulatedRateLimitError(Exception):
+    """
+    An injected 429, recognised by src.llm_chains.batch_runner.is_throttling_error.
+    """
+    status_code = 429
+
+
+class SimulatedChatModel(BaseChatModel):
+    """
+    An offline chat model for load tests: answers after a latency drawn from a distribution,
+    streams its answer word by word at tokens_per_second, and fails with the configured rates.
+
+    The answer is `response` if set, otherwise the last message echoed back.
+    Latency distributions: "constant" (= latency), "uniform" (latency +- jitter),
+    "exponential" (mean latency), "lognormal" (median latency, sigma).
+    """
+    latency: float = 0.1
+    latency_distribution: str = "constant"
+    jitter: float = 0.0
+    sigma: float = 0.5
+    tokens_per_second: Optional[float] = None
+    error_rate: float = 0.0
+    throttle_rate: float = 0.0
+    response: Optional[str] = None
+    seed: Optional[int] = None
+
+    _rng: random.Random = PrivateAttr(default=None)
+
+    def model_post_init(self, context: Any) -> None:
+        self._rng = random.Random(self.seed)
+
+    @property
+    def _llm_type(self) -> str:
+        return "simulated"
+
+    @property
+    def _identifying_params(self):
+        return {"latency": self.latency, "latency_distribution": self.latency_distribution, "response": self.response}
+
+    def sample_latency(self):
+        if self.latency_distribution == "constant":
+            return self.latency
+        if self.latency_distribution == "uniform":
+            return max(0.0, self._rng.uniform(self.latency - self.jitter, self.latency + self.jitter))
+        if self.latency_distribution == "exponential":
+            return self._rng.expovariate(1 / self.latency) if self.latency > 0 else 0.0
+        if self.latency_distribution == "lognormal":
+            return self._rng.lognormvariate(0, self.sigma) * self.latency
+        raise ValueError(f"Unknown latency distribution: {self.latency_distribution}")
+
+    def _answer(self, messages):
+        failure = self._rng.random()
+        if failure < self.throttle_rate:
+            raise SimulatedRateLimitError("429 RESOURCE_EXHAUSTED (simulated)")
+        if failure < self.throttle_rate + self.error_rate:
+            raise SimulatedError("simulated error")
+        text = self.response if self.response is not None else str(messages[-1].content)
+        tokens = text.split(" ")
+        return text, [token if i == len(tokens) - 1 else token + " " for i, token in enumerate(tokens)]
+
+    def _usage(self, messages, tokens):
+        input_tokens = sum(len(str(message.content).split()) for message in messages)
+        return {"input_tokens": input_tokens, "output_tokens": len(tokens), "total_tokens": input_tokens + len(tokens)}
+
+    def _generation_time(self, tokens):
+        return self.sample_latency() + (len(tokens) / self.tokens_per_second if self.tokens_per_second else 0.0)
+
+    def _result(self, messages, text, tokens):
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, tokens))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text, tokens = self._answer(messages)
+        time.sleep(self._generation_time(tokens))
+        return self._result(messages, text, tokens)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        text, tokens = self._answer(messages)
+        await asyncio.sleep(self._generation_time(tokens))
+        return self._result(messages, text, tokens)
+
+    def _chunks(self, messages, tokens):
+        for i, token in enumerate(tokens):
+            usage = self._usage(messages, tokens) if i == len(tokens) - 1 else None
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token, usage_metadata=usage))
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        _, tokens = self._answer(messages)
+        time.sleep(self.sample_latency())
+        for i, chunk in enumerate(self._chunks(messages, tokens)):
+            if i and self.tokens_per_second:
+                time.sleep(1 / self.tokens_per_second)
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        _, tokens = self._answer(messages)
+        await asyncio.sleep(self.sample_latency())
+        for i, chunk in enumerate(self._chunks(messages, tokens)):
+            if i and self.tokens_per_second:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.message.content, chunk=chunk)
+            yield chunk
+
+
+class FakeChatModelFactory(LLMChatModelFactory):
+    """
+    Builds SimulatedChatModel instances, so that chains and load tests run offline and reproducibly.
+    Keyword arguments are SimulatedChatModel fields, e.g. FakeChatModelFactory(latency=0.2, throttle_rate=0.05).
+    """
+
+    def __init__(self, **model_kwargs):
+        self._model_kwargs = model_kwargs
+
+    @override
+    def build(self) -> BaseChatModel:
+        return SimulatedChatModel(**self._model_kwargs)
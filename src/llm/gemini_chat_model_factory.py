@@ -1,23 +1,48 @@
 
 import src.configs.config
-from src.configs.config import yaml_configs
+from src.configs.config import settings
 from src.llm.llm_chat_model import LLMChatModelFactory
-from typing import override
+from src.llm.response_cache import with_response_cache
+from src.llm.hedged_chat_model import with_hedging
+from src.llm.chat_model_pool import credentials_key, default_chat_model_pool
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_google_genai import ChatGoogleGenerativeAI
+import sys
+
+if sys.version_info >= (3, 12):
+    from typing import override
+else:
+    from typing_extensions import override
 
 class GeminiChatModelFactory(LLMChatModelFactory):
-    def __init__(self, api_key=yaml_configs["gemini"]["api_key"]):
+    def __init__(self, api_key=None, model="gemini-2.0-flash", temperature=0.2, max_tokens=10000, pool=None, response_cache=None, hedger=None):
+        # resolved lazily so that importing this module does not load the yaml configs
         self._api_key = api_key
+        self._model = model
+        self._temperature = temperature
+        self._max_tokens = max_tokens
+        # models are shared through the pool, pass a ChatModelPool of your own to isolate them
+        self._pool = pool if pool is not None else default_chat_model_pool
+        # opt-in, e.g. a TwoTierResponseCache, see src.llm.response_cache
+        self._response_cache = response_cache
+        # opt-in, a LatencyHedger duplicates the calls slower than its latency percentile
+        self._hedger = hedger
      
 
     @override
     def build(self) -> BaseChatModel:
+        settings.ensure_proxy()
+        api_key = self._api_key or settings.yaml_configs["gemini"]["api_key"]
+        key = ("gemini", self._model, self._temperature, self._max_tokens, credentials_key(api_key))
     
-        llm = ChatGoogleGenerativeAI(
-            model="gemini-2.0-flash",
-            temperature=0.2,  
-            max_tokens=10000,
-            api_key=self._api_key,
-        )
+        llm = self._pool.get(key, lambda: ChatGoogleGenerativeAI(
+            model=self._model,
+            temperature=self._temperature,
+            max_tokens=self._max_tokens,
+            api_key=api_key,
+        ))
+        if self._response_cache is not None:
+            llm = with_response_cache(llm, self._response_cache)
+        if self._hedger is not None:
+            llm = with_hedging(llm, self._hedger)
         return llm
@@ -0,0 +1,278 @@
+from loguru import logger
+import asyncio
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Optional
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, BaseMessageChunk
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from src.llm.llm_chat_model import child_callbacks
+from src.llm_chains.stream_metrics import percentile
+
+
+def _in_thread(fn, *args):
+    """
+    Runs fn on a thread of its own and returns its Future, so that it never waits for a pool worker.
+    """
+    future = Future()
+
+    def run():
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    threading.Thread(target=run, name="hedge-primary", daemon=True).start()
+    return future
+
+
+class LatencyHedger:
+    """
+    The hedging policy and its metrics, shared by every HedgedChatModel built with it.
+
+    A call is hedged when it has not completed after the given percentile of the recent call
+    latencies (initial_delay until min_samples calls were seen, no hedging if that is None).
+    At most max_hedge_rate of the last window requests are hedged, so a slow backend does not
+    get twice the load; the first hedge is allowed before 1 / max_hedge_rate requests were seen.
+
+    saved_seconds estimates the tail latency saved: for every request won by the hedge, the
+    mean latency of the recent calls slower than the hedge delay minus the actual latency.
+
+    A losing call that was cancelled is recorded with the time it ran, a lower bound of its
+    latency (a censored sample): leaving the slow calls out would pull the percentile down.
+
+    Args:
+        percentile (float): The latency percentile after which a call is hedged.
+        max_hedge_rate (float): Max share of hedged requests.
+        window (int): Number of recent calls / requests the percentile and the rate are computed on.
+        min_samples (int): Calls to observe before hedging on the percentile.
+        initial_delay (float): Hedge delay in seconds until min_samples calls were seen, None to not hedge.
+    """
+
+    def __init__(self, percentile=95, max_hedge_rate=0.1, window=500, min_samples=20, initial_delay=None,
+                 clock=time.perf_counter):
+        self._percentile = percentile
+        self._max_hedge_rate = max_hedge_rate
+        # the fewest decisions the rate is computed on, so that the first one may be a hedge
+        self._min_decisions = math.ceil(1 / max_hedge_rate) if max_hedge_rate > 0 else 1
+        self._min_samples = min_samples
+        self._initial_delay = initial_delay
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._attempts = deque(maxlen=window)
+        self._hedge_decisions = deque(maxlen=window)
+        self._latencies = deque(maxlen=window)
+        self._executor = None
+        self.requests = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped_by_cap = 0
+        self.saved_seconds = 0.0
+
+    @property
+    def clock(self):
+        return self._clock
+
+    def hedge_delay(self):
+        with self._lock:
+            if len(self._attempts) < self._min_samples:
+                return self._initial_delay
+            return percentile(list(self._attempts), self._percentile)
+
+    def record_attempt(self, latency):
+        with self._lock:
+            self._attempts.append(latency)
+
+    def try_hedge(self):
+        """
+        Takes a hedge from the budget, False if the cap is reached.
+        """
+        with self._lock:
+            decisions = max(len(self._hedge_decisions) + 1, self._min_decisions)
+            if sum(self._hedge_decisions) + 1 > self._max_hedge_rate * decisions:
+                self.skipped_by_cap += 1
+                return False
+            self.hedged += 1
+            self._hedge_decisions.append(True)
+            return True
+
+    def record_request(self, latency, hedged=False, hedge_won=False, hedge_delay=None):
+        with self._lock:
+            self.requests += 1
+            self._latencies.append(latency)
+            if not hedged:
+                self._hedge_decisions.append(False)
+            if hedge_won:
+                self.hedge_wins += 1
+                tail = [sample for sample in self._attempts if hedge_delay is not None and sample > hedge_delay]
+                if tail:
+                    self.saved_seconds += max(0.0, sum(tail) / len(tail) - latency)
+
+    def executor(self):
+        """
+        The pool of the sync hedges, which max_hedge_rate keeps to a fraction of the calls.
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="hedge")
+            return self._executor
+
+    def stats(self):
+        with self._lock:
+            latencies = list(self._latencies)
+            return {
+                "requests": self.requests,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "skipped_by_cap": self.skipped_by_cap,
+                "hedge_rate": self.hedged / self.requests if self.requests else 0.0,
+                "saved_seconds": self.saved_seconds,
+                "p50": percentile(latencies, 50),
+                "p99": percentile(latencies, 99),
+            }
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    Wraps a chat model so that a call still running after hedger.hedge_delay() is duplicated
+    to alternate (default: the same model); the first successful answer wins and the other
+    call is cancelled. A call that fails while the other is in flight waits for the other.
+
+    In sync calls the losing call cannot be interrupted, it finishes on its thread and its
+    answer is dropped. A call that cannot be hedged (no hedge delay yet) runs on the caller's
+    thread; otherwise the primary gets a thread of its own, never queued behind other calls,
+    and only the hedges use the hedger's pool.
+
+    Streams are not hedged, they go to primary: once chunks were passed on the call cannot be
+    switched.
+    """
+    primary: BaseChatModel
+    alternate: Optional[BaseChatModel] = None
+    hedger: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def _identifying_params(self):
+        return {"primary": self.primary._identifying_params,
+                "alternate": self.alternate._identifying_params if self.alternate is not None else None}
+
+    def _hedge_model(self):
+        return self.alternate if self.alternate is not None else self.primary
+
+    @staticmethod
+    def _chat_result(result):
+        return ChatResult(generations=result.generations[0], llm_output=result.llm_output)
+
+    def _attempt(self, model, messages, stop, callbacks, kwargs):
+        start = self.hedger.clock()
+        result = self._chat_result(model.generate([messages], stop=stop, callbacks=callbacks, **kwargs))
+        self.hedger.record_attempt(self.hedger.clock() - start)
+        return result
+
+    async def _aattempt(self, model, messages, stop, callbacks, kwargs):
+        start = self.hedger.clock()
+        try:
+            result = self._chat_result(await model.agenerate([messages], stop=stop, callbacks=callbacks, **kwargs))
+        except asyncio.CancelledError:
+            self.hedger.record_attempt(self.hedger.clock() - start)
+            raise
+        self.hedger.record_attempt(self.hedger.clock() - start)
+        return result
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        start = self.hedger.clock()
+        delay = self.hedger.hedge_delay()
+        callbacks = child_callbacks(run_manager)
+        if delay is None:
+            try:
+                return self._attempt(self.primary, messages, stop, callbacks, kwargs)
+            finally:
+                self.hedger.record_request(self.hedger.clock() - start)
+        primary = _in_thread(self._attempt, self.primary, messages, stop, callbacks, kwargs)
+        done, _ = wait([primary], timeout=delay)
+        if primary in done or not self.hedger.try_hedge():
+            try:
+                return primary.result()
+            finally:
+                self.hedger.record_request(self.hedger.clock() - start)
+        hedge = self.hedger.executor().submit(self._attempt, self._hedge_model(), messages, stop, callbacks, kwargs)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    self.hedger.record_request(self.hedger.clock() - start, hedged=True, hedge_won=future is hedge, hedge_delay=delay)
+                    return future.result()
+                error = future.exception()
+        self.hedger.record_request(self.hedger.clock() - start, hedged=True)
+        raise error
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        start = self.hedger.clock()
+        delay = self.hedger.hedge_delay()
+        callbacks = child_callbacks(run_manager)
+        primary = asyncio.ensure_future(self._aattempt(self.primary, messages, stop, callbacks, kwargs))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if primary in done or delay is None or not self.hedger.try_hedge():
+                try:
+                    return await primary
+                finally:
+                    self.hedger.record_request(self.hedger.clock() - start)
+            hedge = asyncio.ensure_future(self._aattempt(self._hedge_model(), messages, stop, callbacks, kwargs))
+            tasks.add(hedge)
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        self.hedger.record_request(self.hedger.clock() - start, hedged=True, hedge_won=task is hedge, hedge_delay=delay)
+                        if task is hedge:
+                            logger.debug(f"Hedged call won after {self.hedger.clock() - start:.3f}s (hedge delay {delay:.3f}s)")
+                        return task.result()
+                    error = task.exception()
+            self.hedger.record_request(self.hedger.clock() - start, hedged=True)
+            raise error
+        finally:
+            # the losing call (or both, if the caller was cancelled)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    @staticmethod
+    def _chunk(message):
+        # a model that does not stream yields its whole answer as a message
+        if not isinstance(message, BaseMessageChunk):
+            message = AIMessageChunk(content=message.content, response_metadata=message.response_metadata)
+        return ChatGenerationChunk(message=message)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        config = {"callbacks": child_callbacks(run_manager)}
+        for message in self.primary.stream(messages, config=config, stop=stop, **kwargs):
+            yield self._chunk(message)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        config = {"callbacks": child_callbacks(run_manager)}
+        async for message in self.primary.astream(messages, config=config, stop=stop, **kwargs):
+            yield self._chunk(message)
+
+
+def with_hedging(model: BaseChatModel, hedger: LatencyHedger, alternate: Optional[BaseChatModel] = None) -> BaseChatModel:
+    """
+    Returns model wrapped in a HedgedChatModel that hedges with alternate (default: model itself).
+    """
+    return HedgedChatModel(primary=model, alternate=alternate, hedger=hedger)
@@ -1,8 +1,25 @@
 from abc import ABC
 
 from pyparsing import abstractmethod
+from langchain_core.callbacks import CallbackManager
 from langchain_core.language_models.chat_models import BaseChatModel
 
+
+def child_callbacks(run_manager):
+    """
+    The callbacks for the models called by a wrapper model (hedging, routing), so that their
+    runs show up as children of the wrapper's run; an LLM run manager has no get_child().
+    """
+    if run_manager is None:
+        return None
+    return CallbackManager(handlers=run_manager.inheritable_handlers,
+                           inheritable_handlers=run_manager.inheritable_handlers,
+                           parent_run_id=run_manager.run_id,
+                           tags=run_manager.inheritable_tags, inheritable_tags=run_manager.inheritable_tags,
+                           metadata=run_manager.inheritable_metadata,
+                           inheritable_metadata=run_manager.inheritable_metadata)
+
+
 class LLMChatModelFactory(ABC):
     @abstractmethod
     def build(self) -> BaseChatModel:
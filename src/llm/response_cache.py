@@ -0,0 +1,162 @@
+from loguru import logger
+from collections import OrderedDict
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.load import dumps, loads
+
+
+def cache_key(prompt: str, llm_string: str) -> str:
+    """
+    Exact-match key over the model + params (llm_string) and the rendered messages (prompt).
+    """
+    return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf8")).hexdigest()
+
+
+class TwoTierResponseCache(BaseCache):
+    """
+    A LangChain cache with an in-memory LRU in front of an on-disk SQLite store.
+
+    Set as the `cache` of a chat model, it is consulted by invoke/ainvoke and by every item of
+    batch/abatch, so only the uncached items of a batch reach the API. Entries expire after ttl
+    seconds; the memory tier keeps at most memory_size entries and the disk tier at most
+    disk_size, evicting the least recently used ones. Several processes may share the SQLite
+    file, the disk size is counted in the file rather than per process.
+
+    Args:
+        path (str): The SQLite file, None for a memory-only cache.
+        ttl (float): Seconds an entry stays valid, None for no expiry.
+        memory_size (int): Max entries in the memory tier.
+        disk_size (int): Max entries in the disk tier.
+    """
+
+    def __init__(self, path=None, ttl=None, memory_size=1024, disk_size=100000, clock=time.time):
+        self._path = path
+        self._ttl = ttl
+        self._memory_size = memory_size
+        self._disk_size = disk_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (created_at, generations)
+        self._memory = OrderedDict()
+        self._conn = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if path:
+            self._open_disk()
+
+    def _open_disk(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self._path)), exist_ok=True)
+        self._conn = sqlite3.connect(self._path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._conn.commit()
+
+    @property
+    def hits(self):
+        return self.memory_hits + self.disk_hits
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def _expired(self, created_at, now):
+        return self._ttl is not None and now - created_at > self._ttl
+
+    def _remember(self, key, created_at, generations):
+        self._memory[key] = (created_at, generations)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self._memory_size:
+            self._memory.popitem(last=False)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = cache_key(prompt, llm_string)
+        now = self._clock()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    return entry[1]
+                del self._memory[key]
+
+            if self._conn is not None:
+                row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if not self._expired(row[1], now):
+                        self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+                        self._conn.commit()
+                        generations = loads(row[0])
+                        self._remember(key, row[1], generations)
+                        self.disk_hits += 1
+                        return generations
+                    self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self.misses += 1
+            return None
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        key = cache_key(prompt, llm_string)
+        now = self._clock()
+        with self._lock:
+            self._remember(key, now, return_val)
+            if self._conn is None:
+                return
+            try:
+                value = dumps(return_val)
+            except Exception as e:
+                logger.warning(f"Response is not serializable, only cached in memory: {e}")
+                return
+            # another process may have written the key since our lookup
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, created_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._evict_disk()
+            self._conn.commit()
+
+    def _evict_disk(self):
+        excess = self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self._disk_size
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)", (excess,)
+            )
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM responses")
+                self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def with_response_cache(model: BaseChatModel, cache: BaseCache) -> BaseChatModel:
+    """
+    Returns a copy of model that uses cache. The copy shares the client (and its connection)
+    with the original, so pooled models are not mutated.
+    """
+    return model.model_copy(update={"cache": cache})
@@ -0,0 +1,299 @@
+from loguru import logger
+import random
+import threading
+import time
+from collections import deque
+from typing import Any
+
+from src.llm.llm_chat_model import LLMChatModelFactory, child_callbacks
+from src.llm_chains.stream_metrics import percentile
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.outputs import ChatResult
+import sys
+
+if sys.version_info >= (3, 12):
+    from typing import override
+else:
+    from typing_extensions import override
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# errors of the request rather than of the backend, e.g. google.api_core, openai and pydantic ones
+CLIENT_ERRORS = ("InvalidArgument", "BadRequest", "BadRequestError", "Unauthenticated", "AuthenticationError",
+                 "PermissionDenied", "PermissionDeniedError", "NotFound", "NotFoundError", "FailedPrecondition",
+                 "UnprocessableEntityError", "ValidationError")
+
+
+def is_client_error(error):
+    """
+    True for an error caused by the request itself (4xx other than 408 and 429, an invalid
+    argument), which every backend would raise again: it is not failed over. Told by the status
+    code or the error type name only, a plain ValueError may as well come from a closed channel.
+    """
+    for attr in ("code", "status_code", "status"):
+        code = getattr(error, attr, None)
+        if isinstance(code, int) and 400 <= code < 500:
+            return code not in (408, 429)
+    return type(error).__name__ in CLIENT_ERRORS
+
+
+class NoHealthyBackendError(RuntimeError):
+    """
+    Every backend is failing, or its circuit breaker is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures; after reset_timeout seconds one trial
+    call is let through (half open), which closes the breaker on success or opens it again.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0, clock=time.monotonic):
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self.state = CLOSED
+
+    @property
+    def is_open(self):
+        """
+        True while calls are refused, i.e. open and not yet due for a trial call.
+        """
+        with self._lock:
+            return self.state == OPEN and self._clock() - self._opened_at < self._reset_timeout
+
+    def allow(self):
+        with self._lock:
+            if self.state == OPEN and self._clock() - self._opened_at >= self._reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def release(self):
+        """
+        Ends a call that was neither a success nor a failure (cancelled, a client error), so that
+        a half open breaker lets the next trial call through.
+        """
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._trial_running = False
+            self.state = CLOSED
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self._failures >= self._failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit breaker opened after {self._failures} failures")
+                self.state = OPEN
+                self._opened_at = self._clock()
+
+
+class BackendRouter:
+    """
+    Per backend: a circuit breaker and the rolling latency / error rate of its last window calls.
+    order() ranks the healthy backends (breaker not open or due for a trial call, error rate at
+    most max_error_rate) fastest first by their median latency; a backend without samples ranks
+    first so that it gets measured, and with probability explore_rate a random healthy backend
+    is tried first so that the ranking follows a backend that got faster again.
+    """
+
+    def __init__(self, names, window=100, max_error_rate=0.5, failure_threshold=5, reset_timeout=30.0,
+                 explore_rate=0.05, seed=None, clock=time.monotonic):
+        self._window = window
+        self._max_error_rate = max_error_rate
+        self._explore_rate = explore_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.names = list(names)
+        self.breakers = {name: CircuitBreaker(failure_threshold, reset_timeout, clock) for name in self.names}
+        self._latencies = {name: deque(maxlen=window) for name in self.names}
+        self._outcomes = {name: deque(maxlen=window) for name in self.names}
+        self.requests = {name: 0 for name in self.names}
+        self.failures = {name: 0 for name in self.names}
+        self.failovers = 0
+
+    def _error_rate(self, name):
+        outcomes = self._outcomes[name]
+        return outcomes.count(False) / len(outcomes) if outcomes else 0.0
+
+    def _latency(self, name):
+        return percentile(list(self._latencies[name]), 50) or 0.0
+
+    def order(self):
+        """
+        The backends to try, best first; unhealthy backends come last, as a last resort.
+        """
+        with self._lock:
+            healthy = [name for name in self.names
+                       if not self.breakers[name].is_open and self._error_rate(name) <= self._max_error_rate]
+            ranked = sorted(healthy, key=self._latency)
+            if len(ranked) > 1 and self._rng.random() < self._explore_rate:
+                explored = self._rng.choice(ranked[1:])
+                ranked.remove(explored)
+                ranked.insert(0, explored)
+            return ranked + [name for name in self.names if name not in ranked]
+
+    def record(self, name, latency=None, error=None):
+        with self._lock:
+            self.requests[name] += 1
+            self._outcomes[name].append(error is None)
+            if error is None:
+                self._latencies[name].append(latency)
+            else:
+                self.failures[name] += 1
+        if error is None:
+            self.breakers[name].record_success()
+        else:
+            self.breakers[name].record_failure()
+
+    def record_failover(self):
+        with self._lock:
+            self.failovers += 1
+
+    def stats(self):
+        with self._lock:
+            return {name: {
+                "state": self.breakers[name].state,
+                "requests": self.requests[name],
+                "failures": self.failures[name],
+                "error_rate": self._error_rate(name),
+                "p50": percentile(list(self._latencies[name]), 50),
+                "p95": percentile(list(self._latencies[name]), 95),
+            } for name in self.names}
+
+
+class RoutingChatModel(BaseChatModel):
+    """
+    Sends every call to the best backend of router.order() whose breaker lets it through and
+    fails over to the next one on server, throttling and connection errors. Client errors (see
+    is_client_error) are raised at once and do not count against the backend. Raises
+    NoHealthyBackendError if no backend was allowed, otherwise the error of the last backend tried.
+    """
+    backends: dict
+    router: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "routing"
+
+    @property
+    def _identifying_params(self):
+        return {name: backend._identifying_params for name, backend in self.backends.items()}
+
+    def _candidates(self):
+        for name in self.router.order():
+            if name in self.backends and self.router.breakers[name].allow():
+                yield name
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        error = None
+        callbacks = child_callbacks(run_manager)
+        for name in self._candidates():
+            start = time.perf_counter()
+            succeeded = None
+            try:
+                result = self.backends[name].generate([messages], stop=stop, callbacks=callbacks, **kwargs)
+                succeeded = True
+            except Exception as e:
+                if is_client_error(e):
+                    raise
+                error = e
+                succeeded = False
+            finally:
+                if succeeded is None:
+                    # cancelled or a client error: not the backend's fault, but a trial call must end
+                    self.router.breakers[name].release()
+            if not succeeded:
+                self.router.record(name, error=error)
+                logger.warning(f"Backend {name} failed: {error!r}")
+                continue
+            self.router.record(name, latency=time.perf_counter() - start)
+            if error is not None:
+                self.router.record_failover()
+            return ChatResult(generations=result.generations[0], llm_output=result.llm_output)
+        raise error or NoHealthyBackendError(f"No healthy backend among {list(self.backends)}")
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        error = None
+        callbacks = child_callbacks(run_manager)
+        for name in self._candidates():
+            start = time.perf_counter()
+            succeeded = None
+            try:
+                result = await self.backends[name].agenerate([messages], stop=stop, callbacks=callbacks, **kwargs)
+                succeeded = True
+            except Exception as e:
+                if is_client_error(e):
+                    raise
+                error = e
+                succeeded = False
+            finally:
+                if succeeded is None:
+                    # cancelled or a client error: not the backend's fault, but a trial call must end
+                    self.router.breakers[name].release()
+            if not succeeded:
+                self.router.record(name, error=error)
+                logger.warning(f"Backend {name} failed: {error!r}")
+                continue
+            self.router.record(name, latency=time.perf_counter() - start)
+            if error is not None:
+                self.router.record_failover()
+            return ChatResult(generations=result.generations[0], llm_output=result.llm_output)
+        raise error or NoHealthyBackendError(f"No healthy backend among {list(self.backends)}")
+
+
+class RoutingChatModelFactory(LLMChatModelFactory):
+    """
+    Combines several factories (e.g. GeminiChatModelFactory and VertexAIChatModelFactory) into
+    one model that routes each call to the currently fastest healthy backend and fails over on
+    errors. The latency, error and breaker state live in self.router, shared by every model
+    built by this factory. A backend whose factory fails to build (e.g. missing credentials)
+    is left out.
+
+        factory = RoutingChatModelFactory({"gemini": GeminiChatModelFactory(), "vertexai": VertexAIChatModelFactory()})
+        llm = factory.build()
+        factory.router.stats()
+
+    Args:
+        factories (dict): name -> LLMChatModelFactory.
+        window (int): Calls per backend the latency and error rate are computed on.
+        max_error_rate (float): Backends with a higher error rate are only tried as a last resort.
+        failure_threshold (int): Consecutive failures that open a backend's circuit breaker.
+        reset_timeout (float): Seconds before an open breaker lets a trial call through.
+        explore_rate (float): Share of calls sent to a random healthy backend first.
+    """
+
+    def __init__(self, factories, window=100, max_error_rate=0.5, failure_threshold=5, reset_timeout=30.0,
+                 explore_rate=0.05, seed=None, clock=time.monotonic):
+        self._factories = dict(factories)
+        self.router = BackendRouter(self._factories, window, max_error_rate, failure_threshold, reset_timeout,
+                                    explore_rate, seed, clock)
+
+    @override
+    def build(self) -> BaseChatModel:
+        backends = {}
+        for name, factory in self._factories.items():
+            try:
+                backends[name] = factory.build()
+            except Exception as e:
+                logger.warning(f"Backend {name} is not available: {e!r}")
+        if not backends:
+            raise NoHealthyBackendError(f"None of the backends {list(self._factories)} could be built")
+        return RoutingChatModel(backends=backends, router=self.router)
@@ -1,6 +1,10 @@
+from src.configs.config import settings
 from src.llm.llm_chat_model import LLMChatModelFactory
+from src.llm.response_cache import with_response_cache
+from src.llm.chat_model_pool import default_chat_model_pool
 from langchain_core.language_models import BaseChatModel
 from langchain_google_vertexai import ChatVertexAI
+import os
 import sys
 
 if sys.version_info >= (3, 12):
@@ -9,10 +13,26 @@ else:
     from typing_extensions import override
 
 class VertexAIChatModelFactory(LLMChatModelFactory):
-    def __init__(self):
-        pass
+    def __init__(self, model_name="gemini-1.0-pro-001", temperature=None, max_tokens=None, pool=None, response_cache=None):
+        self._model_name = model_name
+        self._temperature = temperature
+        self._max_tokens = max_tokens
+        # models are shared through the pool, pass a ChatModelPool of your own to isolate them
+        self._pool = pool if pool is not None else default_chat_model_pool
+        # opt-in, e.g. a TwoTierResponseCache, see src.llm.response_cache
+        self._response_cache = response_cache
 
     @override
     def build(self) -> BaseChatModel:
-        llm = ChatVertexAI(model_name="gemini-1.0-pro-001")
+        settings.ensure_proxy()
+        # credentials come from GOOGLE_APPLICATION_CREDENTIALS / ADC
+        key = ("vertexai", self._model_name, self._temperature, self._max_tokens,
+               os.environ.get("GOOGLE_APPLICATION_CREDENTIALS"))
+        llm = self._pool.get(key, lambda: ChatVertexAI(
+            model_name=self._model_name,
+            temperature=self._temperature,
+            max_tokens=self._max_tokens,
+        ))
+        if self._response_cache is not None:
+            llm = with_response_cache(llm, self._response_cache)
         return llm
@@ -0,0 +1,249 @@
+from loguru import logger
+import asyncio
+import re
+import time
+from dataclasses import dataclass, field
+
+_LEADING_429 = re.compile(r"\s*429\b")
+# CJK ideographs, kana, hangul and CJK punctuation / full-width forms: about a token each
+_CJK = re.compile(r"[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]")
+
+
+def estimate_tokens(value):
+    """
+    A cheap token estimate of a chain input: a token per CJK character, ~4 characters per token
+    for the rest.
+    """
+    if isinstance(value, dict):
+        return sum(estimate_tokens(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(estimate_tokens(v) for v in value)
+    text = str(value)
+    cjk = len(_CJK.findall(text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def is_throttling_error(error):
+    """
+    True for 429 / quota errors, whichever client raised them, or wrapped them (e.g. langchain
+    wrappers of google.api_core errors). A 429 in the message only counts as the leading
+    status code ("429 Too Many Requests"), not in an id or a size.
+    """
+    while error is not None:
+        for attr in ("code", "status_code", "status"):
+            if getattr(error, attr, None) == 429:
+                return True
+        if type(error).__name__ in ("ResourceExhausted", "RateLimitError", "TooManyRequests"):
+            return True
+        message = str(error)
+        if _LEADING_429.match(message) or "RESOURCE_EXHAUSTED" in message:
+            return True
+        error = error.__cause__
+    return False
+
+
+class TokenBucket:
+    """
+    An asyncio token bucket refilled at rate_per_minute, holding at most capacity tokens.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None, clock=time.monotonic):
+        self._rate = rate_per_minute / 60.0
+        self._capacity = capacity or rate_per_minute
+        self._tokens = self._capacity
+        self._clock = clock
+        self._updated_at = clock()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    async def acquire(self, amount=1):
+        # a single request larger than the bucket must still get through eventually
+        amount = min(amount, self._capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return
+                await asyncio.sleep((amount - self._tokens) / self._rate)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limits in-flight calls with an AIMD (additive increase, multiplicative decrease) limit:
+    every successful call under target_latency raises the limit by 1/limit (i.e. +1 per
+    "window" of calls), a throttled or too slow call multiplies it by backoff_factor. The limit
+    is decreased at most once per window: the calls that were in flight when it was decreased
+    were sent under the old limit, their congestion signals are not counted again.
+    """
+
+    def __init__(self, initial=4, min_limit=1, max_limit=64, target_latency=None, backoff_factor=0.5):
+        self._limit = float(initial)
+        self._min_limit = min_limit
+        self._max_limit = max_limit
+        self._target_latency = target_latency
+        self._backoff_factor = backoff_factor
+        self._in_flight = 0
+        # calls sent before the last decrease and not yet released
+        self._before_decrease = 0
+        self._condition = asyncio.Condition()
+        self.max_in_flight = 0
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self._in_flight)
+
+    async def release(self, latency=None, throttled=False):
+        async with self._condition:
+            self._in_flight -= 1
+            stale = self._before_decrease > 0
+            if stale:
+                self._before_decrease -= 1
+            if throttled or (self._target_latency is not None and latency is not None and latency > self._target_latency):
+                if not stale:
+                    self._limit = max(self._min_limit, self._limit * self._backoff_factor)
+                    self._before_decrease = self._in_flight
+            else:
+                self._limit = min(self._max_limit, self._limit + 1.0 / self._limit)
+            self._condition.notify_all()
+
+
+@dataclass
+class BatchReport:
+    """
+    Throughput achieved by one BatchRunner run.
+    """
+    requests: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    throttled: int = 0
+    estimated_tokens: int = 0
+    elapsed_seconds: float = 0.0
+    final_concurrency: int = 0
+    max_in_flight: int = 0
+    latencies: list = field(default_factory=list, repr=False)
+
+    @property
+    def requests_per_second(self):
+        return self.succeeded / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    @property
+    def tokens_per_minute(self):
+        return self.estimated_tokens * 60 / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+class BatchRunner:
+    """
+    Runs a chain (e.g. from TranslateChainFactory.create_chain) over many inputs within
+    requests-per-minute and tokens-per-minute budgets, adapting the number of in-flight calls
+    to the observed latency and 429s. Results are returned in input order; throttled calls are
+    retried with exponential backoff, other errors are returned in place of the result when
+    return_exceptions is set, otherwise raised.
+
+    Args:
+        requests_per_minute (int): The RPM budget, None for unlimited.
+        tokens_per_minute (int): The TPM budget (estimated prompt + expected output tokens), None for unlimited.
+        expected_output_tokens (int): Output tokens budgeted per request.
+        initial_concurrency (int): In-flight calls to start with.
+        max_concurrency (int): Upper bound of in-flight calls.
+        target_latency (float): Calls slower than this (seconds) count as congestion.
+        max_retries (int): Retries of a throttled call.
+        retry_backoff (float): First retry delay in seconds, doubled on every retry.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None, expected_output_tokens=0,
+                 initial_concurrency=4, max_concurrency=64, target_latency=None,
+                 max_retries=5, retry_backoff=1.0, token_estimator=estimate_tokens):
+        self._requests_per_minute = requests_per_minute
+        self._tokens_per_minute = tokens_per_minute
+        self._expected_output_tokens = expected_output_tokens
+        self._initial_concurrency = initial_concurrency
+        self._max_concurrency = max_concurrency
+        self._target_latency = target_latency
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._token_estimator = token_estimator
+        self.report = None
+
+    async def arun(self, chain, inputs, return_exceptions=False):
+        inputs = list(inputs)
+        # created here so that they bind to the running event loop
+        request_bucket = TokenBucket(self._requests_per_minute) if self._requests_per_minute else None
+        token_bucket = TokenBucket(self._tokens_per_minute) if self._tokens_per_minute else None
+        limiter = AdaptiveConcurrencyLimiter(
+            initial=self._initial_concurrency, max_limit=self._max_concurrency, target_latency=self._target_latency
+        )
+        report = BatchReport(requests=len(inputs))
+        self.report = report
+
+        async def run_one(value):
+            tokens = self._token_estimator(value) + self._expected_output_tokens
+            for attempt in range(self._max_retries + 1):
+                if request_bucket:
+                    await request_bucket.acquire()
+                if token_bucket:
+                    await token_bucket.acquire(tokens)
+                await limiter.acquire()
+                start = time.perf_counter()
+                try:
+                    result = await chain.ainvoke(value)
+                except Exception as e:
+                    throttled = is_throttling_error(e)
+                    await limiter.release(time.perf_counter() - start, throttled=throttled)
+                    if not throttled or attempt == self._max_retries:
+                        raise
+                    report.throttled += 1
+                    delay = self._retry_backoff * 2 ** attempt
+                    logger.warning(f"Throttled, retry {attempt + 1}/{self._max_retries} in {delay:.2f}s, concurrency now {limiter.limit}")
+                    await asyncio.sleep(delay)
+                    continue
+                latency = time.perf_counter() - start
+                await limiter.release(latency)
+                report.latencies.append(latency)
+                report.estimated_tokens += tokens
+                report.succeeded += 1
+                return result
+
+        async def run_guarded(value):
+            try:
+                return await run_one(value)
+            except Exception as e:
+                report.failed += 1
+                if return_exceptions:
+                    return e
+                raise
+
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(run_guarded(value)) for value in inputs]
+        try:
+            # gather keeps the input order, the limiter decides how many actually run
+            return await asyncio.gather(*tasks)
+        finally:
+            # on the first error the other calls would go on spending tokens and quota
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            report.elapsed_seconds = time.perf_counter() - start
+            report.final_concurrency = limiter.limit
+            report.max_in_flight = limiter.max_in_flight
+            logger.info(
+                f"Batch done: {report.succeeded}/{report.requests} ok, {report.throttled} throttled, "
+                f"{report.requests_per_second:.2f} req/s, {report.tokens_per_minute:.0f} tokens/min, "
+                f"concurrency {report.final_concurrency}"
+            )
+
+    def run(self, chain, inputs, return_exceptions=False):
+        """
+        Sync version of arun, not to be called from a running event loop.
+        """
+        return asyncio.run(self.arun(chain, inputs, return_exceptions=return_exceptions))
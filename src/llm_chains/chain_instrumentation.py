@@ -0,0 +1,305 @@
+from loguru import logger
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.llm_chains.stream_metrics import percentile
+
+# upper bounds (seconds) of the latency histogram buckets, the last bucket is open
+HISTOGRAM_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_CONTAINERS = ("RunnableSequence", "RunnableParallel", "RunnableAssign", "ForkJoin")
+
+
+@dataclass
+class RunRecord:
+    """
+    One runnable execution (prompt, LLM call, parser, lambda, sequence, parallel map...).
+    """
+    run_id: UUID
+    parent_run_id: Optional[UUID]
+    name: str
+    run_type: str
+    tags: list
+    start: float
+    end: Optional[float] = None
+    error: Optional[str] = None
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+    children: list = field(default_factory=list)
+    stage: str = ""
+    queue_delay: float = 0.0
+
+    @property
+    def duration(self):
+        return None if self.end is None else self.end - self.start
+
+    def tag_value(self, prefix):
+        for tag in self.tags:
+            if tag.startswith(prefix):
+                return tag[len(prefix):]
+        return None
+
+
+class ChainInstrumentation(BaseCallbackHandler):
+    """
+    A callback handler recording every runnable of a chain: wall time, queueing delay (how long
+    a step waited after it could have started, i.e. after its parent started or its preceding
+    sequence step ended), LLM input/output tokens and the parallel overlap of RunnableParallel
+    branches. Pass it as a callback:
+
+        instrumentation = ChainInstrumentation()
+        chain.invoke(inputs, config={"callbacks": [instrumentation]})
+        instrumentation.stage_summary()
+        instrumentation.write_chrome_trace("trace.json")
+
+    Stages are named by their path below the root run, using the RunnableParallel key for
+    branches, e.g. "definition/ChatGoogleGenerativeAI"; records of many runs are aggregated per stage.
+
+    A long-lived handler keeps only the last max_roots finished root runs (None for all), older
+    ones are dropped; runs still in flight are always kept.
+    """
+
+    # called on the event loop thread in async chains, so timestamps are not skewed by an executor
+    run_inline = True
+
+    def __init__(self, clock=time.perf_counter, max_roots=1000):
+        self._clock = clock
+        self._max_roots = max_roots
+        self._lock = threading.Lock()
+        # the runs in flight by id, for their callbacks to find their record and parent
+        self._runs = {}
+        self.roots = []
+
+    def reset(self):
+        with self._lock:
+            self._runs.clear()
+            self.roots.clear()
+
+    # --- callbacks ---
+
+    def _start(self, run_id, parent_run_id, name, run_type, tags):
+        now = self._clock()
+        with self._lock:
+            record = RunRecord(run_id, parent_run_id, name or run_type, run_type, list(tags or []), now)
+            self._runs[run_id] = record
+            parent = self._runs.get(parent_run_id)
+            if parent is None:
+                self.roots.append(record)
+            else:
+                parent.children.append(record)
+
+    def _end(self, run_id, error=None):
+        now = self._clock()
+        with self._lock:
+            record = self._runs.get(run_id)
+            if record is not None:
+                record.end = now
+                record.error = error
+                if record.parent_run_id not in self._runs:
+                    self._finish_root(record)
+
+    def _finish_root(self, root):
+        # the records stay reachable through self.roots, only the index of the runs in flight is cleaned up
+        stack = [root]
+        while stack:
+            record = stack.pop()
+            self._runs.pop(record.run_id, None)
+            stack.extend(record.children)
+        if self._max_roots is None:
+            return
+        finished = [r for r in self.roots if r.end is not None]
+        if len(finished) > self._max_roots:
+            dropped = {id(r) for r in finished[:len(finished) - self._max_roots]}
+            self.roots = [r for r in self.roots if id(r) not in dropped]
+
+    @staticmethod
+    def _name(serialized, kwargs, default):
+        return kwargs.get("name") or (serialized or {}).get("name") or default
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs: Any):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "chain"), kwargs.get("run_type") or "chain", tags)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs: Any):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs: Any):
+        self._end(run_id, repr(error))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs: Any):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "chat_model"), "llm", tags)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, tags=None, metadata=None, **kwargs: Any):
+        self._start(run_id, parent_run_id, self._name(serialized, kwargs, "llm"), "llm", tags)
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any):
+        input_tokens, output_tokens = self._token_usage(response)
+        with self._lock:
+            record = self._runs.get(run_id)
+            if record is not None:
+                record.input_tokens = input_tokens
+                record.output_tokens = output_tokens
+        self._end(run_id)
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any):
+        self._end(run_id, repr(error))
+
+    @staticmethod
+    def _token_usage(response):
+        input_tokens = output_tokens = None
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    input_tokens = (input_tokens or 0) + usage.get("input_tokens", 0)
+                    output_tokens = (output_tokens or 0) + usage.get("output_tokens", 0)
+        if input_tokens is None and response.llm_output:
+            usage = response.llm_output.get("token_usage") or response.llm_output.get("usage_metadata") or {}
+            input_tokens = usage.get("prompt_tokens", usage.get("input_tokens"))
+            output_tokens = usage.get("completion_tokens", usage.get("output_tokens"))
+        return input_tokens, output_tokens
+
+    # --- analysis ---
+
+    def _finished_roots(self):
+        with self._lock:
+            return [root for root in self.roots if root.end is not None]
+
+    def _annotate(self, record, path, ready_at):
+        record.queue_delay = max(0.0, record.start - ready_at)
+        key = record.tag_value("map:key:")
+        record.stage = "/".join(part for part in (path, key or record.name) if part)
+        # the root and plain sequence/parallel containers do not add to the path of their children,
+        # so that e.g. a branch LLM call is named "definition/ChatGoogleGenerativeAI"
+        if record.parent_run_id is None or (key is None and record.name.startswith(_CONTAINERS)):
+            child_path = path
+        else:
+            child_path = record.stage
+        steps = {}
+        for child in record.children:
+            step = child.tag_value("seq:step:")
+            if step is not None:
+                steps[int(step)] = child
+        for child in record.children:
+            step = child.tag_value("seq:step:")
+            previous = steps.get(int(step) - 1) if step is not None else None
+            child_ready = previous.end if previous is not None and previous.end is not None else record.start
+            self._annotate(child, child_path, child_ready)
+
+    def records(self, root=None):
+        """
+        Every finished record of root (default: of all finished root runs), annotated with stage and queue delay.
+        """
+        roots = [root] if root is not None else self._finished_roots()
+        result = []
+        for r in roots:
+            self._annotate(r, "", r.start)
+            stack = [r]
+            while stack:
+                record = stack.pop()
+                if record.end is not None:
+                    result.append(record)
+                stack.extend(record.children)
+        return sorted(result, key=lambda record: record.start)
+
+    @staticmethod
+    def parallel_overlap(record):
+        """
+        Sum of the branch durations divided by the wall time of the branches: 1.0 means the
+        branches ran one after the other, N means N branches fully overlapped.
+        """
+        branches = [child for child in record.children if child.end is not None and child.tag_value("map:key:") is not None]
+        if len(branches) < 2:
+            return None
+        wall = max(child.end for child in branches) - min(child.start for child in branches)
+        return sum(child.duration for child in branches) / wall if wall > 0 else None
+
+    def stage_summary(self):
+        """
+        Per stage: count, latency percentiles, histogram, mean queueing delay, tokens and parallel overlap.
+        """
+        stages = {}
+        for record in self.records():
+            stages.setdefault(record.stage, []).append(record)
+        summary = {}
+        for stage, records in stages.items():
+            durations = [record.duration for record in records]
+            histogram = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+            for duration in durations:
+                histogram[next((i for i, bound in enumerate(HISTOGRAM_BUCKETS) if duration <= bound), len(HISTOGRAM_BUCKETS))] += 1
+            overlaps = [o for o in (self.parallel_overlap(record) for record in records) if o is not None]
+            input_tokens = [record.input_tokens for record in records if record.input_tokens is not None]
+            output_tokens = [record.output_tokens for record in records if record.output_tokens is not None]
+            summary[stage] = {
+                "run_type": records[0].run_type,
+                "count": len(records),
+                "errors": sum(1 for record in records if record.error),
+                "total_seconds": sum(durations),
+                "p50": percentile(durations, 50),
+                "p95": percentile(durations, 95),
+                "max": max(durations),
+                "histogram": dict(zip([f"<={bound}s" for bound in HISTOGRAM_BUCKETS] + ["inf"], histogram)),
+                "mean_queue_delay": sum(record.queue_delay for record in records) / len(records),
+                "input_tokens": sum(input_tokens) if input_tokens else None,
+                "output_tokens": sum(output_tokens) if output_tokens else None,
+                "parallel_overlap": sum(overlaps) / len(overlaps) if overlaps else None,
+            }
+        return summary
+
+    def log_summary(self):
+        for stage, stats in sorted(self.stage_summary().items(), key=lambda item: -item[1]["total_seconds"]):
+            logger.info(
+                f"{stage}: n={stats['count']} p50={stats['p50']:.3f}s p95={stats['p95']:.3f}s "
+                f"queue={stats['mean_queue_delay']:.3f}s tokens={stats['input_tokens']}/{stats['output_tokens']}"
+            )
+
+    def chrome_trace(self, root=None):
+        """
+        The runs as Chrome trace events (load in chrome://tracing or https://ui.perfetto.dev).
+        Overlapping runs are spread over lanes so that every lane is properly nested.
+        """
+        records = self.records(root)
+        if not records:
+            return {"traceEvents": []}
+        origin = records[0].start
+        lanes = []  # stack of end times per lane
+        events = []
+        for record in records:
+            lane = None
+            for index, stack in enumerate(lanes):
+                while stack and stack[-1] <= record.start:
+                    stack.pop()
+                if not stack or stack[-1] >= record.end:
+                    lane = index
+                    break
+            if lane is None:
+                lanes.append([])
+                lane = len(lanes) - 1
+            lanes[lane].append(record.end)
+            events.append({
+                "name": record.name,
+                "cat": record.run_type,
+                "ph": "X",
+                "ts": (record.start - origin) * 1e6,
+                "dur": record.duration * 1e6,
+                "pid": 0,
+                "tid": lane,
+                "args": {
+                    "stage": record.stage,
+                    "queue_delay_ms": record.queue_delay * 1e3,
+                    "input_tokens": record.input_tokens,
+                    "output_tokens": record.output_tokens,
+                    "error": record.error,
+                },
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path, root=None):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(root), f)
+        logger.info(f"Chrome trace written to {path}")
@@ -0,0 +1,159 @@
+import src.configs.config
+from loguru import logger
+import re
+import time
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from src.llm_chains.batch_runner import estimate_tokens
+
+# a sentence ends with punctuation (western or CJK) followed by whitespace, or right after CJK punctuation
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+|(?<=[。！？；])\s*")
+_PARAGRAPH_END = re.compile(r"\n\s*\n")
+
+
+def _split_keep_separators(text, pattern):
+    """
+    Splits text into [(piece, separator_after), ...] so that "".join(p + s) == text.
+    """
+    pieces = []
+    position = 0
+    for match in pattern.finditer(text):
+        piece = text[position:match.start()]
+        if not piece and pieces:
+            # e.g. a zero-width match right after CJK punctuation, glue it to the previous piece
+            pieces[-1] = (pieces[-1][0], pieces[-1][1] + match.group(0))
+        else:
+            pieces.append((piece, match.group(0)))
+        position = match.end()
+    if position < len(text):
+        pieces.append((text[position:], ""))
+    return pieces
+
+
+def split_into_chunks(text, max_tokens=1500, token_estimator=estimate_tokens):
+    """
+    Splits text on paragraph, then sentence boundaries into chunks of at most max_tokens
+    (estimated). Returns [(chunk, separator_after), ...]; joining chunk + separator gives back
+    the original text, so translations can be reassembled with the original layout.
+    A single sentence longer than the budget is split on characters.
+    """
+    max_chars_per_token = max(1, len(text) // max(token_estimator(text), 1))
+    units = []
+    for paragraph, paragraph_separator in _split_keep_separators(text, _PARAGRAPH_END):
+        sentences = _split_keep_separators(paragraph, _SENTENCE_END) or [(paragraph, "")]
+        sentences[-1] = (sentences[-1][0], sentences[-1][1] + paragraph_separator)
+        for sentence, separator in sentences:
+            if token_estimator(sentence) <= max_tokens:
+                units.append((sentence, separator))
+                continue
+            step = max_tokens * max_chars_per_token
+            parts = [sentence[i:i + step] for i in range(0, len(sentence), step)]
+            units.extend((part, "") for part in parts[:-1])
+            units.append((parts[-1], separator))
+
+    chunks = []
+    current, current_tokens = "", 0
+    for sentence, separator in units:
+        tokens = token_estimator(sentence)
+        if current and current_tokens + tokens > max_tokens:
+            body = current.rstrip()
+            chunks.append((body, current[len(body):]))
+            current, current_tokens = "", 0
+        current += sentence + separator
+        current_tokens += tokens
+    if current:
+        body = current.rstrip()
+        chunks.append((body, current[len(body):]))
+    return chunks
+
+
+class DocumentTranslator:
+    """
+    Translates documents longer than one prompt: the text is split into token-budgeted chunks on
+    paragraph/sentence boundaries, the chunks are translated concurrently (at most max_concurrency
+    calls in flight) and reassembled in the original order with the original separators.
+
+    Chunks are independent calls, so instead of the previous translation (which would serialise
+    them) each chunk gets the tail of the preceding source chunk as read-only context, which keeps
+    terminology and pronouns consistent across chunk borders. Blank chunks (e.g. a whitespace-only
+    document) are kept as they are, without a call.
+
+    Args:
+        llm (BaseChatModel): The chat model, e.g. from GeminiChatModelFactory.
+        max_chunk_tokens (int): Estimated token budget of one chunk.
+        max_concurrency (int): Max chunks translated at the same time.
+        context_chars (int): Characters of the preceding chunk passed as context, 0 to disable.
+        token_estimator (callable): text -> tokens, e.g. llm.get_num_tokens for the model's own count.
+    """
+
+    def __init__(self, llm, from_language="English", to_language="Chinese",
+                 max_chunk_tokens=1500, max_concurrency=8, context_chars=200, token_estimator=estimate_tokens):
+        self._chain = self.create_chunk_chain(llm, from_language, to_language)
+        self._max_chunk_tokens = max_chunk_tokens
+        self._token_estimator = token_estimator
+        self._max_concurrency = max_concurrency
+        self._context_chars = context_chars
+        self.last_stats = None
+
+    @staticmethod
+    def create_chunk_chain(llm, from_language="English", to_language="Chinese"):
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", f"You are a helpful assistant that translates {from_language} to {to_language}. "
+                           "You translate one part of a longer document, output only the translation of that part."),
+                ("user", "Preceding text, for context only, do not translate it:\n{context}\n\n"
+                         f"Translate this part from {from_language} to {to_language}:\n{{text}}"),
+            ]
+        )
+        return prompt | llm | StrOutputParser()
+
+    def _inputs(self, chunks):
+        inputs = []
+        previous = ""
+        for chunk, _ in chunks:
+            context = previous[-self._context_chars:] if self._context_chars else ""
+            inputs.append({"text": chunk, "context": context or "(start of document)"})
+            previous = chunk
+        return inputs
+
+    @staticmethod
+    def _to_translate(chunks):
+        return [index for index, (chunk, _) in enumerate(chunks) if chunk.strip()]
+
+    @staticmethod
+    def _reassemble(chunks, indexes, translations):
+        parts = [chunk for chunk, _ in chunks]
+        for index, translation in zip(indexes, translations):
+            parts[index] = translation
+        return "".join(part + separator for part, (_, separator) in zip(parts, chunks))
+
+    def _record(self, text, chunks, start):
+        self.last_stats = {
+            "characters": len(text),
+            "chunks": len(chunks),
+            "elapsed_seconds": time.perf_counter() - start,
+        }
+        logger.info(f"Translated {len(text)} characters in {len(chunks)} chunks, {self.last_stats['elapsed_seconds']:.2f}s")
+
+    def _plan(self, text):
+        chunks = split_into_chunks(text, self._max_chunk_tokens, self._token_estimator)
+        indexes = self._to_translate(chunks)
+        inputs = self._inputs(chunks)
+        return chunks, indexes, [inputs[index] for index in indexes]
+
+    def translate(self, text):
+        start = time.perf_counter()
+        chunks, indexes, inputs = self._plan(text)
+        # batch keeps the input order, max_concurrency bounds the thread pool
+        translations = self._chain.batch(inputs, config={"max_concurrency": self._max_concurrency}) if inputs else []
+        self._record(text, indexes, start)
+        return self._reassemble(chunks, indexes, translations)
+
+    async def atranslate(self, text):
+        start = time.perf_counter()
+        chunks, indexes, inputs = self._plan(text)
+        translations = await self._chain.abatch(inputs, config={"max_concurrency": self._max_concurrency}) if inputs else []
+        self._record(text, indexes, start)
+        return self._reassemble(chunks, indexes, translations)
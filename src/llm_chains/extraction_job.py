@@ -0,0 +1,326 @@
+import src.configs.config
+from loguru import logger
+import asyncio
+import csv
+import glob
+import json
+import os
+import time
+from dataclasses import dataclass
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.llm_chains.batch_runner import is_throttling_error
+
+# USD per million tokens, gemini-2.0-flash list prices
+DEFAULT_INPUT_PRICE = 0.10
+DEFAULT_OUTPUT_PRICE = 0.40
+
+
+def iter_corpus(path, text_field="text", id_field="id"):
+    """
+    Streams (doc_id, text) from a .jsonl or .csv corpus without loading it. Documents without
+    id_field are identified by their 1-based record number.
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            records = csv.DictReader(f)
+        else:
+            records = (json.loads(line) for line in f if line.strip())
+        for number, record in enumerate(records, start=1):
+            doc_id = record.get(id_field)
+            yield str(doc_id if doc_id not in (None, "") else number), record[text_field]
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Sums the usage_metadata of every LLM call of the runs it is passed to.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                self.input_tokens += usage.get("input_tokens", 0)
+                self.output_tokens += usage.get("output_tokens", 0)
+
+
+class JsonlResultWriter:
+    """
+    Appends one JSON line per result; the lines of a previous run are its checkpoint. Every line
+    is handed to the OS when written, so a crashed process loses none; flush_every lines are
+    fsynced at a time.
+    """
+
+    def __init__(self, path, flush_every=100):
+        self._path = path
+        self._flush_every = flush_every
+        self._file = None
+        self._pending = 0
+
+    def completed_ids(self):
+        ids = set()
+        if not os.path.exists(self._path):
+            return ids
+        valid_size = 0
+        with open(self._path, "rb") as f:
+            for line in f:
+                try:
+                    ids.add(str(json.loads(line)["id"]))
+                except (ValueError, KeyError):
+                    # the torn last line of a crashed run, it is cut off below
+                    break
+                valid_size += len(line)
+        if valid_size < os.path.getsize(self._path):
+            with open(self._path, "r+b") as f:
+                f.truncate(valid_size)
+        return ids
+
+    def write(self, record):
+        if self._file is None:
+            directory = os.path.dirname(self._path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._file = open(self._path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._pending += 1
+        if self._pending >= self._flush_every:
+            self.flush()
+
+    def flush(self):
+        if self._file is not None and self._pending:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = 0
+
+    def close(self):
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ParquetResultWriter:
+    """
+    Writes the results as a directory of part-NNNNN.parquet files of flush_every rows each, a
+    part is only visible once complete, so the parts of a previous run are its checkpoint.
+    Needs pyarrow.
+    """
+
+    def __init__(self, path, flush_every=1000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("Parquet output needs pyarrow: pip install pyarrow") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._path = path
+        self._flush_every = flush_every
+        self._rows = []
+
+    def _parts(self):
+        return sorted(glob.glob(os.path.join(self._path, "part-*.parquet")))
+
+    def completed_ids(self):
+        ids = set()
+        for part in self._parts():
+            ids.update(str(doc_id) for doc_id in self._pq.read_table(part, columns=["id"]).column("id").to_pylist())
+        return ids
+
+    def write(self, record):
+        # nested values are stored as JSON text, so that every part has the same flat schema
+        self._rows.append({key: json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+                           for key, value in record.items()})
+        if len(self._rows) >= self._flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        os.makedirs(self._path, exist_ok=True)
+        part = os.path.join(self._path, f"part-{len(self._parts()):05d}.parquet")
+        temporary = part + ".tmp"
+        self._pq.write_table(self._pa.Table.from_pylist(self._rows), temporary)
+        os.replace(temporary, part)
+        self._rows = []
+
+    def close(self):
+        self.flush()
+
+
+@dataclass
+class ExtractionJobReport:
+    documents: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    elapsed_seconds: float = 0.0
+    input_tokens: int = 0
+    output_tokens: int = 0
+    cost: float = 0.0
+
+    @property
+    def docs_per_second(self):
+        return (self.succeeded + self.failed) / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    @property
+    def cost_per_1k_documents(self):
+        done = self.succeeded + self.failed
+        return self.cost * 1000 / done if done else 0.0
+
+
+class ExtractionJob:
+    """
+    Runs an extraction chain (e.g. extraction_chain of src/poc/long_chain_poc1.py) over a corpus
+    too large for memory: documents are streamed from a JSONL/CSV file, extracted by
+    max_concurrency workers, validated against schema and written as they complete.
+
+    The output is the checkpoint: a restarted job skips every document already in the output,
+    so a crashed run does not pay for its completed documents again. Documents that failed
+    (invalid output, errors) are listed in <output>.errors.jsonl and retried by the next run.
+    The output is flushed before every progress line, which is how far a crash can set it back
+    for Parquet. An error reading the corpus stops the workers and is raised.
+
+        job = ExtractionJob(extraction_chain, ExtractedInfo, input_key="text_input", max_concurrency=16)
+        report = job.run("corpus.jsonl", "logs/extracted.jsonl")
+
+    Args:
+        chain (Runnable): {input_key: text} -> dict (or pydantic model) of the extracted fields.
+        schema (type[BaseModel]): Validates the chain output, None to keep it as is.
+        input_key (str): The chain input key of the document text.
+        max_concurrency (int): Max documents in flight.
+        max_retries (int): Retries of a throttled call, with exponential backoff from retry_backoff seconds.
+        input_price (float): USD per million input tokens.
+        output_price (float): USD per million output tokens.
+        flush_every (int): Results written between two flushes (JSONL) or per part file (Parquet).
+        progress_every (int): Documents between two progress log lines.
+    """
+
+    def __init__(self, chain, schema=None, input_key="text_input", max_concurrency=8, max_retries=3, retry_backoff=1.0,
+                 input_price=DEFAULT_INPUT_PRICE, output_price=DEFAULT_OUTPUT_PRICE, flush_every=100, progress_every=1000):
+        self._chain = chain
+        self._schema = schema
+        self._input_key = input_key
+        self._max_concurrency = max_concurrency
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._input_price = input_price
+        self._output_price = output_price
+        self._flush_every = flush_every
+        self._progress_every = progress_every
+        self.report = None
+
+    def _writer(self, output_path):
+        if output_path.endswith(".jsonl"):
+            return JsonlResultWriter(output_path, self._flush_every)
+        return ParquetResultWriter(output_path, self._flush_every)
+
+    def _validate(self, output):
+        if self._schema is None:
+            return output
+        if isinstance(output, self._schema):
+            return output.model_dump()
+        return self._schema.model_validate(output).model_dump()
+
+    async def _extract(self, text, config):
+        for attempt in range(self._max_retries + 1):
+            try:
+                return self._validate(await self._chain.ainvoke({self._input_key: text}, config=config))
+            except Exception as e:
+                if not is_throttling_error(e) or attempt == self._max_retries:
+                    raise
+                await asyncio.sleep(self._retry_backoff * 2 ** attempt)
+
+    async def arun(self, corpus_path, output_path, text_field="text", id_field="id", limit=None):
+        """
+        Args:
+            corpus_path (str): A .jsonl or .csv file.
+            output_path (str): A .jsonl file, or a directory of Parquet parts for any other path.
+            limit (int): Max documents to extract in this run (skipped ones not counted), e.g. for a trial run.
+        """
+        writer = self._writer(output_path)
+        errors_path = output_path.rstrip("/") + ".errors.jsonl"
+        if os.path.exists(errors_path):
+            # the failures of the previous run are retried below
+            os.remove(errors_path)
+        errors = JsonlResultWriter(errors_path, flush_every=1)
+        completed = writer.completed_ids()
+        if completed:
+            logger.info(f"Resuming extraction, {len(completed)} documents already in {output_path}")
+        usage = TokenUsageCallback()
+        config = {"callbacks": [usage]}
+        report = ExtractionJobReport()
+        self.report = report
+        # bounded, so the corpus is read only as fast as the workers extract it
+        queue = asyncio.Queue(maxsize=self._max_concurrency * 2)
+
+        async def produce():
+            queued = 0
+            for doc_id, text in iter_corpus(corpus_path, text_field, id_field):
+                report.documents += 1
+                if doc_id in completed:
+                    report.skipped += 1
+                    continue
+                if limit is not None and queued >= limit:
+                    break
+                await queue.put((doc_id, text))
+                queued += 1
+            for _ in range(self._max_concurrency):
+                await queue.put(None)
+
+        async def work():
+            while (item := await queue.get()) is not None:
+                doc_id, text = item
+                try:
+                    result = await self._extract(text, config)
+                except Exception as e:
+                    report.failed += 1
+                    errors.write({"id": doc_id, "error": repr(e)})
+                else:
+                    report.succeeded += 1
+                    writer.write({"id": doc_id, **result} if isinstance(result, dict) else {"id": doc_id, "result": result})
+                done = report.succeeded + report.failed
+                if done % self._progress_every == 0:
+                    writer.flush()
+                    self._update(report, usage, start)
+                    logger.info(f"Extracted {done} documents, {report.docs_per_second:.1f} docs/s, "
+                                f"${report.cost_per_1k_documents:.4f} per 1k documents")
+
+        start = time.perf_counter()
+        tasks = [asyncio.ensure_future(produce()), *(asyncio.ensure_future(work()) for _ in range(self._max_concurrency))]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            # if the corpus could not be read the workers would wait for their sentinel for ever
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            writer.close()
+            errors.close()
+            self._update(report, usage, start)
+            logger.info(
+                f"Extraction done: {report.succeeded} ok, {report.failed} failed, {report.skipped} skipped, "
+                f"{report.docs_per_second:.1f} docs/s, {report.input_tokens}/{report.output_tokens} tokens, "
+                f"${report.cost:.4f} (${report.cost_per_1k_documents:.4f} per 1k documents)"
+            )
+        return report
+
+    def _update(self, report, usage, start):
+        report.elapsed_seconds = time.perf_counter() - start
+        report.input_tokens = usage.input_tokens
+        report.output_tokens = usage.output_tokens
+        report.cost = (usage.input_tokens * self._input_price + usage.output_tokens * self._output_price) / 1e6
+
+    def run(self, corpus_path, output_path, text_field="text", id_field="id", limit=None):
+        """
+        Sync version of arun, not to be called from a running event loop.
+        """
+        return asyncio.run(self.arun(corpus_path, output_path, text_field, id_field, limit))
@@ -0,0 +1,279 @@
+import src.configs.config
+from loguru import logger
+import asyncio
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import patch_config
+
+MISSING = "(unavailable)"
+
+
+class _BranchSlots:
+    """
+    The permits a sync branch runs with, one of each semaphore. They are given back when the
+    branch ends or when it times out, whichever comes first: the thread of a stuck branch
+    cannot be stopped, but it must not keep the other branches waiting.
+    """
+
+    def __init__(self, *semaphores):
+        self._semaphores = semaphores
+        self._lock = threading.Lock()
+        self._held = False
+        self._abandoned = False
+
+    def acquire(self):
+        """
+        False if the branch timed out while it waited, it is then not run at all.
+        """
+        for semaphore in self._semaphores:
+            semaphore.acquire()
+        with self._lock:
+            if not self._abandoned:
+                self._held = True
+                return True
+        for semaphore in self._semaphores:
+            semaphore.release()
+        return False
+
+    def release(self):
+        with self._lock:
+            if not self._held:
+                return
+            self._held = False
+        for semaphore in self._semaphores:
+            semaphore.release()
+
+    def abandon(self):
+        with self._lock:
+            self._abandoned = True
+        self.release()
+
+
+def _start_thread(fn, *args):
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="fork-join", daemon=True).start()
+    return future
+
+
+@dataclass
+class BranchSpec:
+    """
+    One branch of a fork-join chain.
+
+    Args:
+        name (str): The key of the branch output in the join input.
+        runnable (Runnable|str): A runnable, or a prompt template run as prompt | llm | StrOutputParser().
+        timeout (float): Seconds after the fork started after which the join stops waiting for
+            this branch, None for the factory default.
+        required (bool): A required branch that times out or fails fails the whole chain.
+    """
+    name: str
+    runnable: Any
+    timeout: Optional[float] = None
+    required: bool = False
+
+
+@dataclass
+class ForkJoinReport:
+    """
+    One fork: seconds per finished branch, the missing branches ("timeout" or "error"), the wall
+    time of the fork, and how long the join waited for the slowest branch after every other
+    branch had finished (slowest_branch_cost).
+    """
+    latencies: dict = field(default_factory=dict)
+    missing: dict = field(default_factory=dict)
+    wall_seconds: float = 0.0
+    slowest_branch: Optional[str] = None
+    slowest_branch_cost: float = 0.0
+
+
+class ForkJoinChainFactory:
+    """
+    Builds fork-join chains like the definition/advantages/disadvantages report of
+    src/poc/folk_chain_poc.py: the input dict goes to every branch (at most max_concurrency at a
+    time), then the join step gets the input, one key per branch and "missing_branches".
+
+    Unlike a plain RunnableParallel, a branch that is late or fails does not stall or fail the
+    request: after its deadline the join runs with what finished, the missing branch values are
+    set to missing_value. Every fork is described by a ForkJoinReport, passed to the join as
+    "fork_join_report" and aggregated in stats.
+
+        factory = ForkJoinChainFactory(llm, {
+            "definition": "请用一句话简洁地定义 '{topic}'。",
+            "advantages": BranchSpec("advantages", "列出 '{topic}' 的3个主要优点。", timeout=10),
+        }, join="... {topic} {definition} {advantages} ...", timeout=20)
+        report = factory.create_chain().invoke({"topic": "可再生能源"})
+
+    Args:
+        llm (BaseChatModel): The chat model used by prompt template branches and join, may be None if all are runnables.
+        branches (dict|list): name -> runnable, prompt template or BranchSpec; or a list of BranchSpec.
+        join (Runnable|str): The join step, a runnable or a prompt template.
+        max_concurrency (int): Max branches of one fork running at the same time.
+        timeout (float): Default branch deadline in seconds, None to wait for ever.
+        missing_value (str): The value of a missing branch in the join input.
+        max_workers (int): Max sync branches running at the same time over every fork of this
+            factory; a branch past its deadline no longer counts, though its thread runs on.
+    """
+
+    def __init__(self, llm, branches, join, max_concurrency=8, timeout=None, missing_value=MISSING, max_workers=32):
+        self._llm = llm
+        self._branches = [self._branch_spec(name, value) for name, value in
+                          (branches.items() if isinstance(branches, dict) else ((b.name, b) for b in branches))]
+        self._join = self._as_runnable(join)
+        self._max_concurrency = max_concurrency
+        self._timeout = timeout
+        self._missing_value = missing_value
+        self._lock = threading.Lock()
+        self._workers = threading.BoundedSemaphore(max_workers)
+        self.stats = {"runs": 0, "timeouts": 0, "errors": 0, "slowest_branch_cost_seconds": 0.0}
+        self.slowest_branch_counts = {}
+
+    def _as_runnable(self, value):
+        if isinstance(value, str):
+            return ChatPromptTemplate.from_template(value) | self._llm | StrOutputParser()
+        return value
+
+    def _branch_spec(self, name, value):
+        spec = value if isinstance(value, BranchSpec) else BranchSpec(name, value)
+        return BranchSpec(name, self._as_runnable(spec.runnable), spec.timeout, spec.required)
+
+    def _deadline(self, branch):
+        return branch.timeout if branch.timeout is not None else self._timeout
+
+    def create_fork_chain(self):
+        """
+        The fork step alone: input dict -> input dict plus the branch outputs, "missing_branches"
+        and "fork_join_report".
+        """
+        return RunnableLambda(self._fork, afunc=self._afork, name="ForkJoin")
+
+    def create_chain(self):
+        return self.create_fork_chain() | self._join
+
+    @staticmethod
+    def _branch_config(config, run_manager, branch):
+        # the same child tag as RunnableParallel, so ChainInstrumentation names the stage after the branch
+        return patch_config(config, callbacks=run_manager.get_child(f"map:key:{branch.name}"))
+
+    def _fork(self, inputs, config, run_manager):
+        start = time.perf_counter()
+        outputs, latencies, missing = {}, {}, {}
+        # threads of their own rather than of a pool: a stuck branch would keep its pool worker
+        fork_slots = threading.BoundedSemaphore(self._max_concurrency)
+        slots = {branch.name: _BranchSlots(self._workers, fork_slots) for branch in self._branches}
+
+        def run(branch):
+            if not slots[branch.name].acquire():
+                return None
+            try:
+                output = branch.runnable.invoke(inputs, self._branch_config(config, run_manager, branch))
+            finally:
+                slots[branch.name].release()
+            latencies[branch.name] = time.perf_counter() - start
+            return output
+
+        futures = [(branch, _start_thread(run, branch)) for branch in self._branches]
+        try:
+            # waiting in deadline order, so every branch gets the time left until its own deadline
+            for branch, future in sorted(futures, key=lambda item: self._deadline(item[0]) or float("inf")):
+                deadline = self._deadline(branch)
+                remaining = None if deadline is None else max(0.0, start + deadline - time.perf_counter())
+                try:
+                    outputs[branch.name] = future.result(timeout=remaining)
+                except FutureTimeoutError:
+                    # a waiting branch is dropped, a running one finishes in the background and is ignored
+                    missing[branch.name] = "timeout"
+                    if branch.required:
+                        raise TimeoutError(f"Required branch {branch.name} timed out")
+                except Exception as e:
+                    self._branch_failed(branch, e)
+                    missing[branch.name] = "error"
+                    if branch.required:
+                        raise
+        finally:
+            for branch_slots in slots.values():
+                branch_slots.abandon()
+        return self._join_input(inputs, outputs, latencies, missing, start)
+
+    async def _afork(self, inputs, config, run_manager):
+        start = time.perf_counter()
+        outputs, latencies, missing = {}, {}, {}
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+
+        async def run(branch):
+            async with semaphore:
+                output = await branch.runnable.ainvoke(inputs, self._branch_config(config, run_manager, branch))
+            latencies[branch.name] = time.perf_counter() - start
+            return output
+
+        async def run_with_deadline(branch):
+            try:
+                outputs[branch.name] = await asyncio.wait_for(run(branch), self._deadline(branch))
+            except asyncio.TimeoutError:
+                missing[branch.name] = "timeout"
+                if branch.required:
+                    raise TimeoutError(f"Required branch {branch.name} timed out")
+            except Exception as e:
+                self._branch_failed(branch, e)
+                missing[branch.name] = "error"
+                if branch.required:
+                    raise
+
+        tasks = [asyncio.ensure_future(run_with_deadline(branch)) for branch in self._branches]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return self._join_input(inputs, outputs, latencies, missing, start)
+
+    @staticmethod
+    def _branch_failed(branch, error):
+        logger.warning(f"Fork-join branch {branch.name} failed: {error!r}")
+
+    def _join_input(self, inputs, outputs, latencies, missing, start):
+        # one snapshot: a sync branch that timed out may still be running and write its latency
+        latencies = {name: seconds for name, seconds in dict(latencies).items() if name not in missing}
+        report = ForkJoinReport(latencies=latencies, missing=dict(missing), wall_seconds=time.perf_counter() - start)
+        if latencies:
+            ordered = sorted(latencies.items(), key=lambda item: item[1])
+            report.slowest_branch = ordered[-1][0]
+            report.slowest_branch_cost = ordered[-1][1] - ordered[-2][1] if len(ordered) > 1 else 0.0
+        if missing:
+            # the join waited until the deadline of the missing branches instead
+            ended = max(latencies.values(), default=0.0)
+            report.slowest_branch = max(missing, key=lambda name: self._deadline(self._branch(name)) or 0.0)
+            report.slowest_branch_cost = max(0.0, report.wall_seconds - ended)
+            logger.warning(f"Fork-join continues without {missing}")
+        self._record(report)
+        join_input = dict(inputs)
+        join_input.update({branch.name: outputs.get(branch.name, self._missing_value) for branch in self._branches})
+        join_input["missing_branches"] = sorted(missing)
+        join_input["fork_join_report"] = report
+        return join_input
+
+    def _branch(self, name):
+        return next(branch for branch in self._branches if branch.name == name)
+
+    def _record(self, report):
+        with self._lock:
+            self.stats["runs"] += 1
+            self.stats["timeouts"] += sum(1 for reason in report.missing.values() if reason == "timeout")
+            self.stats["errors"] += sum(1 for reason in report.missing.values() if reason == "error")
+            self.stats["slowest_branch_cost_seconds"] += report.slowest_branch_cost
+            if report.slowest_branch is not None:
+                self.slowest_branch_counts[report.slowest_branch] = self.slowest_branch_counts.get(report.slowest_branch, 0) + 1
@@ -0,0 +1,241 @@
+import src.configs.config
+from loguru import logger
+import re
+import threading
+from typing import Any, Optional
+
+import orjson
+from langchain_core.exceptions import OutputParserException
+from langchain_core.messages import BaseMessage
+from langchain_core.output_parsers import BaseOutputParser, JsonOutputParser, StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+from pydantic import PrivateAttr, ValidationError
+
+_FENCE = re.compile(r"```[a-zA-Z0-9_-]*[ \t]*\n?(.*?)(?:```|\Z)", re.DOTALL)
+# a key without its value (with or without the colon), at the end of a truncated object
+_DANGLING_KEY = re.compile(r'(?:,|(?<=\{))\s*"(?:[^"\\]|\\.)*"\s*(?::\s*)?$')
+# an unquoted number or literal at the end of a truncated answer, possibly cut off (12 of 123)
+_TRAILING_SCALAR = re.compile(r'[^\s,:\[\]{}"]+$')
+_LITERALS = {"True": "true", "False": "false", "None": "null"}
+
+FIX_PROMPT = ChatPromptTemplate.from_template(
+    "The following output should be JSON matching these instructions:\n{format_instructions}\n\n"
+    "Output:\n{completion}\n\nError:\n{error}\n\n"
+    "Answer with the corrected JSON only."
+)
+
+
+def strip_fences(text):
+    """
+    The JSON part of a model answer: the content of the first ``` fence if any, from the
+    first { or [ on.
+    """
+    match = _FENCE.search(text)
+    if match:
+        text = match.group(1)
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    return text[min(starts):].strip() if starts else text.strip()
+
+
+def repair_json(text):
+    """
+    Repairs the usual defects of LLM JSON in one pass over text: trailing commas, Python
+    literals (True/False/None), single-quoted strings, raw newlines in strings, and a truncated
+    end: unclosed arrays/objects are closed, and a value that may have been cut off
+    (unterminated string, trailing number or literal) is dropped with its key rather than kept
+    shortened, so a required field fails schema validation instead of passing with a wrong value.
+    An object cut off inside an array is dropped as a whole, so the complete ones still validate.
+    Returns the repaired text, which is not guaranteed to be valid JSON.
+    """
+    out = []
+    closers = []
+    opened_at = []  # where each unclosed array/object starts in out
+    quote = None  # the quote of the string being scanned
+    string_start = 0  # where it starts in out
+    escape = False
+    i = 0
+    while i < len(text):
+        c = text[i]
+        if quote:
+            if escape:
+                escape = False
+                out.append(c)
+            elif c == "\\":
+                escape = True
+                out.append(c)
+            elif c == quote:
+                quote = None
+                out.append('"')
+            elif c == '"':
+                # a double quote inside a single-quoted string
+                out.append('\\"')
+            elif c == "\n":
+                out.append("\\n")
+            else:
+                out.append(c)
+            i += 1
+            continue
+        if c in "\"'":
+            quote = c
+            string_start = len(out)
+            out.append('"')
+        elif c in "{[":
+            closers.append("}" if c == "{" else "]")
+            opened_at.append(len(out))
+            out.append(c)
+        elif c in "}]":
+            _strip_trailing_comma(out)
+            if closers and closers[-1] == c:
+                closers.pop()
+                opened_at.pop()
+                out.append(c)
+        else:
+            literal = next((word for word in _LITERALS if text.startswith(word, i)), None)
+            if literal and not (out and (out[-1].isalnum() or out[-1] == "_")):
+                out.append(_LITERALS[literal])
+                i += len(literal)
+                continue
+            out.append(c)
+        i += 1
+        if not closers and out and out[-1] in "}]":
+            # the top level value is complete, the rest is prose
+            break
+
+    if closers:
+        element = next((k for k in range(1, len(closers)) if closers[k - 1] == "]" and closers[k] == "}"), None)
+        if element is not None:
+            del out[opened_at[element]:]
+            del closers[element:]
+            quote = None
+        if quote:
+            del out[string_start:]
+        repaired = _TRAILING_SCALAR.sub("", "".join(out).rstrip())
+        if closers[-1] == "}":
+            repaired = _DANGLING_KEY.sub("", repaired)
+        repaired = repaired.rstrip().rstrip(",").rstrip()
+        return repaired + "".join(reversed(closers))
+    if quote:
+        if escape:
+            out.pop()
+        out.append('"')
+    return "".join(out).rstrip()
+
+
+def _strip_trailing_comma(out):
+    while out and out[-1].isspace():
+        out.pop()
+    if out and out[-1] == ",":
+        out.pop()
+
+
+class RepairingJsonOutputParser(BaseOutputParser):
+    """
+    A drop-in for JsonOutputParser(pydantic_object=...) that recovers near-valid JSON locally:
+    the answer is parsed with orjson, on failure it is stripped of code fences / prose and
+    repaired with repair_json, and the result is validated against pydantic_object. Only when
+    that fails is an OutputParserException raised, which with_llm_fallback turns into one
+    re-ask of the model. Returns a dict, like JsonOutputParser.
+
+    stats counts the path every answer took: parsed, repaired, llm_retries, failed.
+
+        parser = RepairingJsonOutputParser(pydantic_object=ExtractedInfo)
+        chain = prompt | llm | parser.with_llm_fallback(llm)
+
+    Args:
+        pydantic_object (type[BaseModel]): The expected schema, None for any JSON.
+        max_repair_chars (int): Longer answers are not repaired, bounding the local work.
+    """
+    pydantic_object: Optional[Any] = None
+    max_repair_chars: int = 100000
+
+    _stats: dict = PrivateAttr(default_factory=lambda: {"parsed": 0, "repaired": 0, "llm_retries": 0, "failed": 0})
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def stats(self):
+        return self._stats
+
+    def _count(self, path):
+        with self._lock:
+            self._stats[path] += 1
+
+    @property
+    def _type(self) -> str:
+        return "repairing_json"
+
+    def get_format_instructions(self) -> str:
+        return JsonOutputParser(pydantic_object=self.pydantic_object).get_format_instructions()
+
+    def _validate(self, value):
+        if self.pydantic_object is None:
+            return value
+        return self.pydantic_object.model_validate(value).model_dump()
+
+    def _loads(self, text):
+        """
+        The validated value, or the error of the last attempt; counts the parsed and repaired paths.
+        """
+        try:
+            value = self._validate(orjson.loads(text))
+            self._count("parsed")
+            return value, None
+        except (orjson.JSONDecodeError, ValidationError) as e:
+            error = e
+        if len(text) <= self.max_repair_chars:
+            stripped = strip_fences(text)
+            for candidate in (stripped, repair_json(stripped)):
+                try:
+                    value = self._validate(orjson.loads(candidate))
+                except (orjson.JSONDecodeError, ValidationError) as e:
+                    error = e
+                    continue
+                self._count("repaired")
+                return value, None
+        return None, error
+
+    def parse(self, text: str) -> Any:
+        value, error = self._loads(text)
+        if error is not None:
+            self._count("failed")
+            raise OutputParserException(f"Invalid JSON output: {error}", llm_output=text)
+        return value
+
+    def with_llm_fallback(self, llm, max_retries=1):
+        """
+        This parser as a runnable message -> dict that, when the local repair fails, asks llm to
+        fix its answer (at most max_retries times) instead of failing.
+        """
+        fix_chain = FIX_PROMPT | llm | StrOutputParser()
+
+        def completion_of(message):
+            return message.content if isinstance(message, BaseMessage) else str(message)
+
+        def retry_inputs(completion, error):
+            self._count("llm_retries")
+            logger.warning(f"JSON output could not be repaired, asking the model again: {error}")
+            return {"format_instructions": self.get_format_instructions(), "completion": completion, "error": str(error)}
+
+        def parse_with_retry(message, config):
+            completion = completion_of(message)
+            for attempt in range(max_retries + 1):
+                value, error = self._loads(completion)
+                if error is None:
+                    return value
+                if attempt < max_retries:
+                    completion = fix_chain.invoke(retry_inputs(completion, error), config=config)
+            self._count("failed")
+            raise OutputParserException(f"Invalid JSON output after {max_retries} retries: {error}", llm_output=completion)
+
+        async def aparse_with_retry(message, config):
+            completion = completion_of(message)
+            for attempt in range(max_retries + 1):
+                value, error = self._loads(completion)
+                if error is None:
+                    return value
+                if attempt < max_retries:
+                    completion = await fix_chain.ainvoke(retry_inputs(completion, error), config=config)
+            self._count("failed")
+            raise OutputParserException(f"Invalid JSON output after {max_retries} retries: {error}", llm_output=completion)
+
+        return RunnableLambda(parse_with_retry, afunc=aparse_with_retry, name="RepairingJsonOutputParser")
@@ -0,0 +1,95 @@
+from loguru import logger
+import asyncio
+import time
+from dataclasses import dataclass
+
+from src.llm_chains.stream_metrics import percentile
+
+
+@dataclass
+class LoadTestResult:
+    """
+    One concurrency level of a sweep. Latencies in seconds, cpu_per_request is the process CPU
+    time per request, which against a simulated model is the chain's own overhead.
+    """
+    concurrency: int
+    requests: int
+    errors: int
+    elapsed_seconds: float
+    throughput: float
+    p50: float
+    p95: float
+    p99: float
+    cpu_per_request: float
+
+    def as_row(self):
+        return (f"{self.concurrency:>6}{self.requests:>8}{self.errors:>7}{self.throughput:>11.1f}"
+                f"{self.p50 * 1e3:>9.1f}{self.p95 * 1e3:>9.1f}{self.p99 * 1e3:>9.1f}{self.cpu_per_request * 1e3:>10.3f}")
+
+
+REPORT_HEADER = f"{'conc':>6}{'reqs':>8}{'errors':>7}{'req/s':>11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'cpu ms':>10}"
+
+
+async def arun_load(chain, inputs, concurrency):
+    """
+    Runs every input through chain.ainvoke with at most concurrency calls in flight.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def run_one(value):
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await chain.ainvoke(value)
+            except Exception:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    await asyncio.gather(*(run_one(value) for value in inputs))
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+    return LoadTestResult(
+        concurrency=concurrency,
+        requests=len(inputs),
+        errors=errors,
+        elapsed_seconds=elapsed,
+        throughput=len(latencies) / elapsed if elapsed else 0.0,
+        p50=percentile(latencies, 50) or 0.0,
+        p95=percentile(latencies, 95) or 0.0,
+        p99=percentile(latencies, 99) or 0.0,
+        cpu_per_request=cpu / len(inputs) if inputs else 0.0,
+    )
+
+
+async def asweep(chain, make_input, concurrency_levels=(1, 2, 4, 8, 16, 32, 64), requests_per_level=200):
+    """
+    Runs the load at every concurrency level and returns a LoadTestResult per level.
+
+    Args:
+        chain (Runnable): e.g. TranslateChainFactory.create_chain(FakeChatModelFactory(...).build()).
+        make_input (callable): i -> the i-th chain input.
+    """
+    results = []
+    for concurrency in concurrency_levels:
+        inputs = [make_input(i) for i in range(requests_per_level)]
+        result = await arun_load(chain, inputs, concurrency)
+        logger.info(f"load test concurrency {concurrency}: {result.throughput:.1f} req/s, p99 {result.p99 * 1e3:.1f}ms")
+        results.append(result)
+    return results
+
+
+def sweep(chain, make_input, concurrency_levels=(1, 2, 4, 8, 16, 32, 64), requests_per_level=200):
+    """
+    Sync version of asweep, not to be called from a running event loop.
+    """
+    return asyncio.run(asweep(chain, make_input, concurrency_levels, requests_per_level))
+
+
+def format_report(title, results):
+    return "\n".join([title, REPORT_HEADER] + [result.as_row() for result in results])
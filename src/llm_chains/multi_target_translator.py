@@ -0,0 +1,100 @@
+import src.configs.config
+from loguru import logger
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+
+from src.llm_chains.translate_chain_factory import TranslateChainFactory
+
+
+@dataclass
+class FanOutResult:
+    """
+    translations: language -> translation (a list of translations for a batch input).
+    latencies: language -> seconds from the start of that language's first call (once it got a
+        concurrency slot, so the time queued behind other languages is left out) until its last
+        call was done.
+    """
+    translations: dict = field(default_factory=dict)
+    latencies: dict = field(default_factory=dict)
+
+
+async def _gather_or_cancel(aws):
+    """
+    Like asyncio.gather, but on the first error the other awaitables are cancelled instead of
+    going on spending tokens and quota.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class MultiTargetTranslator:
+    """
+    Translates one text (or a batch of texts) into several target languages in one run. The
+    per-language chains are built once per language pair and reused, and all calls of a run,
+    whatever their language, share one concurrency budget.
+
+    Args:
+        llm (BaseChatModel): The chat model, e.g. from GeminiChatModelFactory.
+        max_concurrency (int): Max calls in flight across all languages.
+    """
+
+    def __init__(self, llm, from_language="English", max_concurrency=8):
+        self._llm = llm
+        self._from_language = from_language
+        self._max_concurrency = max_concurrency
+        self._chains = {}
+        self._lock = threading.Lock()
+
+    def chain_for(self, to_language):
+        key = (self._from_language, to_language)
+        with self._lock:
+            chain = self._chains.get(key)
+            if chain is None:
+                chain = TranslateChainFactory.create_chain(self._llm, self._from_language, to_language)
+                self._chains[key] = chain
+        return chain
+
+    async def atranslate(self, text, target_languages):
+        """
+        Args:
+            text (str|list): One text, or a list of texts.
+            target_languages (list): e.g. ["Chinese", "French", "German"].
+
+        The first failing call fails the run and cancels the calls of every language still running.
+        """
+        texts = [text] if isinstance(text, str) else list(text)
+        semaphore = asyncio.Semaphore(self._max_concurrency)
+        start = time.perf_counter()
+
+        async def translate_one(chain, value, started):
+            async with semaphore:
+                if not started:
+                    started.append(time.perf_counter())
+                return await chain.ainvoke({"text": value})
+
+        async def translate_language(language):
+            chain = self.chain_for(language)
+            started = []
+            translations = await _gather_or_cancel(translate_one(chain, value, started) for value in texts)
+            return translations, time.perf_counter() - started[0] if started else 0.0
+
+        outcomes = await _gather_or_cancel(translate_language(language) for language in target_languages)
+        result = FanOutResult()
+        for language, (translations, latency) in zip(target_languages, outcomes):
+            result.translations[language] = translations[0] if isinstance(text, str) else translations
+            result.latencies[language] = latency
+        logger.info(f"Translated {len(texts)} text(s) into {len(target_languages)} languages in {time.perf_counter() - start:.2f}s")
+        return result
+
+    def translate(self, text, target_languages):
+        """
+        Sync version of atranslate, not to be called from a running event loop.
+        """
+        return asyncio.run(self.atranslate(text, target_languages))
@@ -0,0 +1,208 @@
+from loguru import logger
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional
+
+from src.llm_chains.stream_metrics import percentile
+
+# closes a queue, one per worker of the next stage
+_DONE = object()
+
+
+@dataclass
+class PipelineResult:
+    index: int
+    path: str
+    text: Optional[str] = None
+    translation: Optional[str] = None
+    error: Optional[Exception] = None
+
+
+@dataclass
+class StageStats:
+    """
+    Per stage metrics: items per second over the pipeline wall time, latency per item and the
+    share of the wall time its workers were busy (utilisation = busy / wall / workers).
+    """
+    name: str
+    workers: int
+    items: int = 0
+    failed: int = 0
+    busy_seconds: float = 0.0
+    latencies: list = field(default_factory=list)
+
+    def record(self, seconds, error=None):
+        self.items += 1
+        self.busy_seconds += seconds
+        self.latencies.append(seconds)
+        if error is not None:
+            self.failed += 1
+
+    def summary(self, wall_seconds):
+        return {
+            "items": self.items,
+            "failed": self.failed,
+            "throughput": self.items / wall_seconds if wall_seconds else 0.0,
+            "utilisation": self.busy_seconds / wall_seconds / self.workers if wall_seconds else 0.0,
+            "p50": percentile(self.latencies, 50),
+            "p95": percentile(self.latencies, 95),
+        }
+
+
+class OCRTranslatePipeline:
+    """
+    Streams images through OCR (GoogleOCRService) and translation (e.g. the chain of
+    TranslateChainFactory.create_chain) as two stages connected by bounded asyncio queues:
+    image N+1 is OCRed while image N is translated, each stage with its own concurrency.
+    A full queue blocks the stage before it, so a slow translation backs up OCR instead of
+    buffering its texts.
+
+    Images whose OCR fails (including "No text detected.") are not translated, their result
+    carries the error. In ordered mode results are yielded in input order, a result completed
+    early waits for the ones before it; to keep that buffer bounded, no image is fed more than
+    queue_size + ocr_concurrency + translate_concurrency places past the oldest result not yet
+    yielded. Unordered mode yields the results as they complete.
+
+        pipeline = OCRTranslatePipeline(GoogleOCRService(), TranslateChainFactory.create_chain(llm))
+        async for result in pipeline.astream(image_paths):
+            print(result.path, result.translation)
+        pipeline.stats()
+
+    Args:
+        ocr_service (GoogleOCRService): Anything with aextract_text_from_imgs(paths, batch_size, max_concurrency).
+        chain (Runnable): {"text": text} -> translation.
+        ocr_concurrency (int): OCR requests in flight.
+        translate_concurrency (int): Translations in flight.
+        queue_size (int): Capacity of each queue between stages.
+        ordered (bool): Yields the results in input order.
+    """
+
+    def __init__(self, ocr_service, chain, ocr_concurrency=4, translate_concurrency=8, queue_size=16, ordered=True,
+                 clock=time.perf_counter):
+        self._ocr_service = ocr_service
+        self._chain = chain
+        self._ocr_concurrency = ocr_concurrency
+        self._translate_concurrency = translate_concurrency
+        self._queue_size = queue_size
+        self._ordered = ordered
+        self._clock = clock
+        self._ocr_stats = None
+        self._translate_stats = None
+        self._wall_seconds = 0.0
+
+    async def _ocr(self, path):
+        result = (await self._ocr_service.aextract_text_from_imgs([path], batch_size=1, max_concurrency=1))[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    async def astream(self, image_paths):
+        """
+        Yields a PipelineResult per image. Stopping the iteration early cancels the work in flight.
+        """
+        ocr_queue = asyncio.Queue(maxsize=self._queue_size)
+        translate_queue = asyncio.Queue(maxsize=self._queue_size)
+        results = asyncio.Queue(maxsize=self._queue_size)
+        self._ocr_stats = StageStats("ocr", self._ocr_concurrency)
+        self._translate_stats = StageStats("translate", self._translate_concurrency)
+        start = self._clock()
+        # ordered mode: a place per image between being fed and being yielded
+        window = asyncio.Semaphore(self._queue_size + self._ocr_concurrency + self._translate_concurrency)
+
+        async def feed():
+            for index, path in enumerate(image_paths):
+                if self._ordered:
+                    await window.acquire()
+                await ocr_queue.put(PipelineResult(index, path))
+            for _ in range(self._ocr_concurrency):
+                await ocr_queue.put(_DONE)
+
+        async def ocr_worker():
+            while (item := await ocr_queue.get()) is not _DONE:
+                began = self._clock()
+                try:
+                    item.text = await self._ocr(item.path)
+                except Exception as e:
+                    item.error = e
+                self._ocr_stats.record(self._clock() - began, item.error)
+                await (results if item.error is not None else translate_queue).put(item)
+
+        async def translate_worker():
+            while (item := await translate_queue.get()) is not _DONE:
+                began = self._clock()
+                try:
+                    item.translation = await self._chain.ainvoke({"text": item.text})
+                except Exception as e:
+                    logger.warning(f"Translation of {item.path} failed: {e!r}")
+                    item.error = e
+                self._translate_stats.record(self._clock() - began, item.error)
+                await results.put(item)
+
+        async def close_stage(workers, queue, count):
+            # the next stage ends once every worker of this one did
+            await asyncio.gather(*workers)
+            for _ in range(count):
+                await queue.put(_DONE)
+
+        ocr_workers = [asyncio.create_task(ocr_worker()) for _ in range(self._ocr_concurrency)]
+        translate_workers = [asyncio.create_task(translate_worker()) for _ in range(self._translate_concurrency)]
+        tasks = [asyncio.create_task(feed()), *ocr_workers, *translate_workers,
+                 asyncio.create_task(close_stage(ocr_workers, translate_queue, self._translate_concurrency)),
+                 asyncio.create_task(close_stage(translate_workers, results, 1))]
+        pending = {}
+        next_index = 0
+        try:
+            while (item := await self._next_result(results, tasks)) is not _DONE:
+                if not self._ordered:
+                    yield item
+                    continue
+                pending[item.index] = item
+                while next_index in pending:
+                    window.release()
+                    yield pending.pop(next_index)
+                    next_index += 1
+        finally:
+            for task in tasks:
+                task.cancel()
+            self._wall_seconds = self._clock() - start
+
+    @staticmethod
+    async def _next_result(results, tasks):
+        """
+        The next item of results; raises the error of a task that crashed (e.g. image_paths
+        raising), which would otherwise leave the other stages waiting forever.
+        """
+        getter = asyncio.ensure_future(results.get())
+        watched = {task for task in tasks if not task.done()}
+        try:
+            while True:
+                for task in tasks:
+                    if task.done() and not task.cancelled() and task.exception() is not None:
+                        raise task.exception()
+                if getter.done():
+                    return getter.result()
+                done, watched = await asyncio.wait({getter, *watched}, return_when=asyncio.FIRST_COMPLETED)
+                watched.discard(getter)
+        finally:
+            if not getter.done():
+                getter.cancel()
+
+    async def arun(self, image_paths):
+        """
+        The results of astream as a list.
+        """
+        return [result async for result in self.astream(image_paths)]
+
+    def stats(self):
+        """
+        The metrics of the last run: per stage (see StageStats) and end to end.
+        """
+        wall = self._wall_seconds
+        items = self._ocr_stats.items if self._ocr_stats is not None else 0
+        return {
+            "wall_seconds": wall,
+            "throughput": items / wall if wall else 0.0,
+            "ocr": self._ocr_stats.summary(wall) if self._ocr_stats is not None else None,
+            "translate": self._translate_stats.summary(wall) if self._translate_stats is not None else None,
+        }
@@ -0,0 +1,147 @@
+import src.configs.config
+from loguru import logger
+import re
+
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+
+from src.llm_chains.batch_runner import estimate_tokens
+from src.llm_chains.translate_chain_factory import TranslateChainFactory
+
+# "<12> some text", the text runs until the next marker at the start of a line
+_ITEM = re.compile(r"^<(\d+)>[ \t]?(.*?)(?=^<\d+>|\Z)", re.MULTILINE | re.DOTALL)
+
+
+def format_pack(texts):
+    return "\n".join(f"<{i}> {text}" for i, text in enumerate(texts, start=1))
+
+
+def parse_pack(response, size):
+    """
+    Parses a numbered response back into a list of size translations. Items that are missing,
+    duplicated or empty are None, i.e. misaligned and to be retried on their own.
+    """
+    found = {}
+    duplicated = set()
+    for match in _ITEM.finditer(response):
+        number = int(match.group(1))
+        if number in found:
+            duplicated.add(number)
+        found[number] = match.group(2).strip()
+    return [
+        found.get(i) if i not in duplicated and found.get(i) else None
+        for i in range(1, size + 1)
+    ]
+
+
+class PackedTranslator:
+    """
+    Translates many short texts (UI labels, CSV cells) with few LLM calls: consecutive texts are
+    packed into one numbered prompt up to max_pack_tokens / max_items, the numbered response is
+    parsed back per item and only the items that came back misaligned are translated again one by
+    one with the plain TranslateChainFactory chain. Texts too long to pack are sent on their own.
+    Empty and whitespace-only texts are returned unchanged without a call.
+
+    Args:
+        llm (BaseChatModel): The chat model, e.g. from GeminiChatModelFactory.
+        max_pack_tokens (int): Estimated token budget of the packed input.
+        max_items (int): Max texts per pack, keeps the numbering easy for the model.
+        max_concurrency (int): Max calls in flight.
+    """
+
+    def __init__(self, llm, from_language="English", to_language="Chinese",
+                 max_pack_tokens=1000, max_items=50, max_concurrency=8):
+        self._pack_chain = self.create_pack_chain(llm, from_language, to_language)
+        self._single_chain = TranslateChainFactory.create_chain(llm, from_language, to_language)
+        self._max_pack_tokens = max_pack_tokens
+        self._max_items = max_items
+        self._max_concurrency = max_concurrency
+        self.stats = {"items": 0, "pack_calls": 0, "single_calls": 0, "misaligned": 0}
+
+    @staticmethod
+    def create_pack_chain(llm, from_language="English", to_language="Chinese"):
+        prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", f"You are a helpful assistant that translates {from_language} to {to_language}. "
+                           "The input is a numbered list of independent texts, each starting with <n>. "
+                           "Translate every text separately and answer with the same numbered list: "
+                           "one <n> marker per text, in the same order, nothing else."),
+                ("user", "{items}"),
+            ]
+        )
+        return prompt | llm | StrOutputParser()
+
+    def pack(self, texts):
+        """
+        Groups the indexes of texts into packs; returns (packs, singles). Blank texts are left out.
+        """
+        packs, singles = [], []
+        current, current_tokens = [], 0
+        for index, text in enumerate(texts):
+            if not text.strip():
+                # the model answers them with an empty item, which parses as misaligned
+                continue
+            tokens = estimate_tokens(text)
+            if tokens > self._max_pack_tokens // 2:
+                singles.append(index)
+                continue
+            if current and (current_tokens + tokens > self._max_pack_tokens or len(current) >= self._max_items):
+                packs.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            packs.append(current)
+        return packs, singles
+
+    def _plan(self, texts):
+        packs, singles = self.pack(texts)
+        self.stats["items"] += len(texts)
+        self.stats["pack_calls"] += len(packs)
+        inputs = [{"items": format_pack([texts[i] for i in pack])} for pack in packs]
+        return packs, singles, inputs
+
+    def _collect(self, texts, packs, responses, results):
+        retry = []
+        for pack, response in zip(packs, responses):
+            for index, translation in zip(pack, parse_pack(response, len(pack))):
+                if translation is None:
+                    retry.append(index)
+                else:
+                    results[index] = translation
+        if retry:
+            logger.warning(f"{len(retry)} packed items came back misaligned, translating them one by one")
+        self.stats["misaligned"] += len(retry)
+        return retry
+
+    def _single_inputs(self, texts, indexes):
+        self.stats["single_calls"] += len(indexes)
+        return [{"text": texts[i]} for i in indexes]
+
+    def translate(self, texts):
+        """
+        Returns the translations of texts, in order.
+        """
+        texts = list(texts)
+        results = [text if not text.strip() else None for text in texts]
+        config = {"max_concurrency": self._max_concurrency}
+        packs, singles, inputs = self._plan(texts)
+        responses = self._pack_chain.batch(inputs, config=config) if inputs else []
+        singles += self._collect(texts, packs, responses, results)
+        if singles:
+            for index, translation in zip(singles, self._single_chain.batch(self._single_inputs(texts, singles), config=config)):
+                results[index] = translation
+        return results
+
+    async def atranslate(self, texts):
+        texts = list(texts)
+        results = [text if not text.strip() else None for text in texts]
+        config = {"max_concurrency": self._max_concurrency}
+        packs, singles, inputs = self._plan(texts)
+        responses = await self._pack_chain.abatch(inputs, config=config) if inputs else []
+        singles += self._collect(texts, packs, responses, results)
+        if singles:
+            translations = await self._single_chain.abatch(self._single_inputs(texts, singles), config=config)
+            for index, translation in zip(singles, translations):
+                results[index] = translation
+        return results
@@ -0,0 +1,214 @@
+import src.configs.config
+from loguru import logger
+import threading
+import time
+
+import numpy as np
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda
+
+POSITIVE = "正面"
+NEGATIVE = "负面"
+NEUTRAL = "中性"
+LABELS = (POSITIVE, NEGATIVE, NEUTRAL)
+
+# term -> weight; longer, negated terms outweigh the plain term they contain ("不开心" vs "开心")
+DEFAULT_LEXICON = {
+    POSITIVE: {
+        "开心": 1.0, "高兴": 1.0, "快乐": 1.0, "喜欢": 1.0, "满意": 1.0, "成功": 1.0, "太棒": 1.5, "很好": 1.0,
+        "优秀": 1.0, "感谢": 0.5, "幸福": 1.0, "顺利": 1.0, "阳光明媚": 1.0, "不错": 1.0, "赞": 0.5, "喜悦": 1.0,
+    },
+    NEGATIVE: {
+        "失败": 1.0, "沮丧": 1.0, "难过": 1.0, "伤心": 1.0, "糟糕": 1.0, "讨厌": 1.0, "生气": 1.0, "失望": 1.0,
+        "遗憾": 1.0, "痛苦": 1.0, "烦": 0.5, "担心": 0.5, "不开心": 2.5, "不满意": 2.5, "不喜欢": 2.5, "不好": 1.5,
+    },
+}
+
+
+def char_ngrams(text, ngram_range=(1, 4)):
+    low, high = ngram_range
+    return [text[i:i + n] for n in range(low, high + 1) for i in range(len(text) - n + 1)]
+
+
+class LexiconSentimentClassifier:
+    """
+    A local classifier over character n-grams: texts are turned into an n-gram count matrix,
+    multiplied with the (n-gram x label) weight matrix in one NumPy product per batch, and the
+    scores turned into probabilities with a softmax. Without any known n-gram a text gets the
+    neutral label with a low confidence, and is left to the LLM by SentimentCascade.
+
+    The weights come from a lexicon (DEFAULT_LEXICON) and can be fitted on labelled texts with fit().
+
+    Args:
+        lexicon (dict): label -> {term: weight}.
+        ngram_range (tuple): Min and max n-gram length.
+        sharpness (float): Softmax scale, higher gives more confident probabilities for the same score.
+    """
+
+    def __init__(self, lexicon=None, ngram_range=(1, 4), sharpness=3.0):
+        lexicon = DEFAULT_LEXICON if lexicon is None else lexicon
+        self._ngram_range = ngram_range
+        self._sharpness = sharpness
+        terms = sorted({term for weights in lexicon.values() for term in weights})
+        self.vocabulary = {term: i for i, term in enumerate(terms)}
+        self.weights = np.zeros((len(terms), len(LABELS)))
+        for label, weights in lexicon.items():
+            for term, weight in weights.items():
+                self.weights[self.vocabulary[term], LABELS.index(label)] = weight
+        # a text without any known n-gram is neutral, with about a third of confidence
+        self.bias = np.zeros(len(LABELS))
+        self.bias[LABELS.index(NEUTRAL)] = 0.01
+
+    def features(self, texts):
+        matrix = np.zeros((len(texts), len(self.vocabulary)), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for ngram in char_ngrams(text, self._ngram_range):
+                column = self.vocabulary.get(ngram)
+                if column is not None:
+                    matrix[row, column] += 1
+        return matrix
+
+    def predict_proba(self, texts):
+        """
+        Returns a (len(texts), 3) array of probabilities in LABELS order.
+        """
+        scores = self.features(texts) @ self.weights + self.bias
+        scores = self._sharpness * (scores - scores.max(axis=1, keepdims=True))
+        probabilities = np.exp(scores)
+        return probabilities / probabilities.sum(axis=1, keepdims=True)
+
+    def predict(self, texts):
+        """
+        Returns [(label, confidence), ...].
+        """
+        probabilities = self.predict_proba(texts)
+        best = probabilities.argmax(axis=1)
+        return [(LABELS[i], float(probabilities[row, i])) for row, i in enumerate(best)]
+
+    def fit(self, texts, labels, epochs=200, learning_rate=0.5, l2=1e-3):
+        """
+        Fits the weights as a multinomial logistic regression over the n-grams of texts, starting
+        from the lexicon weights. New n-grams of texts are added to the vocabulary.
+        """
+        for text in texts:
+            for ngram in char_ngrams(text, self._ngram_range):
+                if ngram not in self.vocabulary:
+                    self.vocabulary[ngram] = len(self.vocabulary)
+        self.weights = np.vstack([self.weights, np.zeros((len(self.vocabulary) - len(self.weights), len(LABELS)))])
+        features = self.features(texts)
+        targets = np.eye(len(LABELS))[[LABELS.index(label) for label in labels]]
+        for _ in range(epochs):
+            scores = features @ self.weights + self.bias
+            scores -= scores.max(axis=1, keepdims=True)
+            probabilities = np.exp(scores)
+            probabilities /= probabilities.sum(axis=1, keepdims=True)
+            gradient = (probabilities - targets) / len(texts)
+            self.weights -= learning_rate * (features.T @ gradient + l2 * self.weights)
+            self.bias -= learning_rate * gradient.sum(axis=0)
+        self._sharpness = 1.0
+        return self
+
+
+def create_sentiment_analyzer_chain(llm):
+    """
+    The LLM classifier of src/poc/folk_chain_poc.py.
+    """
+    prompt = ChatPromptTemplate.from_template(
+        "分析以下文本的情感 (正面/负面/中性): '{text}'. 只回答 '正面', '负面', 或 '中性'."
+    )
+    return prompt | llm | StrOutputParser()
+
+
+def normalize_label(answer):
+    for label in (NEGATIVE, POSITIVE, NEUTRAL):
+        if label in answer:
+            return label
+    return NEUTRAL
+
+
+class SentimentCascade:
+    """
+    Labels texts 正面/负面/中性 with the local classifier first and only sends the texts it is
+    not confident about to the LLM sentiment chain, in one batch.
+
+        cascade = SentimentCascade(create_sentiment_analyzer_chain(llm), threshold=0.8)
+        cascade.classify(["我今天非常开心", "会议将在下午三点开始。"])  # the second one goes to the LLM
+        cascade.as_runnable()  # {"text": ...} -> label, for RunnablePassthrough.assign(sentiment=...)
+
+    Args:
+        llm_chain (Runnable): {"text": ...} -> answer containing a label, e.g. create_sentiment_analyzer_chain(llm).
+        classifier (LexiconSentimentClassifier): The local classifier.
+        threshold (float): Min local confidence to skip the LLM.
+        thresholds (dict): label -> min confidence, overrides threshold per predicted label.
+        max_concurrency (int): Max LLM calls in flight.
+    """
+
+    def __init__(self, llm_chain, classifier=None, threshold=0.8, thresholds=None, max_concurrency=8):
+        self._llm_chain = llm_chain
+        self._classifier = classifier or LexiconSentimentClassifier()
+        self._threshold = threshold
+        self._thresholds = thresholds or {}
+        self._max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self.stats = {"texts": 0, "local": 0, "llm_calls": 0, "local_seconds": 0.0}
+
+    @property
+    def llm_calls_avoided(self):
+        return self.stats["local"]
+
+    @property
+    def avoided_ratio(self):
+        return self.stats["local"] / self.stats["texts"] if self.stats["texts"] else 0.0
+
+    def _split(self, texts):
+        start = time.perf_counter()
+        predictions = self._classifier.predict(texts)
+        labels = [None] * len(texts)
+        fallback = []
+        for index, (label, confidence) in enumerate(predictions):
+            if confidence >= self._thresholds.get(label, self._threshold):
+                labels[index] = label
+            else:
+                fallback.append(index)
+        with self._lock:
+            self.stats["texts"] += len(texts)
+            self.stats["local"] += len(texts) - len(fallback)
+            self.stats["llm_calls"] += len(fallback)
+            self.stats["local_seconds"] += time.perf_counter() - start
+        return labels, fallback
+
+    def _log(self, texts, fallback):
+        logger.debug(f"Sentiment: {len(texts) - len(fallback)}/{len(texts)} classified locally, {len(fallback)} LLM calls")
+
+    def classify(self, texts):
+        """
+        Returns the labels of texts, in order.
+        """
+        texts = list(texts)
+        labels, fallback = self._split(texts)
+        if fallback:
+            answers = self._llm_chain.batch([{"text": texts[i]} for i in fallback], config={"max_concurrency": self._max_concurrency})
+            for index, answer in zip(fallback, answers):
+                labels[index] = normalize_label(answer)
+        self._log(texts, fallback)
+        return labels
+
+    async def aclassify(self, texts):
+        texts = list(texts)
+        labels, fallback = self._split(texts)
+        if fallback:
+            answers = await self._llm_chain.abatch([{"text": texts[i]} for i in fallback], config={"max_concurrency": self._max_concurrency})
+            for index, answer in zip(fallback, answers):
+                labels[index] = normalize_label(answer)
+        self._log(texts, fallback)
+        return labels
+
+    def as_runnable(self):
+        """
+        A runnable {"text": ...} -> label, a drop-in replacement of the LLM sentiment chain.
+        """
+        async def aclassify_one(inputs):
+            return (await self.aclassify([inputs["text"]]))[0]
+
+        return RunnableLambda(lambda inputs: self.classify([inputs["text"]])[0], afunc=aclassify_one, name="SentimentCascade")
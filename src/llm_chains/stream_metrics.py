@@ -0,0 +1,166 @@
+from loguru import logger
+import asyncio
+import math
+import threading
+import time
+
+
+def percentile(values, p):
+    """
+    Nearest-rank percentile of values (p in 0-100), None if values is empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+COMPLETED = "completed"
+ABORTED = "aborted"
+FAILED = "failed"
+
+
+class StreamMetrics:
+    """
+    Latency of one streamed request: time to first token, gaps between tokens and total latency,
+    in seconds. Empty chunks (e.g. a leading role-only chunk) are counted but not timed, the first
+    token is the first chunk with content. status is COMPLETED, ABORTED (the consumer stopped
+    early) or FAILED (the stream raised error).
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self._clock = clock
+        self.started_at = None
+        self.time_to_first_token = None
+        self.inter_token_gaps = []
+        self.total_latency = None
+        self.chunks = 0
+        self.characters = 0
+        self.status = None
+        self.error = None
+        self._last_chunk_at = None
+
+    def start(self):
+        self.started_at = self._clock()
+
+    def on_chunk(self, chunk):
+        self.chunks += 1
+        if not chunk:
+            return
+        now = self._clock()
+        if self.time_to_first_token is None:
+            self.time_to_first_token = now - self.started_at
+        else:
+            self.inter_token_gaps.append(now - self._last_chunk_at)
+        self._last_chunk_at = now
+        self.characters += len(chunk)
+
+    def finish(self, status=COMPLETED, error=None):
+        self.total_latency = self._clock() - self.started_at
+        self.status = status
+        self.error = error
+
+    @property
+    def max_inter_token_gap(self):
+        return max(self.inter_token_gaps) if self.inter_token_gaps else None
+
+    def as_dict(self):
+        return {
+            "time_to_first_token": self.time_to_first_token,
+            "max_inter_token_gap": self.max_inter_token_gap,
+            "total_latency": self.total_latency,
+            "chunks": self.chunks,
+            "characters": self.characters,
+            "status": self.status,
+        }
+
+
+class StreamLatencyTracker:
+    """
+    Collects StreamMetrics of many requests and summarises them as percentiles, e.g. to check latency SLOs.
+    Time to first token and the gaps cover every stream, the total latency only the completed
+    ones (an aborted stream is short because it was cut); aborted and failed streams are counted.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = []
+
+    def record(self, metrics):
+        with self._lock:
+            self._metrics.append(metrics)
+
+    def __len__(self):
+        return len(self._metrics)
+
+    def summary(self, percentiles=(50, 95, 99)):
+        with self._lock:
+            metrics = list(self._metrics)
+        ttft = [m.time_to_first_token for m in metrics if m.time_to_first_token is not None]
+        gaps = [gap for m in metrics for gap in m.inter_token_gaps]
+        total = [m.total_latency for m in metrics if m.total_latency is not None and m.status == COMPLETED]
+        summary = {
+            "requests": len(metrics),
+            "aborted": sum(1 for m in metrics if m.status == ABORTED),
+            "failed": sum(1 for m in metrics if m.status == FAILED),
+        }
+        for name, values in (("time_to_first_token", ttft), ("inter_token_gap", gaps), ("total_latency", total)):
+            summary[name] = {f"p{p}": percentile(values, p) for p in percentiles}
+        return summary
+
+
+def measure_stream(chunks, metrics=None, tracker=None):
+    """
+    Passes the chunks of a sync stream through while recording their timing into metrics; a
+    stream the consumer stops early or that raises is recorded too, as aborted or failed.
+    """
+    metrics = metrics or StreamMetrics()
+    metrics.start()
+    status, error = COMPLETED, None
+    try:
+        for chunk in chunks:
+            metrics.on_chunk(chunk)
+            yield chunk
+    except GeneratorExit:
+        status = ABORTED
+        raise
+    except Exception as e:
+        status, error = FAILED, e
+        raise
+    finally:
+        metrics.finish(status, error)
+        _report(metrics, tracker)
+
+
+async def ameasure_stream(chunks, metrics=None, tracker=None):
+    """
+    Async version of measure_stream.
+    """
+    metrics = metrics or StreamMetrics()
+    metrics.start()
+    status, error = COMPLETED, None
+    try:
+        async for chunk in chunks:
+            metrics.on_chunk(chunk)
+            yield chunk
+    except (GeneratorExit, asyncio.CancelledError):
+        status = ABORTED
+        raise
+    except Exception as e:
+        status, error = FAILED, e
+        raise
+    finally:
+        metrics.finish(status, error)
+        _report(metrics, tracker)
+
+
+def _report(metrics, tracker):
+    if tracker is not None:
+        tracker.record(metrics)
+    if metrics.status != COMPLETED:
+        logger.debug(f"Stream {metrics.status} after {metrics.total_latency:.3f}s, {metrics.chunks} chunks")
+    elif metrics.time_to_first_token is not None:
+        logger.debug(
+            f"Stream done: ttft {metrics.time_to_first_token:.3f}s, total {metrics.total_latency:.3f}s, {metrics.chunks} chunks"
+        )
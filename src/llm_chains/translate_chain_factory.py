@@ -3,6 +3,8 @@ from loguru import logger
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 
+from src.llm_chains.stream_metrics import ameasure_stream, measure_stream
+
 
 class TranslateChainFactory():
 
@@ -12,7 +14,7 @@ class TranslateChainFactory():
         # define a prompt
         prompt = ChatPromptTemplate.from_messages(
             [
-                ("system", "You are a helpful assistant that translates English to Chinese."),
+                ("system", f"You are a helpful assistant that translates {from_language} to {to_language}."),
                 ("user", f"Translate this sentence from {from_language} to {to_language}. {{text}}"),
             ]
         )
@@ -22,4 +24,25 @@ class TranslateChainFactory():
 
         # 构建链
         chain = prompt | llm | output_parser
-        return chain
\ No newline at end of file
+        return chain
+
+    @staticmethod
+    def stream(llm, text, from_language="English", to_language="Chinese", metrics=None, tracker=None):
+        """
+        Streams the translation of text as text deltas, as soon as the model produces them.
+
+        Args:
+            metrics (StreamMetrics): Filled with time-to-first-token, inter-token gaps and total latency.
+            tracker (StreamLatencyTracker): Collects the metrics of every request.
+        """
+        chain = TranslateChainFactory.create_chain(llm, from_language, to_language)
+        yield from measure_stream(chain.stream({"text": text}), metrics, tracker)
+
+    @staticmethod
+    async def astream(llm, text, from_language="English", to_language="Chinese", metrics=None, tracker=None):
+        """
+        Async version of stream.
+        """
+        chain = TranslateChainFactory.create_chain(llm, from_language, to_language)
+        async for chunk in ameasure_stream(chain.astream({"text": text}), metrics, tracker):
+            yield chunk
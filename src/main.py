@@ -1 +1,4 @@
 import src.configs.config
+from src.configs.config import settings
+
+settings.setup()
@@ -1,3 +1,5 @@
+import src.configs.config
+from src.configs.config import settings
 import csv
 import os
 from google.cloud import bigquery
@@ -69,4 +71,6 @@ if __name__ == "__main__":
     if PROJECT_ID == "your-gcp-project-id" or DATASET_ID == "your-dataset-id" or TABLE_ID == "your-table-id":
         print("Please update the script `src/upload_to_bq.py` with your BigQuery project, dataset, and table IDs before running.")
     else:
+        # proxy and logging, the BigQuery client does not go through the factories that set them up
+        settings.setup()
         stream_csv_to_bq(PROJECT_ID, DATASET_ID, TABLE_ID, FILE_PATH)
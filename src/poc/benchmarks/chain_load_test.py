@@ -0,0 +1,39 @@
+"""
+Sweeps concurrency levels over the translation chain and the fork-join chain of
+src/poc/folk_chain_poc.py against a simulated model (lognormal latency, median 100ms),
+reporting throughput, p50/p95/p99 latency and CPU overhead per request.
+
+    python -m src.poc.benchmarks.chain_load_test
+"""
+import src.configs.config
+from src.llm.fake_chat_model_factory import FakeChatModelFactory
+from src.llm_chains.load_test import format_report, sweep
+from src.llm_chains.translate_chain_factory import TranslateChainFactory
+from src.llm_chains.fork_join_chain_factory import ForkJoinChainFactory
+
+
+CONCURRENCY_LEVELS = (1, 4, 16, 64)
+REQUESTS_PER_LEVEL = 200
+
+
+def fork_join_chain(llm):
+    return ForkJoinChainFactory(llm, {
+        "definition": "请用一句话简洁地定义 '{topic}'。",
+        "advantages": "列出 '{topic}' 的3个主要优点。",
+        "disadvantages": "列出 '{topic}' 的3个主要缺点。",
+    }, join="{topic} {definition} {advantages} {disadvantages}", timeout=2).create_chain()
+
+
+def main():
+    llm = FakeChatModelFactory(latency=0.1, latency_distribution="lognormal", sigma=0.5, seed=42).build()
+
+    translate_chain = TranslateChainFactory.create_chain(llm)
+    print(format_report("translate chain", sweep(
+        translate_chain, lambda i: {"text": f"sentence number {i}"}, CONCURRENCY_LEVELS, REQUESTS_PER_LEVEL)))
+    print()
+    print(format_report("fork-join chain (4 LLM calls per request)", sweep(
+        fork_join_chain(llm), lambda i: {"topic": f"topic {i}"}, CONCURRENCY_LEVELS, REQUESTS_PER_LEVEL)))
+
+
+if __name__ == "__main__":
+    main()
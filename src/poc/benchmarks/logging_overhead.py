@@ -0,0 +1,80 @@
+"""
+Measures the per-call overhead of log_execution_time for every logging mode, in sync and asyncio code.
+
+    python -m src.poc.benchmarks.logging_overhead
+"""
+import src.configs.config
+from src.configs.config import settings
+from src.configs.logging_config import BackgroundFileSink, add_file_sink
+from src.decorators.time_decorator import log_execution_time
+from loguru import logger
+import asyncio
+import os
+import tempfile
+import time
+
+
+CALLS = 20000
+
+MODES = {
+    "sync text": dict(mode="sync"),
+    "sync json": dict(mode="sync", serialize=True),
+    "async text": dict(mode="async"),
+    "async json": dict(mode="async", serialize=True),
+    "sync json, rotation": dict(mode="sync", serialize=True, rotation="1 MB", compression="zip"),
+    "async json, rotation": dict(mode="async", serialize=True, rotation="1 MB", compression="zip"),
+    "async json, sampled": dict(mode="async", serialize=True, sampling={"INFO": 10}),
+}
+
+
+def noop(i):
+    return i
+
+
+async def async_noop(i):
+    return i
+
+
+def bench_sync(func, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        func(i)
+    return (time.perf_counter() - start) / calls
+
+
+async def bench_async(func, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        await func(i)
+    return (time.perf_counter() - start) / calls
+
+
+def main():
+    # register the project sink first so the decorator does not add it during the measurement,
+    # then drop every sink, only the one under test is attached
+    settings.ensure_logging()
+    logger.remove()
+
+    baseline_sync = bench_sync(noop, CALLS)
+    baseline_async = asyncio.run(bench_async(async_noop, CALLS))
+
+    decorated_sync = log_execution_time(noop)
+    decorated_async = log_execution_time(async_noop)
+
+    print(f"{'mode':<24}{'sync us/call':>14}{'async us/call':>15}{'drain ms':>10}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, options in MODES.items():
+            handler_id, sink = add_file_sink(os.path.join(tmp_dir, f"{name}.log"), **options)
+            per_call_sync = bench_sync(decorated_sync, CALLS) - baseline_sync
+            per_call_async = asyncio.run(bench_async(decorated_async, CALLS)) - baseline_async
+            # time until the background writer caught up, i.e. the work moved off the hot path
+            start = time.perf_counter()
+            if isinstance(sink, BackgroundFileSink):
+                sink.drain()
+            drain = time.perf_counter() - start
+            logger.remove(handler_id)
+            print(f"{name:<24}{per_call_sync * 1e6:>14.2f}{per_call_async * 1e6:>15.2f}{drain * 1e3:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
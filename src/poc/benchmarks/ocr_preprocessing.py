@@ -0,0 +1,117 @@
+"""
+Measures what preprocessing the images before the OCR upload saves: bytes sent, preprocessing
+CPU time, and the end-to-end latency on a simulated link (upload time = bytes / bandwidth plus
+a fixed server time per batch). Uses a folder of images if given, else a synthetic corpus of
+camera photos (noise) and screenshots (text lines on white).
+
+    python -m src.poc.benchmarks.ocr_preprocessing [--images DIR] [--bandwidth-mbps 20]
+"""
+import src.configs.config
+from src.services.google_ocr_service import GoogleOCRService
+from src.services.image_preprocessing import ImagePreprocessor
+from loguru import logger
+import argparse
+import io
+import os
+import random
+import tempfile
+import time
+
+from google.cloud import vision
+
+
+BATCH_SIZE = 16
+SERVER_SECONDS = 0.3
+
+
+def synthetic_corpus(photos=8, screenshots=8):
+    import PIL.Image
+    rng = random.Random(0)
+    contents = []
+    for _ in range(photos):
+        size = (4000, 3000)
+        image = PIL.Image.frombytes("RGB", size, rng.randbytes(size[0] * size[1] * 3)).resize((2000, 1500))
+        buffer = io.BytesIO()
+        image.save(buffer, format="JPEG", quality=95)
+        contents.append(buffer.getvalue())
+    for _ in range(screenshots):
+        image = PIL.Image.new("RGB", (2560, 1440), "white")
+        for y in range(40, 1400, 36):
+            image.paste((30, 30, 30), (40, y, rng.randint(400, 2500), y + 14))
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        contents.append(buffer.getvalue())
+    return contents
+
+
+def read_corpus(folder):
+    contents = []
+    for name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, name), "rb") as image_file:
+            contents.append(image_file.read())
+    return contents
+
+
+class SimulatedLinkAnnotator:
+    """
+    Sleeps as long as the batch would take to upload at bandwidth bytes/s, plus SERVER_SECONDS.
+    """
+
+    def __init__(self, bandwidth):
+        self.bandwidth = bandwidth
+
+    def batch_annotate_images(self, requests):
+        size = sum(len(request.image.content) for request in requests)
+        time.sleep(size / self.bandwidth + SERVER_SECONDS)
+        return vision.BatchAnnotateImagesResponse(responses=[
+            vision.AnnotateImageResponse(text_annotations=[vision.EntityAnnotation(description="text")])
+            for _ in requests])
+
+
+def run(service, paths):
+    start = time.perf_counter()
+    service.extract_text_from_imgs(paths, batch_size=BATCH_SIZE)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--images", help="A folder of images, default a synthetic corpus")
+    parser.add_argument("--bandwidth-mbps", type=float, default=20.0)
+    parser.add_argument("--max-side", type=int, default=2048)
+    parser.add_argument("--max-kb", type=int, default=1024)
+    args = parser.parse_args()
+
+    contents = read_corpus(args.images) if args.images else synthetic_corpus()
+    annotator = SimulatedLinkAnnotator(args.bandwidth_mbps * 1e6 / 8)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i, content in enumerate(contents):
+            path = os.path.join(tmp_dir, f"{i}.img")
+            with open(path, "wb") as image_file:
+                image_file.write(content)
+            paths.append(path)
+
+        baseline = run(GoogleOCRService(client=annotator), paths)
+        with ImagePreprocessor(max_side=args.max_side, max_bytes=args.max_kb * 1024) as preprocessor:
+            preprocessor.preprocess(contents[0])  # start the worker processes outside the measurement
+            warmup = preprocessor.stats()
+            preprocessed = run(GoogleOCRService(client=annotator, preprocessor=preprocessor), paths)
+            stats = preprocessor.stats()
+
+    bytes_in = stats["bytes_in"] - warmup["bytes_in"]
+    bytes_out = stats["bytes_out"] - warmup["bytes_out"]
+    cpu = stats["cpu_seconds"] - warmup["cpu_seconds"]
+    logger.info(f"Benchmarked {len(contents)} images at {args.bandwidth_mbps} Mbit/s")
+    print(f"{'images':<28}{len(contents):>12}")
+    print(f"{'bytes uploaded, original':<28}{bytes_in / 1e6:>11.2f}M")
+    print(f"{'bytes uploaded, preprocessed':<28}{bytes_out / 1e6:>11.2f}M")
+    print(f"{'bytes saved':<28}{(1 - bytes_out / bytes_in) * 100:>11.1f}%")
+    print(f"{'preprocessing cpu / image':<28}{cpu / len(contents) * 1e3:>10.1f}ms")
+    print(f"{'end-to-end, original':<28}{baseline:>11.2f}s")
+    print(f"{'end-to-end, preprocessed':<28}{preprocessed:>11.2f}s")
+    print(f"{'latency change':<28}{(preprocessed / baseline - 1) * 100:>+11.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+import src.configs.config
+from loguru import logger
+import os
+import sys
+
+from src.llm_chains.extraction_job import ExtractionJob
+from src.poc.long_chain_poc1 import ExtractedInfo, extraction_chain
+
+# 对整个语料库 (JSONL/CSV，每条记录有 "text" 字段) 运行 long_chain_poc1 的提取链
+# 中断后重新运行同一命令，已提取的文档会被跳过
+#
+#     python -m src.poc.bulk_extraction_poc corpus.jsonl [logs/extracted.jsonl]
+if __name__ == "__main__":
+    corpus_path = sys.argv[1]
+    output_path = sys.argv[2] if len(sys.argv) > 2 else os.path.join(src.configs.config.project_path, "logs", "extracted.jsonl")
+    job = ExtractionJob(extraction_chain, ExtractedInfo, input_key="text_input", max_concurrency=16)
+    report = job.run(corpus_path, output_path)
+    logger.info(f"{report.docs_per_second:.2f} docs/s, ${report.cost_per_1k_documents:.4f} per 1k documents")
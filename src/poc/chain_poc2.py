@@ -1,10 +1,13 @@
 import src.configs.config
+from src.configs.config import settings
 from loguru import logger
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI as ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 from google.cloud import vision
 
+settings.setup()
+
 # 1. 输入：图片路径
 image_path = r"C:\Users\gateman\Pictures\ocr_test\gemini_introduction.png"
 
@@ -1,5 +1,9 @@
 import src.configs.config
+from src.configs.config import settings
 from loguru import logger
+import os
+from src.llm_chains.chain_instrumentation import ChainInstrumentation
+from src.llm_chains.sentiment_cascade import SentimentCascade
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.prompts import ChatPromptTemplate
@@ -8,6 +12,8 @@ from langchain_core.runnables import RunnableParallel, RunnablePassthrough, Runn
 
 
 
+settings.setup()
+
 # 1. 初始化 LLM
 llm = ChatGoogleGenerativeAI(
     model="gemini-2.0-flash",
@@ -203,8 +209,12 @@ print("测试 Fork-Join 链:")
 topic_to_analyze = "可再生能源"
 # 输入给 full_fork_join_chain 的是字符串 topic_to_analyze
 # 因为第一步是 {"topic": RunnablePassthrough()}，它会将字符串包装成 {"topic": "可再生能源"}
-report = full_fork_join_chain.invoke(topic_to_analyze)
+# ChainInstrumentation 记录每个阶段 (prompt, 每次 LLM 调用, parser, RunnableLambda) 的耗时和 token
+instrumentation = ChainInstrumentation()
+report = full_fork_join_chain.invoke(topic_to_analyze, config={"callbacks": [instrumentation]})
 print(f"关于 '{topic_to_analyze}' 的报告:\n{report}")
+instrumentation.log_summary()
+instrumentation.write_chrome_trace(os.path.join(src.configs.config.project_path, "logs", "fork_join_trace.json"))
 
 # --- 示例 2: 条件分叉 (RunnableBranch) ---
 print("\n--- 示例 2: 条件分叉 (RunnableBranch) ---")
@@ -235,8 +245,10 @@ neutral_chain = neutral_response_prompt | llm | StrOutputParser()
 # 4. RunnableBranch 根据情感选择路径，选中的路径需要原始文本
 
 # 构建一个传递原始文本和情感的上下文
+# 本地分类器先判断情感，只有置信度低的文本才调用 sentiment_analyzer_chain
+sentiment_cascade = SentimentCascade(sentiment_analyzer_chain, threshold=0.8)
 conditional_context_chain = RunnablePassthrough.assign(
-    sentiment=RunnableLambda(lambda x: {"text": x["user_text"]}) | sentiment_analyzer_chain
+    sentiment=RunnableLambda(lambda x: {"text": x["user_text"]}) | sentiment_cascade.as_runnable()
 )
 # conditional_context_chain 的输入: {"user_text": "some user text"}
 # conditional_context_chain 的输出: {"user_text": "some user text", "sentiment": "正面/负面/中性"}
@@ -275,4 +287,6 @@ response2 = full_conditional_chain.invoke({"user_text": text2})
 print(f"输入: '{text2}'\n回应: {response2}\n")
 
 response3 = full_conditional_chain.invoke({"user_text": text3})
-print(f"输入: '{text3}'\n回应: {response3}\n")
\ No newline at end of file
+print(f"输入: '{text3}'\n回应: {response3}\n")
+
+logger.info(f"情感分类: 避免了 {sentiment_cascade.llm_calls_avoided} 次 LLM 调用, {sentiment_cascade.stats}")
@@ -1,4 +1,5 @@
 import src.configs.config
+from src.configs.config import settings
 from loguru import logger
 
 import os
@@ -13,6 +14,8 @@ from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 from langchain_core.output_parsers import PydanticOutputParser
 # from langchain_core.pydantic_v1 import BaseModel as V1BaseModel, Field as V1Field # For PydanticOutputParser
 from langchain_core.runnables import RunnablePassthrough, RunnableParallel
+from src.llm_chains.chain_instrumentation import ChainInstrumentation
+from src.llm_chains.json_repair_parser import RepairingJsonOutputParser
 
 # PydanticOutputParser 需要 Pydantic v1 模型
 # 如果你的 langchain_core 版本较新，可以直接用 pydantic.BaseModel
@@ -27,6 +30,8 @@ class ExtractedInfo(BaseModel):
 load_dotenv()
 # os.environ["OPENAI_API_KEY"] = "sk-your-api-key" # 或者直接设置
 
+settings.setup()
+
 # 1. 初始化 LLM
 llm = ChatAI(
     model="gemini-2.0-flash",
@@ -41,9 +46,9 @@ llm = ChatAI(
 # --- 链的第一部分：提取信息 ---
 
 # 1.1 Pydantic 输出解析器
-info_parser = JsonOutputParser(pydantic_object=ExtractedInfo)
-# 在较新版本 langchain_core 中，可以直接用 PydanticOutputParser(pydantic_object=ExtractedInfo)
-# 但 JsonOutputParser(pydantic_object=...) 行为类似，且更通用
+# RepairingJsonOutputParser 与 JsonOutputParser(pydantic_object=...) 用法相同，但会先在本地修复
+# 代码块、尾随逗号、被截断的数组等问题，只有修复失败时才重新调用模型 (with_llm_fallback)
+info_parser = RepairingJsonOutputParser(pydantic_object=ExtractedInfo)
 
 # 1.2 提取信息的提示模板
 extraction_prompt_template = ChatPromptTemplate.from_template(
@@ -67,7 +72,7 @@ extraction_chain = (
     )
     | extraction_prompt_template
     | llm
-    | info_parser
+    | info_parser.with_llm_fallback(llm)
 )
 
 # --- 链的第二部分：生成摘要 ---
@@ -112,8 +117,12 @@ if __name__ == "__main__":
     # 为了演示中间步骤，我们可以分开调用
     print("\n--- 步骤1: 信息提取 (extraction_chain) ---")
     # extraction_chain 的输入是 {"text_input": "..."}
-    extracted_data = extraction_chain.invoke({"text_input": event_description})
+    instrumentation = ChainInstrumentation()
+    extracted_data = extraction_chain.invoke({"text_input": event_description}, config={"callbacks": [instrumentation]})
     print(f"提取到的结构化信息: {extracted_data}")
+    logger.info(f"JSON 解析路径: {info_parser.stats}")
+    instrumentation.log_summary()
+    instrumentation.write_chrome_trace(os.path.join(src.configs.config.project_path, "logs", "extraction_trace.json"))
     
     # exit program 
     exit(0)
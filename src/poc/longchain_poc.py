@@ -1,7 +1,10 @@
 import src.configs.config
+from src.configs.config import settings
 from loguru import logger
 from langchain_core.prompts import ChatPromptTemplate
 
+settings.setup()
+
 from langchain_google_genai import ChatGoogleGenerativeAI as ChatAI
 
 llm = ChatAI(
@@ -0,0 +1,23 @@
+import src.configs.config
+from loguru import logger
+import asyncio
+import os
+import sys
+
+from src.services.google_ocr_service import GoogleOCRService
+from src.services.ocr_ingestion import OCRIngestionJob
+
+# 对文件夹中所有图片做 OCR，结果写入 JSONL，旁边的 manifest 记录已处理的文件 (路径+mtime+大小)
+# 中断后或再次运行同一命令，只处理新增、修改过或上次失败的图片；加 --watch 持续监控文件夹
+#
+#     python -m src.poc.ocr_ingestion_poc ~/Pictures/ocr_test [logs/ocr.jsonl] [--watch]
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--watch"]
+    folder = args[0]
+    output_path = args[1] if len(args) > 1 else os.path.join(src.configs.config.project_path, "logs", "ocr.jsonl")
+    job = OCRIngestionJob(GoogleOCRService(), output_path, max_concurrency=4)
+    if "--watch" in sys.argv:
+        asyncio.run(job.watch(folder, interval=10))
+    else:
+        report = job.run(folder)
+        logger.info(f"{report.succeeded} images OCRed, {report.skipped} skipped, {report.files_per_second:.2f} files/s")
@@ -0,0 +1,30 @@
+import src.configs.config
+from loguru import logger
+import asyncio
+import sys
+
+from src.llm.gemini_chat_model_factory import GeminiChatModelFactory
+from src.llm_chains.ocr_translate_pipeline import OCRTranslatePipeline
+from src.llm_chains.translate_chain_factory import TranslateChainFactory
+from src.services.google_ocr_service import GoogleOCRService
+from src.services.ocr_ingestion import iter_images
+
+# chain_poc2 的流水线版本：OCR 与翻译两个阶段通过有界队列并行，第 N+1 张图片做 OCR 时第 N 张在翻译
+#
+#     python -m src.poc.ocr_translate_pipeline_poc ~/Pictures/ocr_test
+
+
+async def main(folder):
+    chain = TranslateChainFactory.create_chain(GeminiChatModelFactory().build())
+    pipeline = OCRTranslatePipeline(GoogleOCRService(), chain, ocr_concurrency=4, translate_concurrency=8)
+    paths = [path for path, _ in iter_images(folder)]
+    async for result in pipeline.astream(paths):
+        if result.error is not None:
+            logger.warning(f"{result.path}: {result.error}")
+        else:
+            logger.info(f"{result.path}: {result.translation}")
+    logger.info(f"Pipeline stats: {pipeline.stats()}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1]))
@@ -0,0 +1,20 @@
+import src.configs.config
+from loguru import logger
+import sys
+
+from src.services.google_ocr_service import GoogleOCRService
+from src.services.pdf_ocr import PdfOCR
+
+# 逐页 OCR 一个 PDF (需要 pip install pypdfium2 pillow)，页面在进程池中渲染，识别结果按页序输出
+#
+#     python -m src.poc.pdf_ocr_poc report.pdf [first_page] [last_page]
+if __name__ == "__main__":
+    pdf_path = sys.argv[1]
+    first_page = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    last_page = int(sys.argv[3]) if len(sys.argv) > 3 else None
+    with PdfOCR(GoogleOCRService(), dpi=200) as pdf_ocr:
+        for number, text in pdf_ocr.iter_pages(pdf_path, first_page, last_page):
+            if isinstance(text, Exception):
+                logger.warning(f"Page {number}: {text}")
+            else:
+                logger.info(f"Page {number}:\n{text}")
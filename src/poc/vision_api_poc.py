@@ -1,4 +1,7 @@
 import src.configs.config
+from src.configs.config import settings
+
+settings.setup()
 
 def detect_text(path):
     """Detects text in the file."""
@@ -1,46 +1,285 @@
 import src.configs.config
+from src.configs.config import settings
+from loguru import logger
+import asyncio
 import os
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 from google.cloud import vision
 
+from src.services.vision_client_pool import VisionClientPool
+
+# images per batch_annotate_images request, the limit of the synchronous Vision API
+MAX_BATCH_SIZE = 16
+FEATURE = "TEXT_DETECTION"
 
 
 class GoogleOCRService:
 
-    def __init__(self):
+    def __init__(self, client=None, async_client=None, cache=None, language_hints=None, preprocessor=None,
+                 pool_size=4):
         """
         Initializes the OCR service with the specified engine.
         Currently, it uses the Google Cloud Vision API as the OCR engine.
         Google credentail file is defined as a system variable GOOGLE_APPLICATION_CREDENTIALS.
+        The Vision clients are created on first use, up to pool_size of them for concurrent callers.
+
+        Args:
+            client (ImageAnnotatorClient): The Vision client, created from the credentials if None.
+            async_client (ImageAnnotatorAsyncClient): The async Vision client, created on first async use if None.
+            cache (OCRResultCache): Opt-in, images already OCRed (same bytes, same options) are not sent again.
+            language_hints (list): Vision language hints, e.g. ["zh", "en"].
+            preprocessor (ImagePreprocessor): Opt-in, shrinks the images before they are uploaded.
+            pool_size (int): Max Vision clients (gRPC channels) of the sync pool and of the async pool of each event loop.
         """
-        self._client = vision.ImageAnnotatorClient()
+        self._cache = cache
+        self._language_hints = list(language_hints or [])
+        self._preprocessor = preprocessor
+        # the cache key includes the preprocessing options, they may change the OCR result
+        self._cache_feature = FEATURE if preprocessor is None else f"{FEATURE}|{preprocessor.signature}"
+        self._pool_size = pool_size
+        self._pool = VisionClientPool.of(client) if client is not None else VisionClientPool(self._new_client, pool_size)
+        self._async_client = async_client
+        self._async_pools = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _check_credentials():
         # check env variable
         if "GOOGLE_APPLICATION_CREDENTIALS" not in os.environ:
             raise Exception(
                 "GOOGLE_APPLICATION_CREDENTIALS environment variable not set."
             )
+        settings.ensure_proxy()
+
+    @classmethod
+    def _new_client(cls):
+        cls._check_credentials()
+        return vision.ImageAnnotatorClient()
+
+    @classmethod
+    def _new_async_client(cls):
+        cls._check_credentials()
+        return vision.ImageAnnotatorAsyncClient()
 
+    def _get_async_pool(self):
+        # a grpc.aio channel is bound to the event loop it was created in, e.g. every asyncio.run needs its own
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            pool = self._async_pools.get(loop)
+            if pool is None:
+                if self._async_client is not None:
+                    pool = VisionClientPool.of(self._async_client)
+                else:
+                    pool = VisionClientPool(self._new_async_client, self._pool_size)
+                self._async_pools[loop] = pool
+            return pool
+
+    def pool_stats(self):
+        with self._lock:
+            async_pools = list(self._async_pools.values())
+        return {"sync": self._pool.stats(), "async": [pool.stats() for pool in async_pools]}
 
     def extract_text_from_img(self, image_path):
         """
         Extracts text from a img file using the Google Cloud Vision API.
 
         Args:
-            pdf_path (str): The path to the PDF file.
-        
+            image_path (str): The path to the image file.
+
         """
         with open(image_path, "rb") as image_file:
             content = image_file.read()
 
-        image = vision.Image(content=content)
-        response = self._client.text_detection(image=image)
+        cached = self._cached(content)
+        if cached is not None:
+            return cached
+        upload = self._preprocessor.preprocess(content) if self._preprocessor is not None else content
+        image = vision.Image(content=upload)
+        with self._pool.lease() as client:
+            if self._language_hints:
+                response = client.text_detection(image=image, image_context=self._image_context())
+            else:
+                response = client.text_detection(image=image)
+        return self._store(content, self._text_of(response))
+
+    def _image_context(self):
+        return vision.ImageContext(language_hints=self._language_hints)
+
+    def _cached(self, content):
+        if self._cache is None:
+            return None
+        return self._cache.get(content, self._cache_feature, self._language_hints)
+
+    def _store(self, content, text):
+        if self._cache is not None:
+            self._cache.put(content, text, self._cache_feature, self._language_hints)
+        return text
+
+    @staticmethod
+    def _text_of(response):
         if response.error.message:
-            raise
+            raise Exception(f"OCR failed: {response.error.message}")
         texts = response.text_annotations
         if texts:
             return texts[0].description
         else:
             raise Exception("No text detected.")
-        
-google_ocr_service = GoogleOCRService()
+
+    @staticmethod
+    def _read(image_path):
+        with open(image_path, "rb") as image_file:
+            return image_file.read()
+
+    def _request(self, content):
+        return vision.AnnotateImageRequest(
+            image=vision.Image(content=content),
+            features=[vision.Feature(type_=vision.Feature.Type[FEATURE])],
+            image_context=self._image_context() if self._language_hints else None,
+        )
+
+    @staticmethod
+    def _batches(items, batch_size):
+        batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+    def _fill(self, results, batch, responses):
+        for (index, content), response in zip(batch, responses):
+            try:
+                results[index] = self._store(content, self._text_of(response))
+            except Exception as e:
+                results[index] = e
+
+    @staticmethod
+    def _as_is(content):
+        return content
+
+    def _read_batch(self, batch, results, read=None):
+        """
+        Reads the images of batch (with read, default from their paths), fills results with the
+        cached texts and read errors; returns the [(index, content), ...] to send.
+        """
+        to_send = []
+        for index, image in batch:
+            try:
+                content = (read or self._read)(image)
+            except OSError as e:
+                results[index] = e
+                continue
+            cached = self._cached(content)
+            if cached is not None:
+                results[index] = cached
+            else:
+                to_send.append((index, content))
+        return to_send
+
+    def _batch_failed(self, requests, results, error):
+        logger.warning(f"OCR batch of {len(requests)} images failed: {error!r}")
+        for index, _ in requests:
+            results[index] = error
+
+    def extract_text_from_imgs(self, image_paths, batch_size=MAX_BATCH_SIZE, max_workers=1):
+        """
+        Extracts the text of many images with one batch_annotate_images request per batch_size images.
+        The files are read batch by batch, so a large folder is not held in memory.
+
+        Args:
+            image_paths (list): The paths of the image files.
+            batch_size (int): Images per request, at most MAX_BATCH_SIZE.
+            max_workers (int): Batch requests in flight, on threads that lease their clients from the pool.
+
+        Returns:
+            list: Per image, in input order, its text or the exception it failed with.
+        """
+        return self._extract(image_paths, self._read, batch_size, max_workers)
+
+    def extract_text_from_contents(self, contents, batch_size=MAX_BATCH_SIZE, max_workers=1):
+        """
+        extract_text_from_imgs for images already in memory (bytes), e.g. rendered PDF pages.
+        """
+        return self._extract(contents, self._as_is, batch_size, max_workers)
+
+    def _extract(self, images, read, batch_size, max_workers):
+        results = [None] * len(images)
+
+        def annotate(batch):
+            requests = self._read_batch(batch, results, read)
+            if not requests:
+                return
+            uploads = [content for _, content in requests]
+            if self._preprocessor is not None:
+                uploads = self._preprocessor.preprocess_many(uploads)
+            try:
+                with self._pool.lease() as client:
+                    response = client.batch_annotate_images(requests=[self._request(upload) for upload in uploads])
+            except Exception as e:
+                self._batch_failed(requests, results, e)
+                return
+            self._fill(results, requests, response.responses)
+
+        batches = self._batches(list(enumerate(images)), batch_size)
+        if max_workers <= 1 or len(batches) <= 1:
+            for batch in batches:
+                annotate(batch)
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ocr") as executor:
+                list(executor.map(annotate, batches))
+        return results
+
+    async def aextract_text_from_imgs(self, image_paths, batch_size=MAX_BATCH_SIZE, max_concurrency=4):
+        """
+        Async version of extract_text_from_imgs, with at most max_concurrency batch requests in flight.
+        """
+        return await self._aextract(image_paths, self._read, batch_size, max_concurrency)
+
+    async def aextract_text_from_contents(self, contents, batch_size=MAX_BATCH_SIZE, max_concurrency=4):
+        """
+        Async version of extract_text_from_contents.
+        """
+        return await self._aextract(contents, self._as_is, batch_size, max_concurrency)
+
+    async def _aextract(self, images, read, batch_size, max_concurrency):
+        pool = self._get_async_pool()
+        semaphore = asyncio.Semaphore(max_concurrency)
+        results = [None] * len(images)
+
+        async def annotate(batch):
+            async with semaphore:
+                requests = await asyncio.to_thread(self._read_batch, batch, results, read)
+                if not requests:
+                    return
+                uploads = [content for _, content in requests]
+                if self._preprocessor is not None:
+                    uploads = await self._preprocessor.apreprocess_many(uploads)
+                try:
+                    with pool.lease() as client:
+                        response = await client.batch_annotate_images(requests=[self._request(upload) for upload in uploads])
+                except Exception as e:
+                    self._batch_failed(requests, results, e)
+                    return
+            self._fill(results, requests, response.responses)
+
+        await asyncio.gather(*(annotate(batch) for batch in self._batches(list(enumerate(images)), batch_size)))
+        return results
+
+_default_service = None
+_default_lock = threading.Lock()
+
+
+def get_google_ocr_service():
+    """
+    The shared GoogleOCRService, created on first call rather than at import.
+    """
+    global _default_service
+    with _default_lock:
+        if _default_service is None:
+            _default_service = GoogleOCRService()
+        return _default_service
 
 
+def __getattr__(name):
+    # keeps `from src.services.google_ocr_service import google_ocr_service` working, lazily
+    if name == "google_ocr_service":
+        return get_google_ocr_service()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,175 @@
+from loguru import logger
+import asyncio
+import functools
+import io
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# JPEG qualities tried in turn until the image fits the byte budget, then the image is downscaled
+QUALITY_STEPS = (85, 70, 55, 40)
+# images with at most this many colours (screenshots, scans of text) are tried as PNG first
+PNG_MAX_COLOURS = 64
+
+
+def _require_pillow():
+    try:
+        import PIL.Image
+    except ImportError as e:
+        raise ImportError("Image preprocessing needs Pillow: pip install pillow") from e
+    return PIL.Image
+
+
+def preprocess_image(content, max_side=2048, grayscale=True, max_bytes=1024 * 1024, quality=85):
+    """
+    Shrinks an image for OCR: decodes it, turns it upright (re-encoding drops the EXIF
+    orientation of camera photos), downscales it so that its longer side is at most
+    max_side, converts it to grayscale and re-encodes it (PNG for few-colour images like
+    screenshots, JPEG otherwise) under max_bytes. The original is returned if it is already
+    smaller. Runs in a worker process, so it only takes and returns picklable values.
+
+    Returns:
+        tuple: (content, seconds spent).
+    """
+    start = time.process_time()
+    Image = _require_pillow()
+    from PIL import ImageOps
+    with Image.open(io.BytesIO(content)) as image:
+        image.load()
+        image = ImageOps.exif_transpose(image)
+        if image.mode in ("RGBA", "LA", "P"):
+            # transparent pixels become white, not black
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image.convert("RGBA"), mask=image.convert("RGBA").getchannel("A"))
+            image = background
+        image = image.convert("L" if grayscale else "RGB")
+        if max(image.size) > max_side:
+            image.thumbnail((max_side, max_side), Image.LANCZOS)
+        best = _encode(image, max_bytes, quality)
+    if len(best) >= len(content):
+        best = content
+    return best, time.process_time() - start
+
+
+def _encode(image, max_bytes, quality):
+    Image = _require_pillow()
+    # few colours (text on a flat background) compress better and sharper as PNG
+    if image.getcolors(PNG_MAX_COLOURS) is not None:
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG", optimize=True)
+        if buffer.tell() <= max_bytes:
+            return buffer.getvalue()
+    steps = [step for step in QUALITY_STEPS if step <= quality] or [quality]
+    while True:
+        for step in steps:
+            buffer = io.BytesIO()
+            image.save(buffer, format="JPEG", quality=step, optimize=True)
+            if buffer.tell() <= max_bytes:
+                return buffer.getvalue()
+        if max(image.size) <= 512:
+            return buffer.getvalue()
+        image = image.resize((image.width * 3 // 4, image.height * 3 // 4), Image.LANCZOS)
+
+
+class ImagePreprocessor:
+    """
+    Runs preprocess_image in a process pool, so that decoding and re-encoding images neither
+    blocks the event loop nor holds the GIL of the calling process. Counts the bytes in and out
+    and the CPU seconds spent in the workers.
+
+    Needs Pillow (pip install pillow).
+
+    Args:
+        max_side (int): Max width/height in pixels; Vision reads text well at 1024-2048.
+        grayscale (bool): Drops colours, text detection does not need them.
+        max_bytes (int): Byte budget of a preprocessed image.
+        quality (int): Highest JPEG quality tried.
+        max_workers (int): Worker processes, default one per CPU.
+    """
+
+    def __init__(self, max_side=2048, grayscale=True, max_bytes=1024 * 1024, quality=85, max_workers=None):
+        _require_pillow()
+        self._options = {"max_side": max_side, "grayscale": grayscale, "max_bytes": max_bytes, "quality": quality}
+        self._max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cpu_seconds = 0.0
+
+    @property
+    def signature(self):
+        """
+        The options, as part of cache keys: other options may give another OCR result.
+        """
+        return "preprocess:" + ",".join(f"{key}={value}" for key, value in sorted(self._options.items()))
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+            return self._executor
+
+    def _record(self, original, result):
+        content, seconds = result
+        with self._lock:
+            self.images += 1
+            self.bytes_in += len(original)
+            self.bytes_out += len(content)
+            self.cpu_seconds += seconds
+        return content
+
+    def preprocess_many(self, contents):
+        """
+        Returns the preprocessed contents, in order; an image that cannot be decoded is passed on unchanged.
+        """
+        contents = list(contents)
+        futures = [self._get_executor().submit(preprocess_image, content, **self._options) for content in contents]
+        results = []
+        for content, future in zip(contents, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                results.append(e)
+        return [self._result(content, result) for content, result in zip(contents, results)]
+
+    def _result(self, content, result):
+        # gather(return_exceptions=True) also returns a CancelledError, which is no Exception
+        if isinstance(result, BaseException):
+            logger.warning(f"Image not preprocessed, uploading it as is: {result!r}")
+            result = (content, 0.0)
+        return self._record(content, result)
+
+    def preprocess(self, content):
+        return self.preprocess_many([content])[0]
+
+    async def apreprocess_many(self, contents):
+        loop = asyncio.get_running_loop()
+        contents = list(contents)
+        run = functools.partial(preprocess_image, **self._options)
+        futures = [loop.run_in_executor(self._get_executor(), run, content) for content in contents]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        return [self._result(content, result) for content, result in zip(contents, results)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "images": self.images,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "cpu_seconds": self.cpu_seconds,
+            }
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,125 @@
+from loguru import logger
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+
+def ocr_cache_key(content, feature="TEXT_DETECTION", language_hints=None):
+    """
+    The key of an OCR result: a hash of the image bytes, not of its path, so that the same
+    image in another folder or under another name is a hit; plus the request options.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    return f"{digest}:{feature}:{','.join(language_hints or ())}"
+
+
+class OCRResultCache:
+    """
+    A persistent, content-addressed cache of OCR texts in a SQLite file. It keeps at most
+    max_entries results and max_bytes of text, evicting the least recently used ones.
+
+    hits, misses and bytes_saved (the image bytes not uploaded thanks to hits) are counted
+    over the lifetime of the instance.
+
+    Args:
+        path (str): The SQLite file, ":memory:" for a cache that is not persisted.
+        max_entries (int): Max cached results.
+        max_bytes (int): Max total size of the cached texts (UTF-8).
+    """
+
+    def __init__(self, path, max_entries=100000, max_bytes=512 * 1024 * 1024, clock=time.time):
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._clock = clock
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_results ("
+            "key TEXT PRIMARY KEY, text TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_results_last_used ON ocr_results (last_used)")
+        self._conn.commit()
+        self._count, self._bytes = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_results").fetchone()
+        self.hits = 0
+        self.misses = 0
+        self.bytes_saved = 0
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "entries": self._count,
+            "bytes": self._bytes,
+        }
+
+    def get(self, content, feature="TEXT_DETECTION", language_hints=None):
+        """
+        The cached text of the image content, None on a miss.
+        """
+        key = ocr_cache_key(content, feature, language_hints)
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE ocr_results SET last_used = ? WHERE key = ?", (self._clock(), key))
+            self._conn.commit()
+            self.hits += 1
+            self.bytes_saved += len(content)
+            return row[0]
+
+    def put(self, content, text, feature="TEXT_DETECTION", language_hints=None):
+        key = ocr_cache_key(content, feature, language_hints)
+        size = len(text.encode("utf8"))
+        if size > self._max_bytes:
+            logger.warning(f"OCR result of {size} bytes is larger than the cache, not cached")
+            return
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM ocr_results WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                self._conn.execute("UPDATE ocr_results SET text = ?, size = ?, last_used = ? WHERE key = ?",
+                                   (text, size, self._clock(), key))
+                self._bytes += size - row[0]
+            else:
+                self._conn.execute("INSERT INTO ocr_results (key, text, size, last_used) VALUES (?, ?, ?, ?)",
+                                   (key, text, size, self._clock()))
+                self._count += 1
+                self._bytes += size
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        victims = []
+        if self._count > self._max_entries:
+            victims = self._conn.execute("SELECT key, size FROM ocr_results ORDER BY last_used LIMIT ?",
+                                         (self._count - self._max_entries,)).fetchall()
+        freed = sum(size for _, size in victims)
+        if self._bytes - freed > self._max_bytes:
+            for key, size in self._conn.execute("SELECT key, size FROM ocr_results ORDER BY last_used LIMIT -1 OFFSET ?",
+                                                (len(victims),)):
+                victims.append((key, size))
+                freed += size
+                if self._bytes - freed <= self._max_bytes:
+                    break
+        if victims:
+            self._conn.executemany("DELETE FROM ocr_results WHERE key = ?", [(key,) for key, _ in victims])
+            self._count -= len(victims)
+            self._bytes -= freed
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM ocr_results")
+            self._conn.commit()
+            self._count = self._bytes = 0
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
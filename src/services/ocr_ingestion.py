@@ -0,0 +1,183 @@
+import src.configs.config
+from loguru import logger
+import asyncio
+import glob
+import os
+import time
+from dataclasses import dataclass
+
+from src.llm_chains.extraction_job import JsonlResultWriter
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".webp", ".tif", ".tiff", ".ico")
+
+
+def manifest_key(path, stat):
+    """
+    A file is processed again if its path, mtime or size changed.
+    """
+    return f"{path}|{stat.st_mtime_ns}|{stat.st_size}"
+
+
+def iter_images(root, pattern="**/*", extensions=IMAGE_EXTENSIONS):
+    """
+    Yields (absolute path, os.stat_result) of the image files under root matching pattern, sorted.
+    """
+    for path in sorted(glob.iglob(os.path.join(root, pattern), recursive=True)):
+        if not path.lower().endswith(extensions):
+            continue
+        try:
+            stat = os.stat(path)
+        except OSError:
+            # deleted since listed
+            continue
+        if os.path.isfile(path):
+            yield os.path.abspath(path), stat
+
+
+@dataclass
+class OCRIngestionReport:
+    files: int = 0
+    skipped: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def files_per_second(self):
+        return (self.succeeded + self.failed) / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+
+class OCRIngestionJob:
+    """
+    OCRs every image of a folder (or a glob under it) with GoogleOCRService, incrementally.
+
+    The texts are appended to output_path (JSONL, one {"id": path, "mtime_ns", "size", "text"}
+    per image) and every processed file to the manifest <output>.manifest.jsonl, keyed by path,
+    mtime and size. A run only stats the files and skips those in the manifest, so an interrupted
+    or repeated run OCRs only new, changed and previously failed files. The output is written
+    before the manifest: after a crash the last chunk may be OCRed again and appear twice in the
+    output, the last record of a path wins. Failures are listed in <output>.errors.jsonl.
+
+        job = OCRIngestionJob(GoogleOCRService(), "logs/ocr.jsonl")
+        job.run("~/Pictures/ocr_test")
+        asyncio.run(job.watch("~/Pictures/ocr_test", interval=10))
+
+    Args:
+        service (GoogleOCRService): The OCR service, see its cache and preprocessor options.
+        output_path (str): The JSONL output.
+        batch_size (int): Images per Vision request.
+        max_concurrency (int): Max Vision requests in flight.
+        settle_seconds (float): Files modified more recently are left for the next run, they may be still being copied.
+    """
+
+    def __init__(self, service, output_path, batch_size=16, max_concurrency=4, settle_seconds=2.0):
+        self._service = service
+        self._output_path = output_path
+        self._manifest_path = output_path + ".manifest.jsonl"
+        self._errors_path = output_path + ".errors.jsonl"
+        self._batch_size = batch_size
+        self._max_concurrency = max_concurrency
+        self._settle_seconds = settle_seconds
+        self._processed = None
+        self.report = None
+
+    def processed(self):
+        """
+        The manifest keys of the processed files, loaded once per job.
+        """
+        if self._processed is None:
+            self._processed = JsonlResultWriter(self._manifest_path).completed_ids()
+        return self._processed
+
+    def pending(self, root, pattern="**/*"):
+        """
+        Yields the (path, stat) of the files to OCR, counting the skipped ones in self.report.
+        """
+        processed = self.processed()
+        settled = time.time() - self._settle_seconds
+        for path, stat in iter_images(os.path.expanduser(root), pattern):
+            self.report.files += 1
+            if manifest_key(path, stat) in processed or stat.st_mtime > settled:
+                self.report.skipped += 1
+                continue
+            yield path, stat
+
+    async def arun(self, root, pattern="**/*", limit=None):
+        """
+        Args:
+            root (str): The folder.
+            pattern (str): A glob relative to root, e.g. "scans/*.png"; the default recurses into subfolders.
+            limit (int): Max files to OCR in this run.
+        """
+        report = OCRIngestionReport()
+        self.report = report
+        if os.path.exists(self._errors_path):
+            # the failures of the previous run are retried below
+            os.remove(self._errors_path)
+        output = JsonlResultWriter(self._output_path, flush_every=1000)
+        manifest = JsonlResultWriter(self._manifest_path, flush_every=1000)
+        errors = JsonlResultWriter(self._errors_path, flush_every=1)
+        # a chunk keeps every request slot busy and is the unit of checkpointing
+        chunk_size = self._batch_size * self._max_concurrency
+        chunk = []
+        start = time.perf_counter()
+
+        async def process(chunk):
+            texts = await self._service.aextract_text_from_imgs(
+                [path for path, _ in chunk], batch_size=self._batch_size, max_concurrency=self._max_concurrency)
+            for (path, stat), text in zip(chunk, texts):
+                if isinstance(text, Exception):
+                    report.failed += 1
+                    errors.write({"id": path, "error": repr(text)})
+                    continue
+                report.succeeded += 1
+                output.write({"id": path, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "text": text})
+            output.flush()
+            for (path, stat), text in zip(chunk, texts):
+                if not isinstance(text, Exception):
+                    key = manifest_key(path, stat)
+                    manifest.write({"id": key})
+                    self.processed().add(key)
+            manifest.flush()
+            report.elapsed_seconds = time.perf_counter() - start
+            logger.info(f"OCRed {report.succeeded + report.failed} files, {report.files_per_second:.1f} files/s")
+
+        try:
+            for item in self.pending(root, pattern):
+                if limit is not None and report.succeeded + report.failed + len(chunk) >= limit:
+                    break
+                chunk.append(item)
+                if len(chunk) == chunk_size:
+                    await process(chunk)
+                    chunk = []
+            if chunk:
+                await process(chunk)
+        finally:
+            output.close()
+            manifest.close()
+            errors.close()
+            report.elapsed_seconds = time.perf_counter() - start
+            # a watch polls often, only runs that did something are worth an info line
+            log = logger.info if report.succeeded + report.failed else logger.debug
+            log(f"OCR ingestion of {root} done: {report.succeeded} ok, {report.failed} failed, "
+                f"{report.skipped} skipped, {report.files_per_second:.1f} files/s")
+        return report
+
+    def run(self, root, pattern="**/*", limit=None):
+        """
+        Sync version of arun, not to be called from a running event loop.
+        """
+        return asyncio.run(self.arun(root, pattern, limit))
+
+    async def watch(self, root, pattern="**/*", interval=10.0, stop=None):
+        """
+        Runs arun every interval seconds until stop (an asyncio.Event) is set, so that files
+        added to the folder are OCRed as they arrive.
+        """
+        stop = stop or asyncio.Event()
+        while not stop.is_set():
+            await self.arun(root, pattern)
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,203 @@
+from loguru import logger
+import asyncio
+import io
+import itertools
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# the document last opened by this (worker) process, consecutive pages of a PDF reuse it
+_open_document = {}
+
+
+def _require_pdfium():
+    try:
+        import pypdfium2
+    except ImportError as e:
+        raise ImportError("PDF OCR needs pypdfium2 and Pillow: pip install pypdfium2 pillow") from e
+    return pypdfium2
+
+
+def _document(pdf_path):
+    pdfium = _require_pdfium()
+    key = (os.path.abspath(pdf_path), os.path.getmtime(pdf_path))
+    if key not in _open_document:
+        for document in _open_document.values():
+            document.close()
+        _open_document.clear()
+        _open_document[key] = pdfium.PdfDocument(pdf_path)
+    return _open_document[key]
+
+
+def pdf_page_count(pdf_path):
+    pdfium = _require_pdfium()
+    document = pdfium.PdfDocument(pdf_path)
+    try:
+        return len(document)
+    finally:
+        document.close()
+
+
+def render_page(pdf_path, page_index, dpi=200):
+    """
+    Rasterises a page (0-based) of the PDF to a grayscale PNG. Runs in a worker process, so it
+    only takes and returns picklable values.
+    """
+    page = _document(pdf_path)[page_index]
+    try:
+        image = page.render(scale=dpi / 72, grayscale=True).to_pil()
+    finally:
+        page.close()
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class PdfOCR:
+    """
+    OCRs a PDF page by page: pages are rasterised in a process pool and sent to
+    GoogleOCRService as soon as batch_size of them are ready, while the next pages render.
+    At most prefetch rendered pages are held, so memory does not grow with the page count.
+
+        with PdfOCR(GoogleOCRService()) as pdf_ocr:
+            for number, text in pdf_ocr.iter_pages("report.pdf", first_page=3, last_page=10):
+                ...
+
+    Needs pypdfium2 and Pillow (pip install pypdfium2 pillow) unless renderer and
+    page_counter are given.
+
+    Args:
+        service (GoogleOCRService): The OCR service, see its cache and preprocessor options.
+        dpi (int): Rendering resolution; 200-300 suits Vision text detection.
+        batch_size (int): Pages per Vision request.
+        prefetch (int): Max pages rendered ahead, at least batch_size.
+        max_workers (int): Rendering processes, default one per CPU.
+        executor (Executor): Renders the pages instead of a ProcessPoolExecutor of max_workers processes.
+        renderer (callable): (pdf_path, page_index, dpi) -> image bytes, picklable for a process pool.
+        page_counter (callable): pdf_path -> number of pages.
+    """
+
+    def __init__(self, service, dpi=200, batch_size=4, prefetch=8, max_workers=None, executor=None,
+                 renderer=render_page, page_counter=pdf_page_count):
+        self._service = service
+        self._dpi = dpi
+        self._batch_size = batch_size
+        self._prefetch = max(prefetch, batch_size)
+        self._max_workers = max_workers
+        self._executor = executor
+        self._owns_executor = executor is None
+        self._renderer = renderer
+        self._page_counter = page_counter
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self._max_workers)
+            return self._executor
+
+    def page_numbers(self, pdf_path, first_page=1, last_page=None):
+        """
+        The 1-based page numbers of the range, last_page None for the last page of the PDF.
+        """
+        count = self._page_counter(pdf_path)
+        last_page = count if last_page is None else last_page
+        if not 1 <= first_page <= last_page <= count:
+            raise ValueError(f"Page range {first_page}-{last_page} is not within the {count} pages of {pdf_path}")
+        return range(first_page, last_page + 1)
+
+    def _ocr_results(self, batch, texts):
+        texts = iter(texts)
+        return [(number, content if isinstance(content, Exception) else next(texts)) for number, content in batch]
+
+    @staticmethod
+    def _rendered(batch):
+        return [content for _, content in batch if not isinstance(content, Exception)]
+
+    def iter_pages(self, pdf_path, first_page=1, last_page=None):
+        """
+        Yields (page number, text) in page order; text is the exception the page failed with
+        (rendering or OCR, "No text detected." for a blank page).
+        """
+        pages = iter(self.page_numbers(pdf_path, first_page, last_page))
+        executor = self._get_executor()
+        window = deque()
+
+        def submit(count):
+            for number in itertools.islice(pages, count):
+                window.append((number, executor.submit(self._renderer, pdf_path, number - 1, self._dpi)))
+
+        submit(self._prefetch)
+        try:
+            while window:
+                batch = []
+                while window and len(batch) < self._batch_size:
+                    number, future = window.popleft()
+                    try:
+                        batch.append((number, future.result()))
+                    except Exception as e:
+                        logger.warning(f"Page {number} of {pdf_path} not rendered: {e!r}")
+                        batch.append((number, e))
+                    submit(1)
+                texts = self._service.extract_text_from_contents(self._rendered(batch), batch_size=self._batch_size)
+                yield from self._ocr_results(batch, texts)
+        finally:
+            for _, future in window:
+                future.cancel()
+
+    async def aiter_pages(self, pdf_path, first_page=1, last_page=None):
+        """
+        Async version of iter_pages.
+        """
+        loop = asyncio.get_running_loop()
+        pages = iter(self.page_numbers(pdf_path, first_page, last_page))
+        executor = self._get_executor()
+        window = deque()
+
+        def submit(count):
+            for number in itertools.islice(pages, count):
+                window.append((number, loop.run_in_executor(executor, self._renderer, pdf_path, number - 1, self._dpi)))
+
+        submit(self._prefetch)
+        try:
+            while window:
+                batch = []
+                while window and len(batch) < self._batch_size:
+                    number, future = window.popleft()
+                    try:
+                        batch.append((number, await future))
+                    except Exception as e:
+                        logger.warning(f"Page {number} of {pdf_path} not rendered: {e!r}")
+                        batch.append((number, e))
+                    submit(1)
+                texts = await self._service.aextract_text_from_contents(self._rendered(batch), batch_size=self._batch_size)
+                for result in self._ocr_results(batch, texts):
+                    yield result
+        finally:
+            for _, future in window:
+                future.cancel()
+
+    def extract_text(self, pdf_path, first_page=1, last_page=None, separator="\n\n"):
+        """
+        The text of the page range, pages that failed are left out (and logged).
+        """
+        texts = []
+        for number, text in self.iter_pages(pdf_path, first_page, last_page):
+            if isinstance(text, Exception):
+                logger.warning(f"Page {number} of {pdf_path}: {text}")
+                continue
+            texts.append(text)
+        return separator.join(texts)
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None and self._owns_executor:
+                self._executor.shutdown()
+                self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,75 @@
+from loguru import logger
+import contextlib
+import threading
+
+
+class VisionClientPool:
+    """
+    Up to size Vision clients (each with its own gRPC channel), created on first use. lease()
+    checks out the least busy client, creating a new one while all existing clients are busy
+    and the pool is not full, so a single worker uses one channel and concurrent workers
+    spread over size channels. Clients are shared, not exclusive: once the pool is full,
+    workers share the least busy one.
+
+    Thread-safe. For async clients use one pool per event loop, a grpc.aio channel is bound
+    to the loop it was created in.
+
+    Args:
+        factory (callable): Creates a client, e.g. vision.ImageAnnotatorClient.
+        size (int): Max clients.
+    """
+
+    def __init__(self, factory, size=4):
+        self._factory = factory
+        self._size = max(1, size)
+        self._lock = threading.Lock()
+        self._clients = []
+        self._in_flight = []
+        self.leases = 0
+        self.peak_in_flight = 0
+
+    @classmethod
+    def of(cls, client):
+        """
+        A pool of just client, e.g. an injected or fake one.
+        """
+        pool = cls(lambda: client, size=1)
+        pool._clients.append(client)
+        pool._in_flight.append(0)
+        return pool
+
+    def _checkout(self):
+        with self._lock:
+            index = min(range(len(self._clients)), key=self._in_flight.__getitem__, default=None)
+            if (index is None or self._in_flight[index]) and len(self._clients) < self._size:
+                # created under the lock, so concurrent first calls do not open extra channels
+                self._clients.append(self._factory())
+                self._in_flight.append(0)
+                index = len(self._clients) - 1
+                logger.debug(f"Created Vision client {len(self._clients)}/{self._size}")
+            self._in_flight[index] += 1
+            self.leases += 1
+            self.peak_in_flight = max(self.peak_in_flight, sum(self._in_flight))
+            return index
+
+    def _release(self, index):
+        with self._lock:
+            self._in_flight[index] -= 1
+
+    @contextlib.contextmanager
+    def lease(self):
+        index = self._checkout()
+        try:
+            yield self._clients[index]
+        finally:
+            self._release(index)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "clients": len(self._clients),
+                "size": self._size,
+                "in_flight": list(self._in_flight),
+                "leases": self.leases,
+                "peak_in_flight": self.peak_in_flight,
+            }
@@ -0,0 +1,165 @@
+import asyncio
+import time
+from typing import Any
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.llm_chains.batch_runner import (
+    AdaptiveConcurrencyLimiter,
+    BatchRunner,
+    TokenBucket,
+    is_throttling_error,
+)
+from src.llm_chains.translate_chain_factory import TranslateChainFactory
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+class ThrottlingChatModel(BaseChatModel):
+    """
+    Echoes the prompt after latency seconds, answers 429 above capacity in-flight calls.
+    """
+    latency: float = 0.01
+    capacity: int = 1000
+    in_flight: int = 0
+    throttled: int = 0
+
+    @property
+    def _llm_type(self):
+        return "throttling-fake"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        raise NotImplementedError
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        if self.in_flight >= self.capacity:
+            self.throttled += 1
+            raise RateLimitError("429 Too Many Requests")
+        self.in_flight += 1
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self.in_flight -= 1
+        text = messages[-1].content.rsplit(". ", 1)[-1]
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=f"<{text}>"))])
+
+
+def test_results_keep_input_order():
+    llm = ThrottlingChatModel()
+    chain = TranslateChainFactory.create_chain(llm)
+    inputs = [{"text": f"text {i}"} for i in range(50)]
+    runner = BatchRunner(initial_concurrency=8)
+    results = runner.run(chain, inputs)
+    assert results == [f"<text {i}>" for i in range(50)]
+    assert runner.report.succeeded == 50
+
+
+def test_throttling_reduces_concurrency_and_retries():
+    llm = ThrottlingChatModel(capacity=3, latency=0.02)
+    chain = TranslateChainFactory.create_chain(llm)
+    runner = BatchRunner(initial_concurrency=16, max_retries=10, retry_backoff=0.01)
+    results = runner.run(chain, [{"text": str(i)} for i in range(60)])
+    assert results == [f"<{i}>" for i in range(60)]
+    assert runner.report.throttled > 0
+    assert runner.report.throttled == llm.throttled
+    assert runner.report.final_concurrency < 16
+
+
+def test_concurrency_grows_without_throttling():
+    llm = ThrottlingChatModel(latency=0.005)
+    runner = BatchRunner(initial_concurrency=2, max_concurrency=32)
+    runner.run(TranslateChainFactory.create_chain(llm), [{"text": str(i)} for i in range(200)])
+    assert runner.report.final_concurrency > 2
+    assert runner.report.max_in_flight > 2
+
+
+def test_requests_per_minute_budget():
+    llm = ThrottlingChatModel(latency=0)
+    # 600 rpm = 10/s, the bucket starts full with 600 requests, so spend those first
+    runner = BatchRunner(requests_per_minute=600)
+    start = time.perf_counter()
+    runner.run(TranslateChainFactory.create_chain(llm), [{"text": str(i)} for i in range(605)])
+    assert time.perf_counter() - start >= 0.4
+
+
+def test_errors_are_returned_in_place():
+    class Broken(ThrottlingChatModel):
+        async def _agenerate(self, messages, *args, **kwargs):
+            if "bad" in messages[-1].content:
+                raise ValueError("boom")
+            return await super()._agenerate(messages, *args, **kwargs)
+
+    runner = BatchRunner()
+    results = runner.run(TranslateChainFactory.create_chain(Broken()),
+                         [{"text": "ok"}, {"text": "bad"}], return_exceptions=True)
+    assert results[0] == "<ok>"
+    assert isinstance(results[1], ValueError)
+    assert runner.report.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_waits_for_refill():
+    bucket = TokenBucket(rate_per_minute=600, capacity=1)
+    start = time.perf_counter()
+    for _ in range(3):
+        await bucket.acquire()
+    assert time.perf_counter() - start >= 0.18
+
+
+@pytest.mark.asyncio
+async def test_limiter_aimd():
+    limiter = AdaptiveConcurrencyLimiter(initial=8)
+    await limiter.acquire()
+    await limiter.release(throttled=True)
+    assert limiter.limit == 4
+    for _ in range(8):
+        await limiter.acquire()
+        await limiter.release(latency=0.1)
+    assert limiter.limit == 5
+
+
+@pytest.mark.asyncio
+async def test_limiter_decreases_once_per_window():
+    limiter = AdaptiveConcurrencyLimiter(initial=16)
+    for _ in range(8):
+        await limiter.acquire()
+    # a burst of 429s of the calls in flight together halves the limit once
+    for _ in range(8):
+        await limiter.release(throttled=True)
+    assert limiter.limit == 8
+    await limiter.acquire()
+    await limiter.release(throttled=True)
+    assert limiter.limit == 4
+
+
+def test_first_error_cancels_the_other_calls():
+    class Broken(ThrottlingChatModel):
+        async def _agenerate(self, messages, *args, **kwargs):
+            if "bad" in messages[-1].content:
+                raise ValueError("boom")
+            return await super()._agenerate(messages, *args, **kwargs)
+
+    llm = Broken(latency=0.2)
+    runner = BatchRunner(initial_concurrency=8)
+    start = time.perf_counter()
+    with pytest.raises(ValueError):
+        runner.run(TranslateChainFactory.create_chain(llm), [{"text": "bad"}] + [{"text": str(i)} for i in range(7)])
+    assert time.perf_counter() - start < 0.15
+    assert llm.in_flight == 0
+    assert runner.report.succeeded == 0
+
+
+def test_is_throttling_error():
+    assert is_throttling_error(RateLimitError())
+    assert is_throttling_error(Exception("429 RESOURCE_EXHAUSTED"))
+    assert is_throttling_error(Exception("Quota exceeded: RESOURCE_EXHAUSTED"))
+    wrapped = RuntimeError("Error calling model")
+    wrapped.__cause__ = RateLimitError()
+    assert is_throttling_error(wrapped)
+    assert not is_throttling_error(ValueError("boom"))
+    assert not is_throttling_error(ValueError("request req-4291 failed, payload 429 KB"))
@@ -0,0 +1,108 @@
+import asyncio
+import json
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda, RunnableParallel, RunnablePassthrough
+
+from src.llm_chains.chain_instrumentation import ChainInstrumentation
+
+
+def fake_llm(calls):
+    usage = {"input_tokens": 10, "output_tokens": 5, "total_tokens": 15}
+    return GenericFakeChatModel(messages=iter([AIMessage(content="x", usage_metadata=usage) for _ in range(calls)]))
+
+
+def slow(value):
+    time.sleep(0.05)
+    return value
+
+
+async def aslow(value):
+    await asyncio.sleep(0.05)
+    return value
+
+
+def fork_join_chain(llm):
+    """
+    The fork-join shape of src/poc/folk_chain_poc.py, with a slow step in every branch.
+    """
+    def branch(template):
+        return ChatPromptTemplate.from_template(template) | llm | RunnableLambda(slow, afunc=aslow) | StrOutputParser()
+
+    parallel_chains = RunnableParallel(
+        definition=branch("define {topic}"),
+        advantages=branch("advantages of {topic}"),
+        disadvantages=branch("disadvantages of {topic}"),
+    )
+    final_formatter = RunnableLambda(lambda x: {"topic": x["topic"], **x["extracted_parts"]})
+    report_chain = ChatPromptTemplate.from_template("{topic} {definition} {advantages} {disadvantages}") | llm | StrOutputParser()
+    return (
+        {"topic": RunnablePassthrough()}
+        | RunnablePassthrough.assign(extracted_parts=parallel_chains)
+        | final_formatter
+        | report_chain
+    )
+
+
+def test_stage_summary_of_fork_join_chain():
+    instrumentation = ChainInstrumentation()
+    fork_join_chain(fake_llm(4)).invoke("AI", config={"callbacks": [instrumentation]})
+    summary = instrumentation.stage_summary()
+
+    for key in ("definition", "advantages", "disadvantages"):
+        llm_stage = summary[f"extracted_parts/{key}/GenericFakeChatModel"]
+        assert llm_stage["run_type"] == "llm"
+        assert (llm_stage["input_tokens"], llm_stage["output_tokens"]) == (10, 5)
+        assert summary[f"extracted_parts/{key}/slow"]["p50"] >= 0.05
+    # the three slow branches overlapped
+    assert summary["extracted_parts"]["parallel_overlap"] > 1.5
+    assert summary["GenericFakeChatModel"]["count"] == 1
+    assert sum(summary["ChatPromptTemplate"]["histogram"].values()) == 1
+
+
+@pytest.mark.asyncio
+async def test_histograms_aggregate_runs_and_trace_is_nested(tmp_path):
+    instrumentation = ChainInstrumentation()
+    chain = fork_join_chain(fake_llm(8))
+    await chain.ainvoke("AI", config={"callbacks": [instrumentation]})
+    await chain.ainvoke("ML", config={"callbacks": [instrumentation]})
+    assert len(instrumentation.roots) == 2
+    assert instrumentation.stage_summary()["extracted_parts/definition/slow"]["count"] == 2
+
+    path = tmp_path / "trace.json"
+    instrumentation.write_chrome_trace(str(path), root=instrumentation.roots[0])
+    events = json.loads(path.read_text())["traceEvents"]
+    assert {event["name"] for event in events} >= {"GenericFakeChatModel", "slow", "StrOutputParser"}
+    # the events of one lane are properly nested
+    for lane in {event["tid"] for event in events}:
+        stack = []
+        for event in sorted((e for e in events if e["tid"] == lane), key=lambda e: e["ts"]):
+            end = event["ts"] + event["dur"]
+            while stack and stack[-1] <= event["ts"]:
+                stack.pop()
+            assert not stack or end <= stack[-1] + 1e-6
+            stack.append(end)
+
+
+def test_queue_delay_of_sequence_steps():
+    ticks = iter(range(100))
+    instrumentation = ChainInstrumentation(clock=lambda: next(ticks))
+    (RunnableLambda(lambda x: x) | RunnableLambda(lambda x: x)).invoke(1, config={"callbacks": [instrumentation]})
+    records = instrumentation.records()
+    # root start 0, step 1: 1-2, step 2: 3-4, root end 5
+    assert [r.queue_delay for r in records] == [0, 1, 1]
+
+
+def test_finished_runs_are_capped():
+    instrumentation = ChainInstrumentation(max_roots=3)
+    chain = RunnableLambda(lambda x: x) | RunnableLambda(lambda x: x)
+    for i in range(10):
+        chain.invoke(i, config={"callbacks": [instrumentation]})
+    assert len(instrumentation.roots) == 3
+    assert instrumentation._runs == {}
+    assert instrumentation.stage_summary()["RunnableLambda"]["count"] == 6
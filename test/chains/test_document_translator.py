@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from src.llm_chains.batch_runner import estimate_tokens
+from src.llm_chains.document_translator import DocumentTranslator, split_into_chunks
+
+DOCUMENT = (
+    "The sky is blue. Air scatters short wavelengths!  Why? Because of Rayleigh scattering.\n\n"
+    "第二段。天空是蓝色的！为什么？\n\n\n"
+    "A very long sentence without any punctuation " + "word " * 200 + "\n"
+    "Last line."
+)
+
+
+def test_chunks_reassemble_to_original():
+    for max_tokens in (5, 20, 100, 10000):
+        chunks = split_into_chunks(DOCUMENT, max_tokens)
+        assert "".join(chunk + separator for chunk, separator in chunks) == DOCUMENT
+
+
+def test_chunks_respect_budget():
+    chunks = split_into_chunks(DOCUMENT, 20)
+    assert len(chunks) > 3
+    assert all(estimate_tokens(chunk) <= 20 + 1 for chunk, _ in chunks)
+
+
+class RecordingLLM:
+    """
+    Upper-cases the chunk, records the prompts and the max number of concurrent calls.
+    """
+
+    def __init__(self):
+        self.prompts = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, prompt_value):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            content = prompt_value.to_messages()[-1].content
+            self.prompts.append(content)
+            return content.split(":\n")[-1].upper()
+        finally:
+            self.in_flight -= 1
+
+
+@pytest.mark.asyncio
+async def test_atranslate_is_ordered_bounded_and_has_context():
+    recorder = RecordingLLM()
+    translator = DocumentTranslator(RunnableLambda(recorder), max_chunk_tokens=20, max_concurrency=3, context_chars=10)
+    result = await translator.atranslate(DOCUMENT)
+
+    chunks = split_into_chunks(DOCUMENT, 20)
+    assert result == "".join(chunk.upper() + separator for chunk, separator in chunks)
+    assert recorder.max_in_flight <= 3
+    assert translator.last_stats["chunks"] == len(chunks)
+    assert any("(start of document)" in prompt for prompt in recorder.prompts)
+    # every other chunk carries the tail of its predecessor
+    second = next(p for p in recorder.prompts if chunks[1][0] in p)
+    assert chunks[0][0][-10:] in second
+
+
+def test_translate_sync():
+    translator = DocumentTranslator(RunnableLambda(lambda p: p.to_messages()[-1].content.split(":\n")[-1].upper()),
+                                    max_chunk_tokens=20)
+    assert translator.translate("Hello. World.") == "HELLO. WORLD."
+
+
+def test_cjk_text_is_chunked_within_budget():
+    text = "天空是蓝色的，因为空气散射短波长的阳光。" * 200
+    assert estimate_tokens("天空是蓝色的") == 7
+    chunks = split_into_chunks(text, 100)
+    assert len(chunks) > 30
+    assert all(len(chunk) <= 101 for chunk, _ in chunks)
+
+
+def test_blank_text_is_not_sent():
+    calls = []
+    translator = DocumentTranslator(RunnableLambda(lambda p: calls.append(p) or "x"), max_chunk_tokens=20)
+    assert translator.translate(" \n\n \t") == " \n\n \t"
+    assert translator.translate("") == ""
+    assert calls == []
@@ -0,0 +1,145 @@
+import asyncio
+import csv
+import json
+from typing import List
+
+import pytest
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableLambda
+from pydantic import BaseModel
+
+from src.llm.fake_chat_model_factory import FakeChatModelFactory
+from src.llm_chains.extraction_job import ExtractionJob, JsonlResultWriter, iter_corpus
+
+
+class ExtractedInfo(BaseModel):
+    people: List[str]
+    locations: List[str]
+    event_theme: str
+
+
+class FakeExtractor:
+    def __init__(self, fail_on=()):
+        self.calls = []
+        self.fail_on = set(fail_on)
+
+    async def __call__(self, inputs):
+        text = inputs["text_input"]
+        self.calls.append(text)
+        if text in self.fail_on:
+            return {"people": "not a list"}
+        return {"people": [text.split()[0]], "locations": ["北京"], "event_theme": text}
+
+
+def write_corpus(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            f.write(json.dumps({"id": f"doc-{i}", "text": f"person{i} meets someone"}, ensure_ascii=False) + "\n")
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_iter_corpus_jsonl_and_csv(tmp_path):
+    jsonl = tmp_path / "corpus.jsonl"
+    write_corpus(jsonl, 3)
+    assert list(iter_corpus(str(jsonl)))[1] == ("doc-1", "person1 meets someone")
+    csv_path = tmp_path / "corpus.csv"
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["body"])
+        writer.writerows([["a"], ["b"]])
+    assert list(iter_corpus(str(csv_path), text_field="body")) == [("1", "a"), ("2", "b")]
+
+
+def test_extracts_and_validates(tmp_path):
+    corpus = tmp_path / "corpus.jsonl"
+    write_corpus(corpus, 50)
+    fake = FakeExtractor(fail_on={"person7 meets someone"})
+    output = tmp_path / "out" / "extracted.jsonl"
+    job = ExtractionJob(RunnableLambda(lambda x: x, afunc=fake), ExtractedInfo, max_concurrency=4, flush_every=10)
+    report = job.run(str(corpus), str(output))
+    assert (report.succeeded, report.failed, report.skipped) == (49, 1, 0)
+    results = read_jsonl(output)
+    assert len(results) == 49
+    assert results[0].keys() == {"id", "people", "locations", "event_theme"}
+    errors = read_jsonl(str(output) + ".errors.jsonl")
+    assert [error["id"] for error in errors] == ["doc-7"]
+    assert report.docs_per_second > 0
+
+
+@pytest.mark.asyncio
+async def test_unreadable_corpus_is_raised(tmp_path):
+    corpus = tmp_path / "corpus.jsonl"
+    write_corpus(corpus, 30)
+    job = ExtractionJob(RunnableLambda(lambda x: x, afunc=FakeExtractor()), ExtractedInfo, max_concurrency=4)
+    with pytest.raises(KeyError):
+        await asyncio.wait_for(job.arun(str(corpus), str(tmp_path / "extracted.jsonl"), text_field="body"), timeout=2)
+
+
+def test_written_lines_survive_a_crash(tmp_path):
+    output = tmp_path / "extracted.jsonl"
+    writer = JsonlResultWriter(str(output), flush_every=100)
+    writer.write({"id": "doc-0"})
+    # not closed, as if the process died here
+    assert JsonlResultWriter(str(output)).completed_ids() == {"doc-0"}
+    writer.close()
+
+
+def test_resume_skips_completed_documents(tmp_path):
+    corpus = tmp_path / "corpus.jsonl"
+    write_corpus(corpus, 30)
+    output = tmp_path / "extracted.jsonl"
+    first = FakeExtractor()
+    ExtractionJob(RunnableLambda(lambda x: x, afunc=first), ExtractedInfo, max_concurrency=2).run(str(corpus), str(output), limit=10)
+    assert len(first.calls) == 10
+    # a crash in the middle of a line
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"id": "doc-2')
+
+    second = FakeExtractor()
+    report = ExtractionJob(RunnableLambda(lambda x: x, afunc=second), ExtractedInfo, max_concurrency=2).run(str(corpus), str(output))
+    assert report.skipped == 10
+    assert len(second.calls) == 20
+    assert sorted(result["id"] for result in read_jsonl(output)) == sorted(f"doc-{i}" for i in range(30))
+
+
+def test_failed_documents_are_retried(tmp_path):
+    corpus = tmp_path / "corpus.jsonl"
+    write_corpus(corpus, 5)
+    output = tmp_path / "extracted.jsonl"
+    ExtractionJob(RunnableLambda(lambda x: x, afunc=FakeExtractor(fail_on={"person3 meets someone"})), ExtractedInfo).run(str(corpus), str(output))
+    retry = FakeExtractor()
+    report = ExtractionJob(RunnableLambda(lambda x: x, afunc=retry), ExtractedInfo).run(str(corpus), str(output))
+    assert retry.calls == ["person3 meets someone"]
+    assert report.succeeded == 1
+    assert not (tmp_path / "extracted.jsonl.errors.jsonl").exists()
+
+
+def test_cost_report_from_token_usage(tmp_path):
+    corpus = tmp_path / "corpus.jsonl"
+    write_corpus(corpus, 20)
+    llm = FakeChatModelFactory(latency=0, response='{"people": ["张三"], "locations": ["北京"], "event_theme": "AI"}').build()
+    chain = ChatPromptTemplate.from_template("extract {text_input}") | llm | JsonOutputParser()
+    report = ExtractionJob(chain, ExtractedInfo, input_price=1.0, output_price=2.0).run(str(corpus), str(tmp_path / "out.jsonl"))
+    assert report.succeeded == 20
+    assert report.input_tokens == 20 * 4
+    assert report.output_tokens == 20 * 6
+    assert report.cost == pytest.approx((80 * 1.0 + 120 * 2.0) / 1e6)
+    assert report.cost_per_1k_documents == pytest.approx(report.cost * 50)
+
+
+def test_parquet_output_resumes(tmp_path):
+    pytest.importorskip("pyarrow")
+    corpus = tmp_path / "corpus.jsonl"
+    write_corpus(corpus, 25)
+    output = tmp_path / "extracted"
+    job = ExtractionJob(RunnableLambda(lambda x: x, afunc=FakeExtractor()), ExtractedInfo, flush_every=10)
+    assert job.run(str(corpus), str(output), limit=20).succeeded == 20
+    retry = FakeExtractor()
+    report = ExtractionJob(RunnableLambda(lambda x: x, afunc=retry), ExtractedInfo, flush_every=10).run(str(corpus), str(output))
+    assert report.skipped == 20
+    assert len(retry.calls) == 5
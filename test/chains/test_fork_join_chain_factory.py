@@ -0,0 +1,146 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from src.llm.fake_chat_model_factory import FakeChatModelFactory
+from src.llm_chains.chain_instrumentation import ChainInstrumentation
+from src.llm_chains.fork_join_chain_factory import MISSING, BranchSpec, ForkJoinChainFactory
+
+
+def sleeper(seconds, value):
+    def branch(inputs):
+        time.sleep(seconds)
+        return f"{value}:{inputs['topic']}"
+
+    async def abranch(inputs):
+        await asyncio.sleep(seconds)
+        return f"{value}:{inputs['topic']}"
+
+    return RunnableLambda(branch, afunc=abranch)
+
+
+def failing(inputs):
+    raise ValueError("boom")
+
+
+def join(inputs):
+    return inputs
+
+
+def make_factory(**kwargs):
+    return ForkJoinChainFactory(None, {
+        "definition": sleeper(0.01, "d"),
+        "advantages": sleeper(0.05, "a"),
+        "disadvantages": BranchSpec("disadvantages", sleeper(1.0, "x"), timeout=0.2),
+    }, join=RunnableLambda(join), **kwargs)
+
+
+def test_join_with_partial_results():
+    factory = make_factory()
+    start = time.perf_counter()
+    result = factory.create_chain().invoke({"topic": "t"})
+    assert time.perf_counter() - start < 0.8
+    assert result["definition"] == "d:t"
+    assert result["advantages"] == "a:t"
+    assert result["disadvantages"] == MISSING
+    assert result["missing_branches"] == ["disadvantages"]
+    report = result["fork_join_report"]
+    assert report.missing == {"disadvantages": "timeout"}
+    assert report.slowest_branch == "disadvantages"
+    assert report.slowest_branch_cost == pytest.approx(0.15, abs=0.08)
+    assert factory.stats["timeouts"] == 1
+
+
+
+def test_late_branch_is_not_counted():
+    factory = ForkJoinChainFactory(None, {
+        "fast": sleeper(0.01, "f"),
+        "late": BranchSpec("late", sleeper(0.2, "l"), timeout=0.05),
+    }, join=RunnableLambda(join))
+    report = factory.create_chain().invoke({"topic": "t"})["fork_join_report"]
+    time.sleep(0.3)
+    # the late branch finished meanwhile, the report is unchanged
+    assert set(report.latencies) == {"fast"}
+
+
+def test_stuck_branches_do_not_starve_fast_ones():
+    factory = ForkJoinChainFactory(None, {
+        "fast": sleeper(0.01, "f"),
+        "stuck": BranchSpec("stuck", sleeper(1.0, "s"), timeout=0.05),
+    }, join=RunnableLambda(join), max_workers=2, timeout=0.5)
+    chain = factory.create_chain()
+    for _ in range(6):
+        result = chain.invoke({"topic": "t"})
+        assert result["fast"] == "f:t"
+        assert result["missing_branches"] == ["stuck"]
+
+
+@pytest.mark.asyncio
+async def test_async_join_with_partial_results():
+    factory = make_factory()
+    start = time.perf_counter()
+    result = await factory.create_chain().ainvoke({"topic": "t"})
+    assert time.perf_counter() - start < 0.5
+    assert result["missing_branches"] == ["disadvantages"]
+    assert result["advantages"] == "a:t"
+
+
+@pytest.mark.asyncio
+async def test_slowest_branch_cost_when_all_finish():
+    factory = ForkJoinChainFactory(None, {"fast": sleeper(0.01, "f"), "slow": sleeper(0.1, "s")}, join=RunnableLambda(join))
+    result = await factory.create_chain().ainvoke({"topic": "t"})
+    report = result["fork_join_report"]
+    assert result["missing_branches"] == []
+    assert report.slowest_branch == "slow"
+    assert report.slowest_branch_cost == pytest.approx(0.09, abs=0.05)
+    assert factory.slowest_branch_counts == {"slow": 1}
+
+
+def test_failed_branch_is_missing():
+    factory = ForkJoinChainFactory(None, {"ok": sleeper(0, "o"), "bad": RunnableLambda(failing)}, join=RunnableLambda(join))
+    result = factory.create_chain().invoke({"topic": "t"})
+    assert result["fork_join_report"].missing == {"bad": "error"}
+    assert factory.stats["errors"] == 1
+
+
+@pytest.mark.asyncio
+async def test_required_branch_fails_the_chain():
+    factory = ForkJoinChainFactory(None, [BranchSpec("slow", sleeper(1.0, "s"), timeout=0.05, required=True)], join=RunnableLambda(join))
+    with pytest.raises(TimeoutError):
+        await factory.create_chain().ainvoke({"topic": "t"})
+    with pytest.raises(TimeoutError):
+        factory.create_chain().invoke({"topic": "t"})
+
+
+@pytest.mark.asyncio
+async def test_bounded_parallelism():
+    in_flight = max_in_flight = 0
+
+    async def branch(inputs):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        return "ok"
+
+    factory = ForkJoinChainFactory(None, {f"b{i}": RunnableLambda(lambda x: "ok", afunc=branch) for i in range(6)},
+                                   join=RunnableLambda(join), max_concurrency=2)
+    await factory.create_chain().ainvoke({"topic": "t"})
+    assert max_in_flight == 2
+
+
+def test_prompt_branches_with_instrumentation():
+    llm = FakeChatModelFactory(latency=0).build()
+    factory = ForkJoinChainFactory(llm, {"definition": "define {topic}", "advantages": "advantages of {topic}"},
+                                   join="report on {topic}: {definition} / {advantages}")
+    instrumentation = ChainInstrumentation()
+    report = factory.create_chain().invoke({"topic": "AI"}, config={"callbacks": [instrumentation]})
+    assert report == "report on AI: define AI / advantages of AI"
+    stages = instrumentation.stage_summary()
+    assert "definition/SimulatedChatModel" in stages
+    assert "advantages/SimulatedChatModel" in stages
+    fork = next(record for record in instrumentation.records() if record.name == "ForkJoin")
+    assert instrumentation.parallel_overlap(fork) is not None
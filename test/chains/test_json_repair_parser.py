@@ -0,0 +1,100 @@
+from typing import List
+
+import orjson
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.exceptions import OutputParserException
+from langchain_core.prompts import ChatPromptTemplate
+from pydantic import BaseModel
+
+from src.llm.fake_chat_model_factory import SimulatedChatModel
+from src.llm_chains.json_repair_parser import RepairingJsonOutputParser, repair_json, strip_fences
+
+
+class ExtractedInfo(BaseModel):
+    people: List[str]
+    locations: List[str]
+    event_theme: str
+
+
+VALID = '{"people": ["张三", "李四"], "locations": ["北京"], "event_theme": "AI"}'
+EXPECTED = {"people": ["张三", "李四"], "locations": ["北京"], "event_theme": "AI"}
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('```json\n{"a": [1, 2,],}\n```', {"a": [1, 2]}),
+    ("{'a': True, 'b': None, 'c': False}", {"a": True, "b": None, "c": False}),
+    # a value that may have been cut off is dropped, not kept shortened
+    ('{"a": ["x", "y', {"a": ["x"]}),
+    ('{"a": ["x", "y"', {"a": ["x", "y"]}),
+    ('{"a": "x", "b": "tru', {"a": "x"}),
+    ('{"a": "x", "b": 12', {"a": "x"}),
+    ('{"a": 1, "b"', {"a": 1}),
+    ('{"a": {"c": 1}, "b":', {"a": {"c": 1}}),
+    ('Sure! {"a": 1} Anything else?', {"a": 1}),
+    ('{"a": "line1\nline2"}', {"a": "line1\nline2"}),
+    ('[1, [2, 3', [1, [2]]),
+    # an object cut off inside an array is dropped as a whole
+    ('[{"a": 1}, {"a": 2', [{"a": 1}]),
+    ('{"items": [{"a": 1}, {"a": "x', {"items": [{"a": 1}]}),
+])
+def test_repair_json(text, expected):
+    assert orjson.loads(repair_json(strip_fences(text))) == expected
+
+
+def test_parse_paths_are_counted():
+    parser = RepairingJsonOutputParser(pydantic_object=ExtractedInfo)
+    assert parser.parse(VALID) == EXPECTED
+    assert parser.parse(f"```json\n{VALID[:-1]},\n}}\n```") == EXPECTED
+    assert parser.parse(VALID[:-1]) == EXPECTED
+    # "event_theme": "A is cut off, it is dropped and the required field fails validation
+    with pytest.raises(OutputParserException):
+        parser.parse(VALID[:-3])
+    with pytest.raises(OutputParserException):
+        parser.parse('{"people": "张三"}')
+    assert parser.stats == {"parsed": 1, "repaired": 2, "llm_retries": 0, "failed": 2}
+
+
+def test_format_instructions_match_json_output_parser():
+    assert "event_theme" in RepairingJsonOutputParser(pydantic_object=ExtractedInfo).get_format_instructions()
+
+
+def test_llm_fallback_only_when_repair_fails():
+    parser = RepairingJsonOutputParser(pydantic_object=ExtractedInfo)
+    fixer = SimulatedChatModel(latency=0, response=VALID)
+    chain = ChatPromptTemplate.from_template("{text}") | SimulatedChatModel(latency=0) | parser.with_llm_fallback(fixer)
+    assert chain.invoke({"text": VALID + ",}"}) == EXPECTED
+    assert parser.stats["llm_retries"] == 0
+    # schema mismatch cannot be repaired locally
+    assert chain.invoke({"text": '{"people": "张三"}'}) == EXPECTED
+    # nor a truncated value
+    assert chain.invoke({"text": VALID[:-3]}) == EXPECTED
+    assert parser.stats == {"parsed": 2, "repaired": 1, "llm_retries": 2, "failed": 0}
+
+
+def test_llm_fallback_passes_the_config_on():
+    class ChatModelStarts(BaseCallbackHandler):
+        def __init__(self):
+            self.tags = []
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs):
+            self.tags.append(tags)
+
+    starts = ChatModelStarts()
+    parser = RepairingJsonOutputParser(pydantic_object=ExtractedInfo)
+    fixer = SimulatedChatModel(latency=0, response=VALID)
+    chain = ChatPromptTemplate.from_template("{text}") | SimulatedChatModel(latency=0) | parser.with_llm_fallback(fixer)
+    assert chain.invoke({"text": '{"people": "张三"}'}, config={"callbacks": [starts], "tags": ["caller"]}) == EXPECTED
+    assert len(starts.tags) == 2
+    assert all("caller" in tags for tags in starts.tags)
+
+
+@pytest.mark.asyncio
+async def test_llm_fallback_gives_up():
+    parser = RepairingJsonOutputParser(pydantic_object=ExtractedInfo)
+    fixer = SimulatedChatModel(latency=0, response="still not json")
+    chain = ChatPromptTemplate.from_template("{text}") | SimulatedChatModel(latency=0) | parser.with_llm_fallback(fixer, max_retries=2)
+    with pytest.raises(OutputParserException):
+        await chain.ainvoke({"text": "no json at all"})
+    assert parser.stats["llm_retries"] == 2
+    assert parser.stats["failed"] == 1
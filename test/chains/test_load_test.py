@@ -0,0 +1,24 @@
+import pytest
+
+from src.llm.fake_chat_model_factory import FakeChatModelFactory
+from src.llm_chains.load_test import REPORT_HEADER, arun_load, format_report, sweep
+from src.llm_chains.translate_chain_factory import TranslateChainFactory
+
+
+def test_sweep_translate_chain():
+    chain = TranslateChainFactory.create_chain(FakeChatModelFactory(latency=0.02).build())
+    results = sweep(chain, lambda i: {"text": f"text {i}"}, concurrency_levels=(1, 8), requests_per_level=16)
+    assert [result.concurrency for result in results] == [1, 8]
+    assert all(result.errors == 0 and result.requests == 16 for result in results)
+    assert all(result.p50 >= 0.02 for result in results)
+    assert results[1].throughput > 3 * results[0].throughput
+    report = format_report("translate", results)
+    assert report.splitlines()[:2] == ["translate", REPORT_HEADER]
+
+
+@pytest.mark.asyncio
+async def test_errors_are_counted():
+    chain = TranslateChainFactory.create_chain(FakeChatModelFactory(latency=0, error_rate=0.5, seed=3).build())
+    result = await arun_load(chain, [{"text": "x"}] * 40, concurrency=4)
+    assert 0 < result.errors < 40
+    assert result.throughput > 0
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from src.llm_chains.multi_target_translator import MultiTargetTranslator
+
+
+class FakeTranslator:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, prompt_value):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            content = prompt_value.to_messages()[-1].content
+            to_language = content.split(" to ", 1)[1].split(".", 1)[0]
+            return f"{to_language}:{content.split('. ', 1)[1]}"
+        finally:
+            self.in_flight -= 1
+
+
+LANGUAGES = ["Chinese", "French", "German", "Japanese", "Korean", "Spanish", "Italian", "Dutch"]
+
+
+def test_fan_out_single_text():
+    fake = FakeTranslator()
+    translator = MultiTargetTranslator(RunnableLambda(fake), max_concurrency=3)
+    result = translator.translate("hello", LANGUAGES)
+    assert result.translations == {language: f"{language}:hello" for language in LANGUAGES}
+    assert set(result.latencies) == set(LANGUAGES)
+    assert all(latency > 0 for latency in result.latencies.values())
+    assert 1 < fake.max_in_flight <= 3
+
+
+@pytest.mark.asyncio
+async def test_fan_out_batch_reuses_chains():
+    translator = MultiTargetTranslator(RunnableLambda(FakeTranslator()))
+    result = await translator.atranslate(["a", "b"], ["Chinese", "French"])
+    assert result.translations == {"Chinese": ["Chinese:a", "Chinese:b"], "French": ["French:a", "French:b"]}
+    chain = translator.chain_for("Chinese")
+    await translator.atranslate("c", ["Chinese"])
+    assert translator.chain_for("Chinese") is chain
+
+
+def test_system_message_follows_the_languages():
+    from src.llm_chains.translate_chain_factory import TranslateChainFactory
+    seen = []
+    chain = TranslateChainFactory.create_chain(RunnableLambda(lambda prompt_value: seen.append(prompt_value) or "x"),
+                                               "German", "French")
+    chain.invoke({"text": "Hallo"})
+    system, user = seen[0].to_messages()
+    assert system.content == "You are a helpful assistant that translates German to French."
+    assert user.content == "Translate this sentence from German to French. Hallo"
+
+
+@pytest.mark.asyncio
+async def test_latency_leaves_out_the_queue():
+    translator = MultiTargetTranslator(RunnableLambda(FakeTranslator()), max_concurrency=1)
+    result = await translator.atranslate("a", LANGUAGES)
+    # one call each, one at a time: every language took about one call, not the queue before it
+    assert max(result.latencies.values()) < 0.05
+
+
+@pytest.mark.asyncio
+async def test_first_error_cancels_the_other_languages():
+    cancelled = []
+
+    async def translate(prompt_value):
+        content = prompt_value.to_messages()[-1].content
+        if "to French" in content:
+            raise ValueError("quota exceeded")
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(content)
+            raise
+
+    translator = MultiTargetTranslator(RunnableLambda(translate))
+    with pytest.raises(ValueError):
+        await asyncio.wait_for(translator.atranslate(["a", "b"], ["Chinese", "French", "German"]), 1)
+    assert len(cancelled) == 4
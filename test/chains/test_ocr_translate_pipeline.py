@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+import pytest
+
+from src.llm.fake_chat_model_factory import FakeChatModelFactory
+from src.llm_chains.ocr_translate_pipeline import OCRTranslatePipeline
+from src.llm_chains.translate_chain_factory import TranslateChainFactory
+
+
+class FakeOCRService:
+    """
+    The text of an image is its path; "empty" has no text; latency per path or default.
+    """
+
+    def __init__(self, latency=0.0, latencies=None):
+        self.latency = latency
+        self.latencies = latencies or {}
+        self.calls = 0
+
+    async def aextract_text_from_imgs(self, image_paths, batch_size=16, max_concurrency=4):
+        self.calls += 1
+        path = image_paths[0]
+        await asyncio.sleep(self.latencies.get(path, self.latency))
+        return [Exception("No text detected.") if path == "empty" else path]
+
+
+def translate_chain(**kwargs):
+    return TranslateChainFactory.create_chain(FakeChatModelFactory(**kwargs).build())
+
+
+@pytest.mark.asyncio
+async def test_stages_overlap():
+    paths = [f"image {i}" for i in range(8)]
+    pipeline = OCRTranslatePipeline(FakeOCRService(latency=0.05), translate_chain(latency=0.05),
+                                    ocr_concurrency=1, translate_concurrency=1)
+    start = time.perf_counter()
+    results = await pipeline.arun(paths)
+    # one stage after the other would take 8 * (0.05 + 0.05) = 0.8s, overlapped about 9 * 0.05
+    assert time.perf_counter() - start < 0.7
+    assert [result.text for result in results] == paths
+    assert all(result.translation.endswith(result.text) for result in results)
+    stats = pipeline.stats()
+    assert stats["ocr"]["items"] == stats["translate"]["items"] == 8
+    assert stats["ocr"]["utilisation"] > 0.5 and stats["translate"]["utilisation"] > 0.5
+    assert stats["ocr"]["p50"] >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_ordered_and_unordered_output():
+    latencies = {"slow": 0.1, "fast": 0.0}
+    ordered = OCRTranslatePipeline(FakeOCRService(latencies=latencies), translate_chain(latency=0))
+    assert [result.path for result in await ordered.arun(["slow", "fast"])] == ["slow", "fast"]
+    unordered = OCRTranslatePipeline(FakeOCRService(latencies=latencies), translate_chain(latency=0), ordered=False)
+    assert [result.path for result in await unordered.arun(["slow", "fast"])] == ["fast", "slow"]
+
+
+@pytest.mark.asyncio
+async def test_errors_per_image():
+    results = await OCRTranslatePipeline(FakeOCRService(), translate_chain(latency=0)).arun(["a", "empty"])
+    assert results[0].error is None
+    assert str(results[1].error) == "No text detected." and results[1].translation is None
+    pipeline = OCRTranslatePipeline(FakeOCRService(), translate_chain(latency=0, error_rate=1.0))
+    results = await pipeline.arun(["a", "b"])
+    assert all(result.text is not None and result.error is not None for result in results)
+    assert pipeline.stats()["translate"]["failed"] == 2
+
+
+@pytest.mark.asyncio
+async def test_backpressure_and_early_stop():
+    ocr = FakeOCRService()
+    pipeline = OCRTranslatePipeline(ocr, translate_chain(latency=0.1), ocr_concurrency=2, translate_concurrency=1,
+                                    queue_size=1)
+    stream = pipeline.astream([f"image {i}" for i in range(50)])
+    first = await stream.__anext__()
+    assert first.index == 0
+    # OCR is held back by the full queue, not run ahead over the whole input
+    assert ocr.calls < 10
+    await stream.aclose()
+    calls = ocr.calls
+    await asyncio.sleep(0.05)
+    assert ocr.calls == calls
+
+
+@pytest.mark.asyncio
+async def test_failing_input_is_raised():
+    def image_paths():
+        yield "a"
+        raise KeyError("path")
+
+    pipeline = OCRTranslatePipeline(FakeOCRService(), translate_chain(latency=0))
+    with pytest.raises(KeyError):
+        await asyncio.wait_for(pipeline.arun(image_paths()), timeout=2)
+
+
+@pytest.mark.asyncio
+async def test_ordered_buffer_is_bounded():
+    ocr = FakeOCRService(latencies={"image 0": 0.3})
+    pipeline = OCRTranslatePipeline(ocr, translate_chain(latency=0), ocr_concurrency=2, translate_concurrency=2,
+                                    queue_size=2)
+    stream = pipeline.astream([f"image {i}" for i in range(2000)])
+    first = await stream.__anext__()
+    assert first.index == 0
+    # the slow first image holds the others back, at most the window of 2 + 2 + 2 images
+    assert ocr.calls <= 6
+    await stream.aclose()
@@ -0,0 +1,76 @@
+import csv
+import os
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from src.configs.config import project_path
+from src.llm_chains.packed_translator import PackedTranslator, format_pack, parse_pack
+
+
+class FakeTranslator:
+    """
+    Upper-cases texts, answering packed prompts in the numbered format.
+    drop: item numbers left out of every packed answer.
+    """
+
+    def __init__(self, drop=()):
+        self.drop = set(drop)
+        self.calls = []
+
+    def __call__(self, prompt_value):
+        content = prompt_value.to_messages()[-1].content
+        self.calls.append(content)
+        if content.startswith("<1>"):
+            items = parse_pack(content, content.count("\n") + 1)
+            return "\n".join(f"<{i}> {text.upper()}" for i, text in enumerate(items, start=1) if i not in self.drop)
+        return content.split("Chinese. ", 1)[-1].upper()
+
+
+def small_data_cells():
+    with open(os.path.join(project_path, "data", "small_data_200.csv"), newline="") as f:
+        rows = list(csv.reader(f))
+    return [cell for row in rows[1:] for cell in row][:300]
+
+
+def test_parse_pack_detects_misalignment():
+    response = "<1> A\n<3> C\n<3> C again\n<4>\n"
+    assert parse_pack(response, 5) == ["A", None, None, None, None]
+    assert parse_pack(format_pack(["x", "multi\nline"]), 2) == ["x", "multi\nline"]
+
+
+def test_packs_many_short_texts_into_few_calls():
+    fake = FakeTranslator()
+    translator = PackedTranslator(RunnableLambda(fake), max_pack_tokens=200, max_items=50)
+    texts = small_data_cells()
+    assert translator.translate(texts) == [text.upper() for text in texts]
+    assert translator.stats["pack_calls"] == len(fake.calls) < len(texts) / 10
+    assert translator.stats["single_calls"] == 0
+
+
+def test_only_misaligned_items_fall_back():
+    fake = FakeTranslator(drop={2})
+    translator = PackedTranslator(RunnableLambda(fake), max_items=5)
+    texts = [f"label {i}" for i in range(10)]
+    assert translator.translate(texts) == [text.upper() for text in texts]
+    assert translator.stats["pack_calls"] == 2
+    assert translator.stats["misaligned"] == translator.stats["single_calls"] == 2
+
+
+def test_blank_texts_pass_through():
+    fake = FakeTranslator()
+    translator = PackedTranslator(RunnableLambda(fake))
+    assert translator.translate(["a", "", "  ", "b"]) == ["A", "", "  ", "B"]
+    assert len(fake.calls) == 1
+    assert translator.stats["misaligned"] == 0
+    assert translator.translate(["", "\t"]) == ["", "\t"]
+    assert len(fake.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_long_texts_are_not_packed():
+    fake = FakeTranslator()
+    translator = PackedTranslator(RunnableLambda(fake), max_pack_tokens=40)
+    texts = ["short", "long " * 50, "short too"]
+    assert await translator.atranslate(texts) == [text.upper() for text in texts]
+    assert translator.stats == {"items": 3, "pack_calls": 1, "single_calls": 1, "misaligned": 0}
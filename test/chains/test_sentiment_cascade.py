@@ -0,0 +1,68 @@
+import pytest
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+
+from src.llm.fake_chat_model_factory import FakeChatModelFactory
+from src.llm_chains.sentiment_cascade import (NEGATIVE, NEUTRAL, POSITIVE, LexiconSentimentClassifier, SentimentCascade,
+                                              create_sentiment_analyzer_chain, normalize_label)
+
+TEXTS = ["我今天非常开心，阳光明媚！", "项目失败了，我很沮丧。", "会议将在下午三点开始。", "我不开心"]
+
+
+class FakeSentimentChain:
+    def __init__(self, answer="中性。"):
+        self.answer = answer
+        self.inputs = []
+
+    def __call__(self, inputs):
+        self.inputs.append(inputs["text"])
+        return self.answer
+
+
+def test_classifier_predicts_lexicon_cases():
+    predictions = LexiconSentimentClassifier().predict(TEXTS)
+    assert [label for label, _ in predictions] == [POSITIVE, NEGATIVE, NEUTRAL, NEGATIVE]
+    confidences = [confidence for _, confidence in predictions]
+    assert confidences[0] > 0.9 and confidences[1] > 0.9 and confidences[3] > 0.9
+    # no known n-gram: about the uniform prior
+    assert confidences[2] == pytest.approx(1 / 3, abs=0.02)
+
+
+def test_cascade_routes_low_confidence_to_llm():
+    fake = FakeSentimentChain()
+    cascade = SentimentCascade(RunnableLambda(fake), threshold=0.8)
+    assert cascade.classify(TEXTS) == [POSITIVE, NEGATIVE, NEUTRAL, NEGATIVE]
+    assert fake.inputs == ["会议将在下午三点开始。"]
+    assert cascade.stats["llm_calls"] == 1
+    assert cascade.llm_calls_avoided == 3
+    assert cascade.avoided_ratio == 0.75
+
+
+def test_per_label_thresholds():
+    fake = FakeSentimentChain("负面")
+    cascade = SentimentCascade(RunnableLambda(fake), threshold=0.8, thresholds={NEGATIVE: 1.01})
+    assert cascade.classify(TEXTS) == [POSITIVE, NEGATIVE, NEGATIVE, NEGATIVE]
+    assert len(fake.inputs) == 3
+
+
+@pytest.mark.asyncio
+async def test_as_runnable_in_branch_context():
+    llm = FakeChatModelFactory(latency=0, response="中性").build()
+    cascade = SentimentCascade(create_sentiment_analyzer_chain(llm))
+    chain = RunnablePassthrough.assign(sentiment=RunnableLambda(lambda x: {"text": x["user_text"]}) | cascade.as_runnable())
+    results = await chain.abatch([{"user_text": text} for text in TEXTS])
+    assert [result["sentiment"] for result in results] == [POSITIVE, NEGATIVE, NEUTRAL, NEGATIVE]
+    assert cascade.stats == {**cascade.stats, "texts": 4, "local": 3, "llm_calls": 1}
+
+
+def test_fit_learns_new_terms():
+    classifier = LexiconSentimentClassifier()
+    texts = ["这个产品真香", "物超所值", "质量很差", "太差劲了", "今天星期三", "明天开会"]
+    labels = [POSITIVE, POSITIVE, NEGATIVE, NEGATIVE, NEUTRAL, NEUTRAL]
+    classifier.fit(texts * 5, labels * 5)
+    assert [label for label, _ in classifier.predict(["真香", "很差", "星期三开会"])] == [POSITIVE, NEGATIVE, NEUTRAL]
+
+
+def test_normalize_label():
+    assert normalize_label("正面。") == POSITIVE
+    assert normalize_label("这段文本是负面的") == NEGATIVE
+    assert normalize_label("unknown") == NEUTRAL
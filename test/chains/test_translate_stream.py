@@ -0,0 +1,81 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from src.llm_chains.stream_metrics import (ABORTED, COMPLETED, FAILED, StreamLatencyTracker, StreamMetrics,
+                                          ameasure_stream, measure_stream, percentile)
+from src.llm_chains.translate_chain_factory import TranslateChainFactory
+
+
+def fake_llm(text="天空 是 蓝色 的"):
+    return GenericFakeChatModel(messages=iter([AIMessage(content=text)]))
+
+
+def test_stream_yields_deltas_and_metrics():
+    metrics = StreamMetrics()
+    chunks = list(TranslateChainFactory.stream(fake_llm(), "why sky is blue", metrics=metrics))
+    assert len(chunks) > 1
+    assert "".join(chunks) == "天空 是 蓝色 的"
+    assert metrics.chunks == len(chunks)
+    assert 0 <= metrics.time_to_first_token <= metrics.total_latency
+    assert len(metrics.inter_token_gaps) == len(chunks) - 1
+
+
+@pytest.mark.asyncio
+async def test_astream_records_into_tracker():
+    tracker = StreamLatencyTracker()
+    for _ in range(3):
+        chunks = [c async for c in TranslateChainFactory.astream(fake_llm(), "why sky is blue", tracker=tracker)]
+        assert "".join(chunks) == "天空 是 蓝色 的"
+    summary = tracker.summary()
+    assert summary["requests"] == 3
+    assert summary["time_to_first_token"]["p50"] is not None
+    assert summary["total_latency"]["p99"] >= summary["time_to_first_token"]["p99"]
+
+
+def test_aborted_and_failed_streams_are_recorded():
+    tracker = StreamLatencyTracker()
+    stream = measure_stream(iter(["a", "b", "c"]), tracker=tracker)
+    next(stream)
+    stream.close()
+
+    def broken():
+        yield "a"
+        raise ConnectionError("reset")
+
+    with pytest.raises(ConnectionError):
+        list(measure_stream(broken(), tracker=tracker))
+    list(measure_stream(iter(["a"]), tracker=tracker))
+    summary = tracker.summary()
+    assert (summary["requests"], summary["aborted"], summary["failed"]) == (3, 1, 1)
+    assert [m.status for m in tracker._metrics] == [ABORTED, FAILED, COMPLETED]
+
+
+@pytest.mark.asyncio
+async def test_async_stream_stopped_early_is_recorded():
+    async def chunks():
+        for chunk in ["a", "b", "c"]:
+            yield chunk
+
+    tracker = StreamLatencyTracker()
+    stream = ameasure_stream(chunks(), tracker=tracker)
+    async for _ in stream:
+        break
+    await stream.aclose()
+    assert tracker.summary()["aborted"] == 1
+
+
+def test_empty_first_chunk_is_not_the_first_token():
+    ticks = iter([0.0, 0.5, 0.7, 1.0])
+    metrics = StreamMetrics(clock=lambda: next(ticks))
+    assert list(measure_stream(["", "a", "b"], metrics)) == ["", "a", "b"]
+    assert metrics.time_to_first_token == 0.5
+    assert metrics.inter_token_gaps == [pytest.approx(0.2)]
+    assert metrics.chunks == 3
+
+
+def test_percentile():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) is None
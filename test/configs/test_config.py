@@ -0,0 +1,61 @@
+import json
+import os
+import subprocess
+import sys
+
+from loguru import logger
+
+import src.configs.proxy_config
+from src.configs.config import Settings, project_path
+
+
+def test_import_is_side_effect_free():
+    """
+    Importing the config module must not add the log sink, load the yaml or probe the proxy.
+    """
+    code = (
+        "import json, sys\n"
+        "import src.configs.config as c\n"
+        "print(json.dumps({'proxy_module': 'src.configs.proxy_config' in sys.modules,"
+        " 'log_handler': c.settings._log_handler_id, 'yaml': c.settings._yaml_configs}))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=project_path)
+    output = subprocess.run([sys.executable, "-c", code], cwd=project_path, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    state = json.loads(output.strip().splitlines()[-1])
+    assert state == {"proxy_module": False, "log_handler": None, "yaml": None}
+
+
+def test_settings_steps_run_once(tmp_path, monkeypatch):
+    config_dir = tmp_path / "src" / "configs"
+    config_dir.mkdir(parents=True)
+    (config_dir / "config_dev.yaml").write_text('gemini:\n  api_key: "TEST_GEMINI_KEY"\n')
+    monkeypatch.setenv("TEST_GEMINI_KEY", "abcdefghij")
+
+    settings = Settings(project_path=str(tmp_path))
+    try:
+        configs = settings.yaml_configs
+        assert configs["gemini"]["api_key"] == "abcdefghij"
+        assert settings.yaml_configs is configs
+        handler_id = settings._log_handler_id
+        settings.ensure_logging()
+        assert settings._log_handler_id == handler_id
+        assert (tmp_path / "logs" / "app.log").exists()
+    finally:
+        logger.remove(settings._log_handler_id)
+
+
+def test_ensure_proxy_runs_once(tmp_path, monkeypatch):
+    config_dir = tmp_path / "src" / "configs"
+    config_dir.mkdir(parents=True)
+    (config_dir / "config_dev.yaml").write_text('proxy:\n  candidates: ["127.0.0.1:1"]\n  timeout: 0.5\n')
+    calls = []
+    monkeypatch.setattr(src.configs.proxy_config, "set_proxy", lambda **kwargs: calls.append(kwargs))
+
+    settings = Settings(project_path=str(tmp_path))
+    try:
+        settings.ensure_proxy()
+        settings.ensure_proxy()
+    finally:
+        logger.remove(settings._log_handler_id)
+    assert calls == [{"candidates": ["127.0.0.1:1"], "timeout": 0.5}]
@@ -0,0 +1,44 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from src.configs.config import project_path
+
+# cold import budget per entry point, in seconds.
+# scale with IMPORT_TIME_BUDGET_SCALE on slow machines.
+IMPORT_TIME_BUDGETS = {
+    "src.configs.config": 0.3,
+    "src.decorators.time_decorator": 0.3,
+    "src.llm_chains.translate_chain_factory": 1.0,
+    "src.llm.gemini_chat_model_factory": 2.5,
+    "src.services.google_ocr_service": 1.0,
+}
+
+RUNS = 3
+
+
+def cold_import_time(module):
+    """
+    Imports the module in a fresh interpreter and returns the elapsed seconds.
+    """
+    code = (
+        "import json, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(json.dumps(time.perf_counter() - start))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=project_path)
+    output = subprocess.run([sys.executable, "-c", code], cwd=project_path, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+@pytest.mark.parametrize("module", sorted(IMPORT_TIME_BUDGETS))
+def test_cold_import_time(module):
+    budget = IMPORT_TIME_BUDGETS[module] * float(os.environ.get("IMPORT_TIME_BUDGET_SCALE", "1"))
+    elapsed = min(cold_import_time(module) for _ in range(RUNS))
+    print(f"cold import {module}: {elapsed:.3f}s (budget {budget:.3f}s)")
+    assert elapsed < budget, f"cold import of {module} took {elapsed:.3f}s, budget is {budget:.3f}s"
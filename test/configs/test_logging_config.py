@@ -0,0 +1,111 @@
+import json
+import os
+
+from loguru import logger
+
+from src.configs.logging_config import (
+    BackgroundFileSink,
+    RotatingFileWriter,
+    SamplingFilter,
+    add_file_sink,
+    parse_duration,
+    parse_size,
+)
+from src.decorators.time_decorator import log_execution_time
+
+
+def test_parse_rotation_values():
+    assert parse_size("10 MB") == 10 * 1024 * 1024
+    assert parse_size("500KB") == 500 * 1024
+    assert parse_size("1 day") is None
+    assert parse_duration("7 days") == 7 * 86400
+    assert parse_duration("1 hour") == 3600
+
+
+def test_sampling_filter_keeps_one_in_n():
+    sampling_filter = SamplingFilter({"INFO": 10})
+    records = []
+    handler_id = logger.add(lambda message: records.append(message.record), filter=sampling_filter)
+    try:
+        for i in range(100):
+            logger.info("info {}", i)
+        logger.warning("never sampled")
+        logger.debug("not configured")
+    finally:
+        logger.remove(handler_id)
+    messages = [record["message"] for record in records]
+    assert messages[:10] == [f"info {i}" for i in range(0, 100, 10)]
+    assert messages[10:] == ["never sampled", "not configured"]
+
+
+def test_async_sink_writes_json_records(tmp_path):
+    log_path = tmp_path / "app.log"
+    handler_id, sink = add_file_sink(str(log_path), mode="async", serialize=True)
+    try:
+        @log_execution_time
+        def add(a, b):
+            return a + b
+
+        assert add(1, 2) == 3
+        assert isinstance(sink, BackgroundFileSink)
+        assert sink.drain(timeout=5)
+        records = [json.loads(line)["record"] for line in log_path.read_text().splitlines()]
+    finally:
+        logger.remove(handler_id)
+
+    finished = [r for r in records if r["extra"].get("event") == "finished"]
+    assert len(finished) == 1
+    assert finished[0]["extra"]["function"].endswith("add")
+    assert finished[0]["extra"]["elapsed_time"] >= 0
+
+
+def test_rotating_file_writer_rotates_and_compresses(tmp_path):
+    log_path = tmp_path / "app.log"
+    writer = RotatingFileWriter(str(log_path), rotation="1 KB", retention=2, compression="gz")
+    try:
+        for i in range(50):
+            writer.write(f"{i:04d} " + "x" * 95 + "\n")
+    finally:
+        writer.close()
+    rotated = writer.rotated_files()
+    assert len(rotated) == 2
+    assert all(f.endswith(".log.gz") for f in rotated)
+    assert log_path.stat().st_size <= 1024
+
+
+def test_rotating_file_writer_counts_bytes(tmp_path):
+    log_path = tmp_path / "app.log"
+    writer = RotatingFileWriter(str(log_path), rotation="1 KB")
+    try:
+        for i in range(20):
+            writer.write("翻译" * 30 + "\n")
+    finally:
+        writer.close()
+    assert log_path.stat().st_size <= 1024
+    assert all(os.path.getsize(f) <= 1024 for f in writer.rotated_files())
+
+
+def test_stop_drains_queue(tmp_path):
+    log_path = tmp_path / "app.log"
+    sink = BackgroundFileSink(str(log_path), linger=0)
+    for i in range(1000):
+        sink.write(f"line {i}\n")
+    sink.stop()
+    assert len(log_path.read_text().splitlines()) == 1000
+
+
+def test_write_errors_are_reported_at_most_once_per_interval(tmp_path, capsys):
+    sink = BackgroundFileSink(str(tmp_path / "app.log"), linger=0)
+
+    def fail(text):
+        raise OSError("disk full")
+
+    sink._writer.write = fail
+    for i in range(3):
+        sink.write(f"line {i}\n")
+        sink.drain(timeout=5)
+    sink.stop()
+    err = capsys.readouterr().err
+    assert err.count("log writer failed") == 1
+    assert "1 messages dropped" in err and "disk full" in err
+    assert sink._dropped == 2
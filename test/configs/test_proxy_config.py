@@ -0,0 +1,86 @@
+import json
+import os
+import socket
+import time
+
+import pytest
+
+from src.configs.proxy_config import ProxyResolver, set_proxy
+
+
+@pytest.fixture
+def listening_port():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen()
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def closed_port():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    port = server.getsockname()[1]
+    server.close()
+    return port
+
+
+def test_race_picks_healthy_candidate(listening_port, closed_port):
+    resolver = ProxyResolver([f"127.0.0.1:{closed_port}", f"127.0.0.1:{listening_port}"], timeout=1, cache_file=None)
+    assert resolver.race() == ("127.0.0.1", listening_port)
+
+
+def test_rank_only_returns_healthy_candidates(listening_port, closed_port):
+    resolver = ProxyResolver([f"127.0.0.1:{closed_port}", f"127.0.0.1:{listening_port}"], timeout=1, cache_file=None)
+    ranking = resolver.rank()
+    assert [proxy for _, proxy in ranking] == [f"127.0.0.1:{listening_port}"]
+
+
+def test_no_healthy_candidate(closed_port):
+    resolver = ProxyResolver([f"127.0.0.1:{closed_port}"], timeout=1, cache_file=None)
+    assert resolver.resolve() is None
+
+
+def test_verdict_is_cached(tmp_path, listening_port, monkeypatch):
+    cache_file = str(tmp_path / "proxy.json")
+    candidates = [f"127.0.0.1:{listening_port}"]
+    assert ProxyResolver(candidates, cache_file=cache_file).resolve() == candidates[0]
+
+    # a second process must not probe again
+    resolver = ProxyResolver(candidates, cache_file=cache_file)
+    monkeypatch.setattr(resolver, "probe", lambda host, port: pytest.fail("probed despite cache"))
+    assert resolver.resolve() == candidates[0]
+
+
+def test_expired_cache_is_ignored(tmp_path, listening_port, closed_port):
+    cache_file = tmp_path / "proxy.json"
+    candidates = [f"127.0.0.1:{closed_port}", f"127.0.0.1:{listening_port}"]
+    cache_file.write_text(json.dumps(
+        {"candidates": candidates, "proxy": candidates[0], "ranking": [], "checked_at": time.time() - 3600}
+    ))
+    resolver = ProxyResolver(candidates, cache_file=str(cache_file), cache_ttl=60)
+    assert resolver.resolve() == candidates[1]
+
+
+def test_stale_cache_is_refreshed_in_background(tmp_path, listening_port):
+    cache_file = tmp_path / "proxy.json"
+    candidates = [f"127.0.0.1:{listening_port}"]
+    cache_file.write_text(json.dumps(
+        {"candidates": candidates, "proxy": None, "ranking": [], "checked_at": time.time() - 50}
+    ))
+    resolver = ProxyResolver(candidates, cache_file=str(cache_file), cache_ttl=60, refresh_after=10)
+    # the cached verdict is still returned immediately
+    assert resolver.resolve() is None
+    resolver._refresh_thread.join(timeout=5)
+    cache = json.loads(cache_file.read_text())
+    assert cache["proxy"] == candidates[0]
+    assert [proxy for _, proxy in cache["ranking"]] == candidates
+
+
+def test_set_proxy_sets_environment(tmp_path, listening_port, monkeypatch):
+    monkeypatch.delenv("http_proxy", raising=False)
+    monkeypatch.delenv("https_proxy", raising=False)
+    proxy = set_proxy([f"127.0.0.1:{listening_port}"], cache_file=str(tmp_path / "proxy.json"))
+    assert os.environ["http_proxy"] == f"http://{proxy}"
+    assert os.environ["https_proxy"] == f"http://{proxy}"
@@ -0,0 +1,127 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.language_models.chat_models import BaseChatModel
+
+from src.configs.config import settings
+from src.llm.chat_model_pool import ChatModelPool, credentials_key
+from src.llm.gemini_chat_model_factory import GeminiChatModelFactory
+from src.llm_chains.translate_chain_factory import TranslateChainFactory
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class FakeTransport:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeAsyncTransport(FakeTransport):
+    async def close(self):
+        self.closed = True
+
+
+class FakeModel:
+    def __init__(self):
+        self.client = type("Client", (), {})()
+        self.client.transport = FakeTransport()
+        self.async_client = type("AsyncClient", (), {})()
+        self.async_client.transport = FakeAsyncTransport()
+
+
+def test_same_key_returns_shared_instance():
+    pool = ChatModelPool()
+    first = pool.get("a", FakeModel)
+    assert pool.get("a", FakeModel) is first
+    assert pool.get("b", FakeModel) is not first
+    assert (pool.hits, pool.misses) == (1, 2)
+
+
+def test_pool_is_bounded_lru():
+    pool = ChatModelPool(max_size=2)
+    a = pool.get("a", FakeModel)
+    b = pool.get("b", FakeModel)
+    pool.get("a", FakeModel)
+    pool.get("c", FakeModel)
+    assert len(pool) == 2
+    # "b" was the least recently used and evicted, but chains built with it keep working
+    assert not b.client.transport.closed and not b.async_client.transport.closed
+    assert pool.get("a", FakeModel) is a
+    assert not a.client.transport.closed
+    assert pool.misses == 3
+
+
+def test_idle_entries_are_evicted():
+    clock = FakeClock()
+    pool = ChatModelPool(idle_timeout=10, clock=clock)
+    a = pool.get("a", FakeModel)
+    clock.now = 11
+    assert pool.get("a", FakeModel) is not a
+    assert not a.client.transport.closed
+
+
+def test_close_closes_transports():
+    with ChatModelPool() as pool:
+        model = pool.get("a", FakeModel)
+    assert model.client.transport.closed
+    assert model.async_client.transport.closed
+    assert len(pool) == 0
+
+
+@pytest.mark.asyncio
+async def test_close_in_event_loop_closes_async_transports():
+    pool = ChatModelPool()
+    model = pool.get("a", FakeModel)
+    pool.close()
+    await asyncio.sleep(0)
+    assert model.async_client.transport.closed
+
+
+def test_concurrent_checkout_builds_once():
+    pool = ChatModelPool()
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        models = list(executor.map(lambda _: pool.get("a", FakeModel), range(1000)))
+    assert all(model is models[0] for model in models)
+    assert pool.misses == 1
+
+
+def test_credentials_are_not_kept_in_clear():
+    assert "secret" not in credentials_key("secret")
+    assert credentials_key("secret") == credentials_key("secret")
+
+
+@pytest.fixture
+def no_proxy(monkeypatch):
+    monkeypatch.setattr(settings, "_proxy_done", True)
+
+
+def test_gemini_factory_reuses_clients(no_proxy):
+    pool = ChatModelPool()
+    models = [GeminiChatModelFactory(api_key="fake-key", pool=pool).build() for _ in range(100)]
+    chains = [TranslateChainFactory.create_chain(model) for model in models]
+    assert len(chains) == 100
+    assert isinstance(models[0], BaseChatModel)
+    assert all(model is models[0] for model in models)
+    assert GeminiChatModelFactory(api_key="fake-key", temperature=0.5, pool=pool).build() is not models[0]
+    assert len(pool) == 2
+    pool.close()
+
+
+def test_factory_keeps_an_empty_pool(no_proxy):
+    # an empty pool is falsy (len 0), it must not be swapped for the shared default pool
+    pool = ChatModelPool()
+    factory = GeminiChatModelFactory(api_key="fake-key", pool=pool)
+    assert factory._pool is pool
+    factory.build()
+    assert len(pool) == 1
+    pool.close()
@@ -0,0 +1,79 @@
+import statistics
+import time
+
+import pytest
+
+from src.llm.fake_chat_model_factory import FakeChatModelFactory, SimulatedChatModel, SimulatedError, SimulatedRateLimitError
+from src.llm_chains.batch_runner import is_throttling_error
+
+
+def test_factory_builds_simulated_model():
+    llm = FakeChatModelFactory(latency=0, response="你好").build()
+    assert isinstance(llm, SimulatedChatModel)
+    message = llm.invoke("hello")
+    assert message.content == "你好"
+    assert message.usage_metadata["input_tokens"] == 1
+
+
+def test_echo_when_no_response():
+    llm = FakeChatModelFactory(latency=0).build()
+    assert llm.invoke("hello world").content == "hello world"
+
+
+@pytest.mark.parametrize("distribution", ["constant", "uniform", "exponential", "lognormal"])
+def test_latency_distributions(distribution):
+    llm = SimulatedChatModel(latency=0.1, latency_distribution=distribution, jitter=0.05, seed=1)
+    samples = [llm.sample_latency() for _ in range(2000)]
+    assert all(sample >= 0 for sample in samples)
+    center = statistics.median(samples) if distribution == "lognormal" else statistics.mean(samples)
+    assert center == pytest.approx(0.1, rel=0.1)
+
+
+def test_unknown_distribution():
+    with pytest.raises(ValueError):
+        SimulatedChatModel(latency_distribution="pareto").sample_latency()
+
+
+def test_latency_is_slept():
+    llm = SimulatedChatModel(latency=0.05)
+    start = time.perf_counter()
+    llm.invoke("hello")
+    assert time.perf_counter() - start >= 0.05
+
+
+def test_error_injection_is_seeded():
+    def failures(seed):
+        llm = SimulatedChatModel(latency=0, error_rate=0.2, throttle_rate=0.1, seed=seed)
+        outcomes = []
+        for _ in range(200):
+            try:
+                llm.invoke("hello")
+                outcomes.append(None)
+            except SimulatedRateLimitError as e:
+                assert is_throttling_error(e)
+                outcomes.append("429")
+            except SimulatedError as e:
+                assert not is_throttling_error(e)
+                outcomes.append("error")
+        return outcomes
+
+    outcomes = failures(7)
+    assert outcomes == failures(7)
+    assert 20 < outcomes.count("error") < 60
+    assert 5 < outcomes.count("429") < 40
+
+
+def test_stream_word_chunks():
+    llm = SimulatedChatModel(latency=0, tokens_per_second=1000, response="one two three")
+    chunks = list(llm.stream("hello"))
+    assert [chunk.content for chunk in chunks] == ["one ", "two ", "three"]
+    assert chunks[-1].usage_metadata["output_tokens"] == 3
+
+
+@pytest.mark.asyncio
+async def test_astream_paced_by_tokens_per_second():
+    llm = SimulatedChatModel(latency=0, tokens_per_second=100, response=" ".join(["word"] * 6))
+    start = time.perf_counter()
+    chunks = [chunk async for chunk in llm.astream("hello")]
+    assert len(chunks) == 6
+    assert time.perf_counter() - start >= 0.05
@@ -0,0 +1,171 @@
+import asyncio
+import threading
+import time
+from typing import Any
+
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.configs.config import settings
+from src.llm.chat_model_pool import ChatModelPool
+from src.llm.fake_chat_model_factory import SimulatedChatModel
+from src.llm.gemini_chat_model_factory import GeminiChatModelFactory
+from src.llm.hedged_chat_model import HedgedChatModel, LatencyHedger, with_hedging
+
+
+class ScriptedLatencyModel(BaseChatModel):
+    """
+    Answers its name after the next latency of the script, failing on negative ones.
+    """
+    name: str = "model"
+    latencies: list
+    calls: list
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _next(self):
+        latency = self.latencies.pop(0) if self.latencies else 0.0
+        self.calls.append(latency)
+        return latency
+
+    def _result(self, latency):
+        if latency < 0:
+            raise RuntimeError("scripted failure")
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=self.name))])
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        latency = self._next()
+        time.sleep(abs(latency))
+        return self._result(latency)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        latency = self._next()
+        await asyncio.sleep(abs(latency))
+        return self._result(latency)
+
+
+def scripted(latencies, name="model"):
+    return ScriptedLatencyModel(name=name, latencies=list(latencies), calls=[])
+
+
+@pytest.mark.asyncio
+async def test_slow_call_is_hedged_and_cancelled():
+    hedger = LatencyHedger(initial_delay=0.05)
+    model = scripted([1.0, 0.01])
+    start = time.perf_counter()
+    assert (await with_hedging(model, hedger).ainvoke("hi")).content == "model"
+    assert time.perf_counter() - start < 0.5
+    assert model.calls == [1.0, 0.01]
+    assert (hedger.requests, hedger.hedged, hedger.hedge_wins) == (1, 1, 1)
+    # the cancelled primary counts with the time it ran, not just the fast hedge
+    assert len(hedger._attempts) == 2
+    assert max(hedger._attempts) >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_fast_call_is_not_hedged():
+    hedger = LatencyHedger(initial_delay=0.5)
+    model = scripted([0.01])
+    await with_hedging(model, hedger).ainvoke("hi")
+    assert model.calls == [0.01]
+    assert hedger.hedged == 0
+
+
+def test_sync_hedge_to_alternate():
+    hedger = LatencyHedger(initial_delay=0.05)
+    primary, alternate = scripted([0.5], "primary"), scripted([0.01], "alternate")
+    start = time.perf_counter()
+    assert with_hedging(primary, hedger, alternate).invoke("hi").content == "alternate"
+    assert time.perf_counter() - start < 0.4
+    assert hedger.hedge_wins == 1
+
+
+def test_unhedged_sync_call_runs_on_caller_thread():
+    threads = []
+
+    class ThreadRecordingModel(ScriptedLatencyModel):
+        def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+            threads.append(threading.current_thread())
+            return super()._generate(messages, stop, run_manager, **kwargs)
+
+    hedger = LatencyHedger()
+    with_hedging(ThreadRecordingModel(latencies=[0.0], calls=[]), hedger).invoke("hi")
+    assert threads == [threading.current_thread()]
+    assert hedger._executor is None
+
+
+def test_stream_and_callbacks_pass_through():
+    class ChatModelStarts(BaseCallbackHandler):
+        def __init__(self):
+            self.names = []
+
+        def on_chat_model_start(self, serialized, messages, **kwargs):
+            self.names.append(kwargs.get("name") or serialized.get("name"))
+
+    handler = ChatModelStarts()
+    model = GenericFakeChatModel(messages=iter([AIMessage(content="a b c"), AIMessage(content="d")]))
+    hedged = with_hedging(model, LatencyHedger())
+    chunks = list(hedged.stream("hi", config={"callbacks": [handler]}))
+    assert len(chunks) > 1 and "".join(chunk.content for chunk in chunks) == "a b c"
+    assert hedged.invoke("hi", config={"callbacks": [handler]}).content == "d"
+    # stream() gives _stream no run manager, its tokens are reported by the wrapper's run
+    assert handler.names == ["HedgedChatModel", "HedgedChatModel", "GenericFakeChatModel"]
+
+
+@pytest.mark.asyncio
+async def test_failed_attempt_waits_for_the_other():
+    hedger = LatencyHedger(initial_delay=0.02)
+    model = scripted([0.1, -0.01])
+    assert (await with_hedging(model, hedger).ainvoke("hi")).content == "model"
+    assert hedger.hedge_wins == 0
+    with pytest.raises(RuntimeError):
+        await with_hedging(scripted([-0.05, -0.01]), hedger).ainvoke("hi")
+
+
+@pytest.mark.asyncio
+async def test_hedge_delay_follows_percentile_and_rate_is_capped():
+    hedger = LatencyHedger(percentile=90, max_hedge_rate=0.1, window=50, min_samples=10)
+    assert hedger.hedge_delay() is None
+    # 9 fast calls out of 10 are under the p90 hedge delay
+    model = SimulatedChatModel(latency=0.01, latency_distribution="lognormal", sigma=1.0, seed=1)
+    hedged = with_hedging(model, hedger)
+    await asyncio.gather(*(hedged.ainvoke("hi") for _ in range(10)))
+    assert hedger.hedge_delay() is not None
+    for _ in range(10):
+        await asyncio.gather(*(hedged.ainvoke("hi") for _ in range(10)))
+    stats = hedger.stats()
+    assert stats["requests"] == 110
+    assert 0 < stats["hedged"] <= 0.1 * 50 + 10
+    assert stats["saved_seconds"] >= 0
+
+
+def test_cap_blocks_hedges():
+    hedger = LatencyHedger(initial_delay=0.01, max_hedge_rate=0.1, window=10)
+    assert hedger.try_hedge()
+    assert not hedger.try_hedge()
+    assert hedger.skipped_by_cap == 1
+
+
+def test_cap_holds_before_the_window_is_full():
+    hedger = LatencyHedger(initial_delay=0.01, max_hedge_rate=0.1, window=500)
+    assert sum(hedger.try_hedge() for _ in range(20)) == 1
+    for _ in range(19):
+        hedger.record_request(0.01)
+    assert hedger.try_hedge()
+    assert not hedger.try_hedge()
+    assert hedger.hedged == 2
+
+
+def test_gemini_factory_opt_in(monkeypatch):
+    monkeypatch.setattr(settings, "_proxy_done", True)
+    hedger = LatencyHedger()
+    llm = GeminiChatModelFactory(api_key="fake-key", pool=ChatModelPool(), hedger=hedger).build()
+    assert isinstance(llm, HedgedChatModel)
+    assert llm.hedger is hedger
+    assert not isinstance(GeminiChatModelFactory(api_key="fake-key", pool=ChatModelPool()).build(), HedgedChatModel)
@@ -0,0 +1,128 @@
+import pytest
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+
+from src.configs.config import settings
+from src.llm.chat_model_pool import ChatModelPool
+from src.llm.gemini_chat_model_factory import GeminiChatModelFactory
+from src.llm.response_cache import TwoTierResponseCache, with_response_cache
+from src.llm_chains.translate_chain_factory import TranslateChainFactory
+
+
+class CountingChatModel(FakeListChatModel):
+    # a list so that copies made by with_response_cache share it
+    prompts: list = []
+
+    @property
+    def calls(self):
+        return len(self.prompts)
+
+    def _call(self, messages, *args, **kwargs):
+        self.prompts.append(messages)
+        return super()._call(messages, *args, **kwargs)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_invoke_hits_memory_then_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    model = CountingChatModel(responses=["你好"])
+    cached = with_response_cache(model, TwoTierResponseCache(path))
+
+    assert cached.invoke("hello").content == "你好"
+    assert cached.invoke("hello").content == "你好"
+    assert model.calls == 1
+    assert cached.cache.stats()["memory_hits"] == 1
+
+    # a new process only has the disk tier
+    reopened = with_response_cache(model, TwoTierResponseCache(path))
+    assert reopened.invoke("hello").content == "你好"
+    assert model.calls == 1
+    assert reopened.cache.disk_hits == 1
+
+
+def test_batch_skips_cached_items():
+    model = CountingChatModel(responses=["a", "b", "c"])
+    cache = TwoTierResponseCache()
+    cached = with_response_cache(model, cache)
+    cached.invoke("one")
+
+    results = cached.batch(["one", "two", "one"], config={"max_concurrency": 1})
+    assert [r.content for r in results] == ["a", "b", "a"]
+    assert model.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_abatch_skips_cached_items():
+    model = CountingChatModel(responses=["a", "b"])
+    cached = with_response_cache(model, TwoTierResponseCache())
+    await cached.ainvoke("one")
+    results = await cached.abatch(["one", "two"])
+    assert [r.content for r in results] == ["a", "b"]
+    assert model.calls == 2
+
+
+def test_params_are_part_of_the_key():
+    cache = TwoTierResponseCache()
+    first = CountingChatModel(responses=["x"], sleep=None)
+    second = CountingChatModel(responses=["y"], sleep=0.0)
+    with_response_cache(first, cache).invoke("hello")
+    assert with_response_cache(second, cache).invoke("hello").content == "y"
+
+
+def test_ttl_expiry(tmp_path):
+    clock = FakeClock()
+    model = CountingChatModel(responses=["a", "b"])
+    cached = with_response_cache(model, TwoTierResponseCache(str(tmp_path / "cache.sqlite"), ttl=60, clock=clock))
+    cached.invoke("hello")
+    clock.now += 61
+    assert cached.invoke("hello").content == "b"
+    assert model.calls == 2
+
+
+def test_size_eviction(tmp_path):
+    cache = TwoTierResponseCache(str(tmp_path / "cache.sqlite"), memory_size=2, disk_size=3)
+    model = CountingChatModel(responses=[str(i) for i in range(10)])
+    cached = with_response_cache(model, cache)
+    for i in range(5):
+        cached.invoke(f"prompt {i}")
+    assert len(cache._memory) == 2
+    assert cache._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 3
+    # the oldest prompt was evicted from both tiers
+    cached.invoke("prompt 0")
+    assert model.calls == 6
+
+
+def test_caches_share_a_file(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    first = TwoTierResponseCache(path, disk_size=3)
+    second = TwoTierResponseCache(path, disk_size=3)
+    generations = first.lookup("p", "llm") or []
+    # both processes missed and answer the same prompt
+    assert second.lookup("p", "llm") is None
+    first.update("p", "llm", generations)
+    second.update("p", "llm", generations)
+    for i in range(3):
+        first.update(f"first {i}", "llm", generations)
+        second.update(f"second {i}", "llm", generations)
+    assert first._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0] == 3
+    first.close()
+    second.close()
+
+
+def test_factory_opt_in(monkeypatch):
+    monkeypatch.setattr(settings, "_proxy_done", True)
+    pool = ChatModelPool()
+    cache = TwoTierResponseCache()
+    plain = GeminiChatModelFactory(api_key="fake-key", pool=pool).build()
+    cached = GeminiChatModelFactory(api_key="fake-key", pool=pool, response_cache=cache).build()
+    assert cached.cache is cache
+    assert plain.cache is None
+    # the pooled client is shared, not copied
+    assert cached.client is plain.client
+    TranslateChainFactory.create_chain(cached)
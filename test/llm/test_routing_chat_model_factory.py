@@ -0,0 +1,188 @@
+import asyncio
+
+import pytest
+from langchain_core.callbacks import BaseCallbackHandler
+
+from src.llm.fake_chat_model_factory import FakeChatModelFactory
+from src.llm.llm_chat_model import LLMChatModelFactory
+from src.llm.routing_chat_model_factory import (CLOSED, HALF_OPEN, OPEN, CircuitBreaker, NoHealthyBackendError,
+                                                RoutingChatModelFactory)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class BrokenFactory(LLMChatModelFactory):
+    def build(self):
+        raise RuntimeError("no credentials")
+
+
+def test_circuit_breaker_states():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.is_open and not breaker.allow()
+    clock.now = 10
+    assert not breaker.is_open
+    assert breaker.allow()
+    assert breaker.state == HALF_OPEN
+    # only one trial call at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+
+
+@pytest.mark.asyncio
+async def test_routes_to_fastest_backend():
+    factory = RoutingChatModelFactory({
+        "slow": FakeChatModelFactory(latency=0.05, response="slow"),
+        "fast": FakeChatModelFactory(latency=0.005, response="fast"),
+    }, explore_rate=0)
+    llm = factory.build()
+    answers = [(await llm.ainvoke("hi")).content for _ in range(20)]
+    # both get measured once, then the fast one takes everything
+    assert answers.count("slow") == 1
+    stats = factory.router.stats()
+    assert stats["fast"]["requests"] == 19
+    assert stats["fast"]["p50"] < stats["slow"]["p50"]
+
+
+def test_fails_over_and_opens_breaker():
+    clock = FakeClock()
+    factory = RoutingChatModelFactory({
+        "broken": FakeChatModelFactory(latency=0, error_rate=1.0),
+        "healthy": FakeChatModelFactory(latency=0.01, response="ok"),
+    }, max_error_rate=1.0, failure_threshold=3, reset_timeout=30, explore_rate=0, clock=clock)
+    llm = factory.build()
+    assert all(llm.invoke("hi").content == "ok" for _ in range(10))
+    stats = factory.router.stats()
+    assert stats["broken"]["state"] == OPEN
+    assert stats["broken"]["failures"] == 3
+    assert factory.router.failovers == stats["broken"]["failures"]
+    # after the reset timeout the broken backend gets a single trial call
+    clock.now = 30
+    assert llm.invoke("hi").content == "ok"
+    assert factory.router.stats()["broken"]["failures"] == stats["broken"]["failures"] + 1
+
+
+@pytest.mark.asyncio
+async def test_all_backends_down():
+    factory = RoutingChatModelFactory({
+        "a": FakeChatModelFactory(latency=0, error_rate=1.0),
+        "b": FakeChatModelFactory(latency=0, error_rate=1.0),
+    }, failure_threshold=1, explore_rate=0)
+    llm = factory.build()
+    with pytest.raises(Exception, match="simulated"):
+        await llm.ainvoke("hi")
+    with pytest.raises(NoHealthyBackendError):
+        await llm.ainvoke("hi")
+
+
+def test_error_rate_demotes_backend_before_breaker_opens():
+    factory = RoutingChatModelFactory({
+        "flaky": FakeChatModelFactory(latency=0, error_rate=1.0),
+        "healthy": FakeChatModelFactory(latency=0.01, response="ok"),
+    }, explore_rate=0)
+    llm = factory.build()
+    assert all(llm.invoke("hi").content == "ok" for _ in range(5))
+    assert factory.router.stats()["flaky"]["requests"] == 1
+
+
+def test_unbuildable_backend_is_left_out():
+    factory = RoutingChatModelFactory({"vertexai": BrokenFactory(), "gemini": FakeChatModelFactory(latency=0, response="ok")})
+    assert factory.build().invoke("hi").content == "ok"
+    with pytest.raises(NoHealthyBackendError):
+        RoutingChatModelFactory({"vertexai": BrokenFactory()}).build()
+
+
+@pytest.mark.asyncio
+async def test_upstream_slowdown_shifts_traffic():
+    primary = FakeChatModelFactory(latency=0.005, response="primary")
+    factory = RoutingChatModelFactory({"primary": primary, "secondary": FakeChatModelFactory(latency=0.02, response="secondary")},
+                                      window=5, explore_rate=0.2, seed=1)
+    llm = factory.build()
+    await asyncio.gather(*(llm.ainvoke("hi") for _ in range(10)))
+    llm.backends["primary"].latency = 0.2
+    answers = []
+    for _ in range(30):
+        answers.append((await llm.ainvoke("hi")).content)
+    assert answers[-10:].count("secondary") >= 8
+
+
+class BadRequest(Exception):
+    code = 400
+
+
+class RejectingFactory(LLMChatModelFactory):
+    def __init__(self, error):
+        self._error = error
+
+    def build(self):
+        llm = FakeChatModelFactory(latency=0).build()
+        object.__setattr__(llm, "generate", lambda *args, **kwargs: (_ for _ in ()).throw(self._error))
+        return llm
+
+
+def test_client_error_is_raised_without_failover():
+    factory = RoutingChatModelFactory({"a": RejectingFactory(BadRequest("invalid prompt")),
+                                       "b": FakeChatModelFactory(latency=0, response="ok")},
+                                      failure_threshold=1, explore_rate=0)
+    llm = factory.build()
+    factory.router.names = ["a", "b"]
+    with pytest.raises(BadRequest):
+        llm.invoke("hi")
+    stats = factory.router.stats()
+    assert stats["a"]["state"] == CLOSED and stats["a"]["failures"] == 0
+    assert stats["b"]["requests"] == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_trial_call_releases_the_breaker():
+    clock = FakeClock()
+    factory = RoutingChatModelFactory({"slow": FakeChatModelFactory(latency=1.0, response="ok")},
+                                      failure_threshold=1, reset_timeout=10, clock=clock)
+    llm = factory.build()
+    breaker = factory.router.breakers["slow"]
+    breaker.record_failure()
+    clock.now = 10
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(llm.ainvoke("hi"), timeout=0.05)
+    assert breaker.state == HALF_OPEN
+    # the next call is let through as a new trial
+    assert breaker.allow()
+
+
+def test_plain_value_error_fails_over():
+    factory = RoutingChatModelFactory({"a": RejectingFactory(ValueError("Cannot invoke RPC on closed channel!")),
+                                       "b": FakeChatModelFactory(latency=0, response="ok")},
+                                      failure_threshold=1, explore_rate=0)
+    llm = factory.build()
+    factory.router.names = ["a", "b"]
+    assert llm.invoke("hi").content == "ok"
+    assert factory.router.stats()["a"]["failures"] == 1
+
+
+def test_backend_runs_are_children_of_the_routing_run():
+    class Runs(BaseCallbackHandler):
+        def __init__(self):
+            self.parents = []
+
+        def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs):
+            self.parents.append((run_id, parent_run_id))
+
+    runs = Runs()
+    llm = RoutingChatModelFactory({"a": FakeChatModelFactory(latency=0, response="ok")}).build()
+    llm.invoke("hi", config={"callbacks": [runs]})
+    (outer, _), (_, inner_parent) = runs.parents
+    assert inner_parent == outer
@@ -0,0 +1,8 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def ocr_module():
+    return importlib.import_module("src.services.google_ocr_service")
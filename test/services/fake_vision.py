@@ -0,0 +1,75 @@
+import asyncio
+
+from google.cloud import vision
+from google.rpc import status_pb2
+
+
+class FakeAnnotator:
+    """
+    Answers the image content as its text; "error" images fail, "empty" ones have no text.
+    """
+
+    def __init__(self, fail_batches=0):
+        self.batch_sizes = []
+        self.fail_batches = fail_batches
+
+    def _response(self, request):
+        content = request.image.content.decode()
+        if content == "error":
+            return vision.AnnotateImageResponse(error=status_pb2.Status(code=3, message="bad image"))
+        if content == "empty":
+            return vision.AnnotateImageResponse()
+        return vision.AnnotateImageResponse(text_annotations=[vision.EntityAnnotation(description=content)])
+
+    def batch_annotate_images(self, requests):
+        self.batch_sizes.append(len(requests))
+        if self.fail_batches:
+            self.fail_batches -= 1
+            raise RuntimeError("503 unavailable")
+        return vision.BatchAnnotateImagesResponse(responses=[self._response(request) for request in requests])
+
+    def text_detection(self, image, **kwargs):
+        self.batch_sizes.append(1)
+        return self._response(vision.AnnotateImageRequest(image=image))
+
+
+class FakeAsyncAnnotator(FakeAnnotator):
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def batch_annotate_images(self, requests):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(0.01)
+            return FakeAnnotator.batch_annotate_images(self, requests)
+        finally:
+            self.in_flight -= 1
+
+
+def write_images(tmp_path, contents):
+    paths = []
+    for i, content in enumerate(contents):
+        path = tmp_path / f"{i}.png"
+        path.write_bytes(content.encode())
+        paths.append(str(path))
+    return paths
+
+
+def fake_pdf_page_count(pdf_path):
+    """
+    A fake PDF is a text file with a page per form feed.
+    """
+    with open(pdf_path, encoding="utf-8") as f:
+        return len(f.read().split("\f"))
+
+
+def render_fake_page(pdf_path, page_index, dpi=200):
+    # the page text as image bytes, FakeAnnotator answers it as the OCR text
+    with open(pdf_path, encoding="utf-8") as f:
+        page = f.read().split("\f")[page_index]
+    if page == "corrupt":
+        raise ValueError("cannot render page")
+    return page.encode()
@@ -0,0 +1,48 @@
+import pytest
+
+from fake_vision import FakeAnnotator, FakeAsyncAnnotator, write_images
+
+
+def test_batches_keep_input_order(ocr_module, tmp_path):
+    annotator = FakeAnnotator()
+    service = ocr_module.GoogleOCRService(client=annotator)
+    contents = [f"text {i}" for i in range(40)]
+    assert service.extract_text_from_imgs(write_images(tmp_path, contents)) == contents
+    assert annotator.batch_sizes == [16, 16, 8]
+
+
+def test_per_image_errors(ocr_module, tmp_path):
+    service = ocr_module.GoogleOCRService(client=FakeAnnotator())
+    paths = write_images(tmp_path, ["a", "error", "empty", "b"]) + [str(tmp_path / "missing.png")]
+    results = service.extract_text_from_imgs(paths, batch_size=2)
+    assert results[0] == "a" and results[3] == "b"
+    assert "bad image" in str(results[1])
+    assert str(results[2]) == "No text detected."
+    assert isinstance(results[4], FileNotFoundError)
+
+
+def test_failed_request_fails_its_batch_only(ocr_module, tmp_path):
+    service = ocr_module.GoogleOCRService(client=FakeAnnotator(fail_batches=1))
+    results = service.extract_text_from_imgs(write_images(tmp_path, ["a", "b", "c"]), batch_size=2)
+    assert [type(result) for result in results[:2]] == [RuntimeError, RuntimeError]
+    assert results[2] == "c"
+
+
+def test_single_image_errors_are_raised(ocr_module, tmp_path):
+    service = ocr_module.GoogleOCRService(client=FakeAnnotator())
+    error, ok = write_images(tmp_path, ["error", "hello"])
+    assert service.extract_text_from_img(ok) == "hello"
+    with pytest.raises(Exception, match="bad image"):
+        service.extract_text_from_img(error)
+
+
+@pytest.mark.asyncio
+async def test_async_batches_bounded_concurrency(ocr_module, tmp_path):
+    annotator = FakeAsyncAnnotator()
+    service = ocr_module.GoogleOCRService(client=FakeAnnotator(), async_client=annotator)
+    contents = [f"text {i}" for i in range(50)] + ["error"]
+    results = await service.aextract_text_from_imgs(write_images(tmp_path, contents), batch_size=4, max_concurrency=3)
+    assert results[:50] == contents[:50]
+    assert isinstance(results[50], Exception)
+    assert len(annotator.batch_sizes) == 13
+    assert annotator.max_in_flight == 3
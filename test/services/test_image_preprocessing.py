@@ -0,0 +1,125 @@
+import asyncio
+import io
+import random
+
+import pytest
+
+PIL_Image = pytest.importorskip("PIL.Image")
+
+from google.cloud import vision
+
+from src.services.image_preprocessing import ImagePreprocessor, preprocess_image
+from src.services.ocr_cache import OCRResultCache
+
+
+def photo(size=(3000, 2000)):
+    # noise does not compress: a stand-in for a camera photo
+    image = PIL_Image.frombytes("RGB", size, random.Random(0).randbytes(size[0] * size[1] * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def screenshot(size=(1600, 1000)):
+    image = PIL_Image.new("RGB", size, "white")
+    for y in range(0, size[1], 40):
+        image.paste((0, 0, 0), (20, y, size[0] - 20, y + 10))
+    buffer = io.BytesIO()
+    image.save(buffer, format="BMP")
+    return buffer.getvalue()
+
+
+class RecordingAnnotator:
+    def __init__(self):
+        self.uploads = []
+
+    def batch_annotate_images(self, requests):
+        self.uploads.extend(request.image.content for request in requests)
+        return vision.BatchAnnotateImagesResponse(responses=[
+            vision.AnnotateImageResponse(text_annotations=[vision.EntityAnnotation(description="text")])
+            for _ in requests])
+
+
+def test_photo_is_downscaled_under_budget():
+    content, seconds = preprocess_image(photo(), max_side=1024, max_bytes=300 * 1024)
+    assert len(content) <= 300 * 1024
+    assert seconds > 0
+    with PIL_Image.open(io.BytesIO(content)) as image:
+        assert max(image.size) <= 1024
+        assert image.mode == "L"
+        assert image.format == "JPEG"
+
+
+def test_grayscale_photo_is_jpeg():
+    # its PNG would fit the budget too, but a photo has too many shades to be worth it
+    content, _ = preprocess_image(photo((800, 600)))
+    with PIL_Image.open(io.BytesIO(content)) as image:
+        assert image.format == "JPEG"
+
+
+def test_screenshot_stays_png():
+    original = screenshot()
+    content, _ = preprocess_image(original)
+    assert len(content) < len(original)
+    with PIL_Image.open(io.BytesIO(content)) as image:
+        assert image.format == "PNG"
+        assert image.size == (1600, 1000)
+
+
+def test_small_image_is_unchanged():
+    buffer = io.BytesIO()
+    PIL_Image.new("L", (8, 8), "white").save(buffer, format="PNG", optimize=True)
+    assert preprocess_image(buffer.getvalue())[0] == buffer.getvalue()
+
+
+def test_exif_orientation_is_applied():
+    image = PIL_Image.frombytes("RGB", (1200, 800), random.Random(0).randbytes(1200 * 800 * 3))
+    exif = PIL_Image.Exif()
+    # a camera held upright stores landscape pixels rotated 90 degrees clockwise
+    exif[0x0112] = 6
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG", exif=exif)
+    content, _ = preprocess_image(buffer.getvalue(), max_side=600)
+    with PIL_Image.open(io.BytesIO(content)) as preprocessed:
+        assert preprocessed.size == (400, 600)
+
+
+def test_cancelled_preprocessing_uploads_as_is():
+    with ImagePreprocessor(max_workers=1) as preprocessor:
+        assert preprocessor._result(b"image", asyncio.CancelledError()) == b"image"
+
+
+def test_invalid_image_is_uploaded_as_is():
+    with ImagePreprocessor(max_workers=1) as preprocessor:
+        assert preprocessor.preprocess_many([b"not an image", screenshot()])[0] == b"not an image"
+        stats = preprocessor.stats()
+    assert stats["images"] == 2
+    assert stats["bytes_saved"] > 0
+
+
+@pytest.mark.asyncio
+async def test_async_preprocessing():
+    with ImagePreprocessor(max_side=512, max_workers=2) as preprocessor:
+        contents = await preprocessor.apreprocess_many([photo((1200, 800)), b"not an image"])
+    with PIL_Image.open(io.BytesIO(contents[0])) as image:
+        assert max(image.size) == 512
+    assert contents[1] == b"not an image"
+
+
+def test_service_uploads_preprocessed_images(ocr_module, tmp_path):
+    path = tmp_path / "photo.png"
+    path.write_bytes(photo())
+    annotator = RecordingAnnotator()
+    cache = OCRResultCache(":memory:")
+    with ImagePreprocessor(max_side=1024, max_workers=1) as preprocessor:
+        service = ocr_module.GoogleOCRService(client=annotator, cache=cache, preprocessor=preprocessor)
+        assert service.extract_text_from_imgs([str(path), str(path)]) == ["text", "text"]
+        assert service.extract_text_from_imgs([str(path)]) == ["text"]
+    # the cache is looked up with the original bytes, only the shrunk image is uploaded, once per batch
+    assert len(annotator.uploads) == 2
+    assert all(len(upload) < path.stat().st_size for upload in annotator.uploads)
+    assert cache.stats()["hits"] == 1
+    # another preprocessing may give another text, it has its own cache entries
+    plain = ocr_module.GoogleOCRService(client=annotator, cache=cache)
+    assert plain.extract_text_from_imgs([str(path)]) == ["text"]
+    assert len(annotator.uploads) == 3
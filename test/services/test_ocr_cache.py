@@ -0,0 +1,81 @@
+import pytest
+
+from src.services.ocr_cache import OCRResultCache, ocr_cache_key
+from fake_vision import FakeAnnotator, FakeAsyncAnnotator, write_images
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += 1
+        return self.now
+
+
+def test_key_is_content_and_options():
+    assert ocr_cache_key(b"image") == ocr_cache_key(b"image")
+    assert ocr_cache_key(b"image") != ocr_cache_key(b"other")
+    assert ocr_cache_key(b"image", language_hints=["zh"]) != ocr_cache_key(b"image")
+    assert ocr_cache_key(b"image", feature="DOCUMENT_TEXT_DETECTION") != ocr_cache_key(b"image")
+
+
+def test_persistent_hits(tmp_path):
+    path = str(tmp_path / "ocr.sqlite")
+    cache = OCRResultCache(path)
+    assert cache.get(b"image") is None
+    cache.put(b"image", "你好")
+    cache.close()
+    cache = OCRResultCache(path)
+    assert cache.get(b"image") == "你好"
+    assert cache.get(b"image", language_hints=["en"]) is None
+    assert cache.stats() == {"hits": 1, "misses": 1, "hit_rate": 0.5, "bytes_saved": 5, "entries": 1, "bytes": 6}
+
+
+def test_lru_eviction_by_entries_and_bytes():
+    cache = OCRResultCache(":memory:", max_entries=3, max_bytes=100, clock=FakeClock())
+    for i in range(3):
+        cache.put(f"image {i}".encode(), "x")
+    cache.get(b"image 0")
+    cache.put(b"image 3", "x")
+    assert cache.get(b"image 1") is None
+    assert cache.get(b"image 0") == "x"
+    cache.put(b"big", "y" * 99)
+    assert cache.stats()["bytes"] <= 100
+    assert cache.get(b"big") == "y" * 99
+    assert cache.stats()["entries"] == 2
+
+
+def test_service_skips_the_api_on_hits(ocr_module, tmp_path):
+    annotator = FakeAnnotator()
+    cache = OCRResultCache(str(tmp_path / "ocr.sqlite"))
+    service = ocr_module.GoogleOCRService(client=annotator, cache=cache)
+    (tmp_path / "a").mkdir()
+    (tmp_path / "b").mkdir()
+    first = write_images(tmp_path / "a", ["one", "two", "error"])
+    duplicates = write_images(tmp_path / "b", ["one", "two", "error"])
+    assert service.extract_text_from_imgs(first)[:2] == ["one", "two"]
+    assert annotator.batch_sizes == [3]
+    results = service.extract_text_from_imgs(duplicates)
+    assert results[:2] == ["one", "two"]
+    # errors are not cached
+    assert isinstance(results[2], Exception)
+    assert annotator.batch_sizes == [3, 1]
+    assert service.extract_text_from_img(first[0]) == "one"
+    assert annotator.batch_sizes == [3, 1]
+    assert cache.hits == 3
+    assert cache.bytes_saved == len(b"one") * 2 + len(b"two")
+
+
+@pytest.mark.asyncio
+async def test_async_hits_and_language_hints(ocr_module, tmp_path):
+    cache = OCRResultCache(":memory:")
+    paths = write_images(tmp_path, ["one", "two"])
+    annotator = FakeAsyncAnnotator()
+    await ocr_module.GoogleOCRService(client=FakeAnnotator(), async_client=annotator, cache=cache).aextract_text_from_imgs(paths)
+    await ocr_module.GoogleOCRService(client=FakeAnnotator(), async_client=annotator, cache=cache).aextract_text_from_imgs(paths)
+    assert annotator.batch_sizes == [2]
+    # other hints, other results
+    hinted = ocr_module.GoogleOCRService(client=FakeAnnotator(), async_client=annotator, cache=cache, language_hints=["zh"])
+    assert await hinted.aextract_text_from_imgs(paths) == ["one", "two"]
+    assert annotator.batch_sizes == [2, 2]
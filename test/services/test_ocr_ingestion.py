@@ -0,0 +1,93 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+from src.services.ocr_ingestion import OCRIngestionJob
+from fake_vision import FakeAsyncAnnotator, write_images
+
+
+def read_jsonl(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def make_job(ocr_module, tmp_path, annotator, **kwargs):
+    service = ocr_module.GoogleOCRService(client=object(), async_client=annotator)
+    return OCRIngestionJob(service, str(tmp_path / "out" / "ocr.jsonl"), settle_seconds=0, **kwargs)
+
+
+def test_incremental_runs(ocr_module, tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    paths = write_images(images, [f"text {i}" for i in range(5)])
+    annotator = FakeAsyncAnnotator()
+    job = make_job(ocr_module, tmp_path, annotator, batch_size=2)
+    report = job.run(str(images))
+    assert (report.files, report.succeeded, report.skipped) == (5, 5, 0)
+    assert sorted(record["text"] for record in read_jsonl(tmp_path / "out" / "ocr.jsonl")) == [f"text {i}" for i in range(5)]
+
+    # a new job on the same output, e.g. after a restart: only the changed file is sent
+    with open(paths[0], "w") as f:
+        f.write("changed text")
+    job = make_job(ocr_module, tmp_path, annotator)
+    report = job.run(str(images))
+    assert (report.files, report.succeeded, report.skipped) == (5, 1, 4)
+    assert read_jsonl(tmp_path / "out" / "ocr.jsonl")[-1] == {
+        "id": os.path.abspath(paths[0]), "mtime_ns": os.stat(paths[0]).st_mtime_ns, "size": 12, "text": "changed text"}
+
+
+def test_failures_are_retried(ocr_module, tmp_path):
+    (tmp_path / "images").mkdir()
+    write_images(tmp_path / "images", ["a", "error"])
+    job = make_job(ocr_module, tmp_path, FakeAsyncAnnotator())
+    report = job.run(str(tmp_path / "images"))
+    assert (report.succeeded, report.failed) == (1, 1)
+    assert "bad image" in read_jsonl(tmp_path / "out" / "ocr.jsonl.errors.jsonl")[0]["error"]
+    report = job.run(str(tmp_path / "images"))
+    assert (report.succeeded, report.failed, report.skipped) == (0, 1, 1)
+
+
+def test_resume_after_interruption(ocr_module, tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    write_images(images, [f"text {i}" for i in range(6)])
+    assert make_job(ocr_module, tmp_path, FakeAsyncAnnotator()).run(str(images), limit=2).succeeded == 2
+    # a crash while writing the manifest leaves a torn last line
+    with open(tmp_path / "out" / "ocr.jsonl.manifest.jsonl", "a") as f:
+        f.write('{"id": "')
+    report = make_job(ocr_module, tmp_path, FakeAsyncAnnotator()).run(str(images))
+    assert (report.succeeded, report.skipped) == (4, 2)
+    assert len(read_jsonl(tmp_path / "out" / "ocr.jsonl.manifest.jsonl")) == 6
+
+
+def test_pattern_and_unsettled_files(ocr_module, tmp_path):
+    images = tmp_path / "images"
+    (images / "sub").mkdir(parents=True)
+    write_images(images / "sub", ["nested"])
+    (images / "notes.txt").write_text("not an image")
+    job = make_job(ocr_module, tmp_path, FakeAsyncAnnotator())
+    assert job.run(str(images), pattern="*").files == 0
+    assert job.run(str(images)).succeeded == 1
+    write_images(images, ["fresh"])
+    job._settle_seconds = 60
+    assert job.run(str(images)).skipped == 2
+
+
+@pytest.mark.asyncio
+async def test_watch_picks_up_new_files(ocr_module, tmp_path):
+    images = tmp_path / "images"
+    images.mkdir()
+    job = make_job(ocr_module, tmp_path, FakeAsyncAnnotator())
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(job.watch(str(images), interval=0.05, stop=stop))
+    await asyncio.sleep(0.1)
+    write_images(images, ["arrived"])
+    for _ in range(50):
+        if os.path.exists(tmp_path / "out" / "ocr.jsonl"):
+            break
+        await asyncio.sleep(0.05)
+    stop.set()
+    await watcher
+    assert [record["text"] for record in read_jsonl(tmp_path / "out" / "ocr.jsonl")] == ["arrived"]
@@ -0,0 +1,80 @@
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.services.pdf_ocr import PdfOCR, pdf_page_count, render_page
+from fake_vision import FakeAnnotator, FakeAsyncAnnotator, fake_pdf_page_count, render_fake_page
+
+
+def write_pdf(tmp_path, pages):
+    path = tmp_path / "doc.pdf"
+    path.write_text("\f".join(pages), encoding="utf-8")
+    return str(path)
+
+
+def fake_pdf_ocr(service, **kwargs):
+    return PdfOCR(service, renderer=render_fake_page, page_counter=fake_pdf_page_count, **kwargs)
+
+
+def test_pages_in_order_from_process_pool(ocr_module, tmp_path):
+    annotator = FakeAnnotator()
+    pages = [f"page {i}" for i in range(1, 11)]
+    with fake_pdf_ocr(ocr_module.GoogleOCRService(client=annotator), batch_size=4, max_workers=2) as pdf_ocr:
+        assert list(pdf_ocr.iter_pages(write_pdf(tmp_path, pages))) == list(enumerate(pages, start=1))
+    assert annotator.batch_sizes == [4, 4, 2]
+
+
+def test_page_range_and_page_errors(ocr_module, tmp_path):
+    path = write_pdf(tmp_path, ["one", "empty", "corrupt", "four", "five"])
+    with fake_pdf_ocr(ocr_module.GoogleOCRService(client=FakeAnnotator())) as pdf_ocr:
+        results = list(pdf_ocr.iter_pages(path, first_page=2, last_page=4))
+        assert [number for number, _ in results] == [2, 3, 4]
+        assert str(results[0][1]) == "No text detected."
+        assert isinstance(results[1][1], ValueError)
+        assert results[2][1] == "four"
+        assert pdf_ocr.extract_text(path, last_page=4) == "one\n\nfour"
+        with pytest.raises(ValueError):
+            list(pdf_ocr.iter_pages(path, first_page=4, last_page=6))
+
+
+def test_rendering_is_bounded_by_prefetch(ocr_module, tmp_path):
+    rendered = []
+    lock = threading.Lock()
+
+    def renderer(pdf_path, page_index, dpi):
+        with lock:
+            rendered.append(page_index)
+        return render_fake_page(pdf_path, page_index, dpi)
+
+    path = write_pdf(tmp_path, [f"page {i}" for i in range(100)])
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pdf_ocr = PdfOCR(ocr_module.GoogleOCRService(client=FakeAnnotator()), batch_size=2, prefetch=6,
+                         executor=executor, renderer=renderer, page_counter=fake_pdf_page_count)
+        pages = pdf_ocr.iter_pages(path)
+        assert next(pages) == (1, "page 0")
+        # the first batch of 2 was taken and replaced, nothing else ahead of the consumer
+        assert len(rendered) <= 8
+        pages.close()
+
+
+@pytest.mark.asyncio
+async def test_async_pages(ocr_module, tmp_path):
+    service = ocr_module.GoogleOCRService(client=FakeAnnotator(), async_client=FakeAsyncAnnotator())
+    path = write_pdf(tmp_path, [f"page {i}" for i in range(1, 8)])
+    with fake_pdf_ocr(service, batch_size=3, max_workers=2) as pdf_ocr:
+        results = [result async for result in pdf_ocr.aiter_pages(path, first_page=2)]
+    assert results == [(i, f"page {i}") for i in range(2, 8)]
+
+
+def test_pdfium_rendering(tmp_path):
+    pytest.importorskip("pypdfium2")
+    PIL_Image = pytest.importorskip("PIL.Image")
+    path = str(tmp_path / "scan.pdf")
+    pages = [PIL_Image.new("RGB", (600, 800), "white") for _ in range(3)]
+    pages[0].save(path, save_all=True, append_images=pages[1:], resolution=100)
+    assert pdf_page_count(path) == 3
+    with PIL_Image.open(io.BytesIO(render_page(path, 1, dpi=72))) as image:
+        assert image.format == "PNG"
+        assert image.size == (432, 576)
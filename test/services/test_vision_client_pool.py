@@ -0,0 +1,90 @@
+import asyncio
+import sys
+import threading
+
+import pytest
+
+from src.services.vision_client_pool import VisionClientPool
+from fake_vision import FakeAnnotator, FakeAsyncAnnotator, write_images
+
+
+def counting_factory(cls=FakeAnnotator):
+    created = []
+
+    def factory():
+        created.append(cls())
+        return created[-1]
+    return factory, created
+
+
+def test_clients_created_on_demand_least_busy_first():
+    factory, created = counting_factory()
+    pool = VisionClientPool(factory, size=2)
+    assert created == []
+    with pool.lease() as first:
+        pass
+    with pool.lease() as again:
+        # an idle client is reused, not a new channel opened
+        assert again is first
+        with pool.lease() as second:
+            assert second is not first
+            with pool.lease() as third:
+                # pool full: shares the least busy one
+                assert third in (first, second)
+                assert pool.stats()["in_flight"] in ([2, 1], [1, 2])
+    assert len(created) == 2
+    assert pool.stats()["in_flight"] == [0, 0]
+    assert pool.stats()["peak_in_flight"] == 3
+
+
+def test_concurrent_threads_spread_over_the_pool():
+    factory, created = counting_factory()
+    pool = VisionClientPool(factory, size=4)
+    barrier = threading.Barrier(8)
+    used = []
+
+    def work():
+        with pool.lease() as client:
+            used.append(client)
+            barrier.wait()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(created) == 4
+    assert {used.count(client) for client in created} == {2}
+
+
+def test_service_is_lazy(ocr_module, monkeypatch):
+    factory, created = counting_factory()
+    monkeypatch.setattr(ocr_module.GoogleOCRService, "_new_client", staticmethod(factory))
+    monkeypatch.setattr(ocr_module, "_default_service", None)
+    service = ocr_module.google_ocr_service
+    assert service is ocr_module.get_google_ocr_service()
+    assert created == []
+    with pytest.raises(AttributeError):
+        ocr_module.missing_attribute
+
+
+def test_service_threads_use_the_pool(ocr_module, monkeypatch, tmp_path):
+    factory, created = counting_factory()
+    monkeypatch.setattr(ocr_module.GoogleOCRService, "_new_client", staticmethod(factory))
+    service = ocr_module.GoogleOCRService(pool_size=3)
+    contents = [f"text {i}" for i in range(64)]
+    assert service.extract_text_from_imgs(write_images(tmp_path, contents), batch_size=4, max_workers=4) == contents
+    assert 1 <= len(created) <= 3
+    assert sum(sum(client.batch_sizes) for client in created) == 64
+    assert service.pool_stats()["sync"]["leases"] == 16
+
+
+def test_one_async_pool_per_event_loop(ocr_module, monkeypatch, tmp_path):
+    factory, created = counting_factory(FakeAsyncAnnotator)
+    monkeypatch.setattr(ocr_module.GoogleOCRService, "_new_async_client", staticmethod(factory))
+    service = ocr_module.GoogleOCRService(client=FakeAnnotator(), pool_size=2)
+    paths = write_images(tmp_path, [f"text {i}" for i in range(8)])
+    for _ in range(2):
+        assert asyncio.run(service.aextract_text_from_imgs(paths, batch_size=2, max_concurrency=4))[0] == "text 0"
+    # every asyncio.run has a new loop, its channels cannot be reused
+    assert len(created) == 4